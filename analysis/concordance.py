@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+
+# Title:          concordance.py
+# Description:    Positional inverted index of the corpora with a keyword-in-context (KWIC)
+#                 concordance on top, for reading how the NGOs (or any other term) are
+#                 discussed without re-running extract_pos.py or grepping the databases.
+#
+#                 Building the index reads article_content_no_tags once and records every
+#                 word's article, paragraph, word position, and character offset. Postings are
+#                 grouped by word, so looking up a word is one slice of a few arrays, and a
+#                 phrase (like an NGO's full name) is the first word's postings filtered down
+#                 to the ones followed by the rest of the phrase. The index is a folder:
+#                   * vocabulary.txt: one lowercase word per line (the line number is the word id)
+#                   * documents.csv: publication, id_article, article_date, article_title
+#                   * postings_offsets.i64: n_words + 1 positions, so word i's postings are
+#                     [postings_offsets[i]:postings_offsets[i + 1]] in the arrays below
+#                   * postings_doc.u32, postings_paragraph.u32, postings_position.u32,
+#                     postings_start.u32: document, paragraph, word position, and character offset
+#                   * texts.bin and text_offsets.i64: the UTF-8 text of every article
+#                 All the arrays are memory-mapped, so opening the index and answering a query
+#                 takes milliseconds.
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 concordance.py build Output/concordance \
+#                   --corpus Corpora/egypt_independent.db egypt_independent \
+#                   --corpus Corpora/ahram.db ahram --corpus Corpora/dne.db dne
+#                 python3 concordance.py kwic Output/concordance "Nazra for Feminist Studies" --window 10
+#                 python3 concordance.py ngos Output/concordance --csv Output/ngo_kwic.csv
+#                 In Python:
+#                   index = ConcordanceIndex('Output/concordance')
+#                   index.kwic('egyptian initiative for personal rights', window=8, publications=['dne'])
+# Notes:          Words are split like remove_punc() in corpus_helpers.py (punctuation other than
+#                 hyphens separates words), and matching ignores case. Paragraphs are numbered
+#                 from 1, split on newlines like extract_pos.py.
+
+# Import modules
+import argparse
+import csv
+import os
+import re
+import sys
+from itertools import islice
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prepare_corpus'))
+from corpus_helpers import organizations, punc, read_articles
+from token_store import memmap_array, read_lines
+
+posting_dtype = np.dtype('<u4')
+offset_dtype = np.dtype('<i8')
+posting_columns = ['doc', 'paragraph', 'position', 'start']
+
+word_regex = re.compile('[^\\s%s]+' % re.escape(punc))
+
+
+#-------------------
+# Helper functions
+#-------------------
+def tokenize(text):
+  """Find every word in a text
+
+  Returns:
+    Tuple of (list of lowercase words, array of paragraph numbers, array of
+    character offsets)
+  """
+  matches = list(word_regex.finditer(text))
+  words = [match.group().lower() for match in matches]
+  starts = np.fromiter((match.start() for match in matches), dtype=np.int64, count=len(matches))
+  paragraph_starts = [0] + [newlines.end() for newlines in re.finditer('\n+', text)]
+  paragraphs = np.searchsorted(paragraph_starts, starts, side='right')
+  return(words, paragraphs, starts)
+
+
+def query_words(phrase):
+  """Split a search phrase the same way articles are split"""
+  return([match.group().lower() for match in word_regex.finditer(phrase)])
+
+
+#--------------------
+# Build the index
+#--------------------
+def build_index(path, articles):
+  """Write a concordance index
+
+  Arguments:
+    path: Folder for the index
+    articles: Iterable of (publication, id_article, article_date, article_title, text)
+
+  Returns:
+    Number of documents indexed
+  """
+  if not os.path.exists(path):
+    os.makedirs(path)
+
+  vocabulary = {}
+  word_ids, docs, paragraphs, positions, starts = [], [], [], [], []
+  text_offsets = [0]
+  with open(os.path.join(path, 'texts.bin'), 'wb') as texts, \
+       open(os.path.join(path, 'documents.csv'), 'w', newline='', encoding='utf-8') as documents:
+    csv_out = csv.writer(documents)
+    csv_out.writerow(['publication', 'id_article', 'article_date', 'article_title'])
+    for doc, (publication, id_article, article_date, article_title, text) in enumerate(articles):
+      text = text or ''
+      words, doc_paragraphs, doc_starts = tokenize(text)
+      word_ids.append(np.fromiter((vocabulary.setdefault(word, len(vocabulary)) for word in words),
+                                  dtype=np.int64, count=len(words)))
+      docs.append(np.full(len(words), doc, dtype=posting_dtype))
+      paragraphs.append(doc_paragraphs.astype(posting_dtype))
+      positions.append(np.arange(len(words), dtype=posting_dtype))
+      starts.append(doc_starts.astype(posting_dtype))
+
+      encoded = text.encode('utf-8')
+      texts.write(encoded)
+      text_offsets.append(text_offsets[-1] + len(encoded))
+      csv_out.writerow([publication, id_article, article_date, article_title])
+
+  # Group the postings by word. A stable sort keeps each word's postings in
+  # document and position order.
+  word_ids = np.concatenate(word_ids) if word_ids else np.zeros(0, dtype=np.int64)
+  order = np.argsort(word_ids, kind='stable')
+  counts = np.bincount(word_ids, minlength=len(vocabulary))
+  np.concatenate(([0], np.cumsum(counts))).astype(offset_dtype).tofile(os.path.join(path, 'postings_offsets.i64'))
+  for name, column in zip(posting_columns, [docs, paragraphs, positions, starts]):
+    column = np.concatenate(column) if column else np.zeros(0, dtype=posting_dtype)
+    column[order].astype(posting_dtype).tofile(os.path.join(path, 'postings_{0}.u32'.format(name)))
+  np.asarray(text_offsets, dtype=offset_dtype).tofile(os.path.join(path, 'text_offsets.i64'))
+
+  with open(os.path.join(path, 'vocabulary.txt'), 'w', encoding='utf-8') as f:
+    f.write('\n'.join(sorted(vocabulary, key=vocabulary.get)))
+  return(len(text_offsets) - 1)
+
+
+#-------------------
+# Query the index
+#-------------------
+class ConcordanceIndex:
+  """Read a concordance index
+
+  Attributes:
+    vocabulary: Dictionary of word → word id
+    documents: List of (publication, id_article, article_date, article_title)
+    postings: Dictionary of memory-mapped posting arrays (doc, paragraph,
+      position, start)
+  """
+  def __init__(self, path):
+    """Open the index
+
+    Arguments:
+      path: String of path to the index folder
+    """
+    self.path = path
+    self.vocabulary = {word: i for i, word in enumerate(read_lines(os.path.join(path, 'vocabulary.txt')))}
+    with open(os.path.join(path, 'documents.csv'), newline='', encoding='utf-8') as f:
+      rows = csv.reader(f)
+      next(rows)
+      self.documents = [(publication, int(id_article), article_date, article_title)
+                        for publication, id_article, article_date, article_title in rows]
+    self.publications = np.array([document[0] for document in self.documents])
+    self.offsets = memmap_array(os.path.join(path, 'postings_offsets.i64'), offset_dtype)
+    self.postings = {name: memmap_array(os.path.join(path, 'postings_{0}.u32'.format(name)), posting_dtype)
+                     for name in posting_columns}
+    self.text_offsets = memmap_array(os.path.join(path, 'text_offsets.i64'), offset_dtype)
+    self.texts = memmap_array(os.path.join(path, 'texts.bin'), np.uint8)
+
+  def text(self, doc):
+    """Get the text of a document"""
+    return(bytes(self.texts[self.text_offsets[doc]:self.text_offsets[doc + 1]]).decode('utf-8'))
+
+  def word_postings(self, word):
+    """Get the range of postings for one word (empty if it isn't in the index)"""
+    i = self.vocabulary.get(word)
+    if i is None:
+      return(slice(0, 0))
+    return(slice(int(self.offsets[i]), int(self.offsets[i + 1])))
+
+  def find(self, phrase, publications=None):
+    """Find every place a word or phrase appears
+
+    Arguments:
+      phrase: Word or phrase to look for
+      publications: Optional list of publications to search
+
+    Returns:
+      Dictionary of arrays (doc, paragraph, position, start) with one entry per match
+    """
+    words = query_words(phrase)
+    if not words:
+      return({name: np.zeros(0, dtype=posting_dtype) for name in posting_columns})
+
+    first = self.word_postings(words[0])
+    hits = {name: np.asarray(self.postings[name][first]) for name in posting_columns}
+
+    # Keep the matches where the k-th next word is words[k]
+    for k, word in enumerate(words[1:], start=1):
+      following = self.word_postings(word)
+      following_keys = (self.postings['doc'][following].astype(np.int64) << 32) + self.postings['position'][following]
+      keys = (hits['doc'].astype(np.int64) << 32) + hits['position'] + k
+      keep = np.isin(keys, following_keys)
+      hits = {name: column[keep] for name, column in hits.items()}
+
+    if publications:
+      keep = np.isin(self.publications[hits['doc']], publications)
+      hits = {name: column[keep] for name, column in hits.items()}
+    hits['length'] = len(words)
+    return(hits)
+
+  def count(self, phrase, publications=None):
+    """Count the matches of a word or phrase in each publication"""
+    counts = {}
+    for doc in self.find(phrase, publications)['doc']:
+      publication = self.documents[doc][0]
+      counts[publication] = counts.get(publication, 0) + 1
+    return(counts)
+
+  def kwic(self, phrase, window=10, publications=None):
+    """Keyword-in-context lines for a word or phrase
+
+    Arguments:
+      phrase: Word or phrase to look for
+      window: Number of words to show on each side
+      publications: Optional list of publications to search
+
+    Returns:
+      List of dictionaries with publication, id_article, article_date, paragraph,
+      left, match, and right
+    """
+    hits = self.find(phrase, publications)
+    lines = []
+    text = None
+    last_doc = None
+    for doc, paragraph, start in zip(hits['doc'], hits['paragraph'], hits['start']):
+      if doc != last_doc:
+        text = self.text(doc)
+        last_doc = doc
+      start = int(start)
+      after_match = list(islice(word_regex.finditer(text, start), hits['length'] + window))
+      end = after_match[hits['length'] - 1].end()
+      after = after_match[hits['length']:]
+
+      # Only look a little way back (the first word found there might be cut off)
+      lookback = max(0, start - (window + 1) * 40)
+      before = list(word_regex.finditer(text, lookback, start))
+      if lookback > 0:
+        before = before[1:]
+      before = before[-window:] if window else []
+      left_start = before[0].start() if before else start
+      right_end = after[-1].end() if after else end
+      publication, id_article, article_date, article_title = self.documents[doc]
+      lines.append({'publication': publication, 'id_article': id_article, 'article_date': article_date,
+                    'paragraph': int(paragraph),
+                    'left': ' '.join(text[left_start:start].split()),
+                    'match': ' '.join(text[start:end].split()),
+                    'right': ' '.join(text[end:right_end].split())})
+    return(lines)
+
+
+def write_kwic_csv(lines, filename, phrase_column=None):
+  """Save KWIC lines to a CSV file"""
+  columns = ['publication', 'id_article', 'article_date', 'paragraph', 'left', 'match', 'right']
+  if phrase_column:
+    columns = [phrase_column] + columns
+  with open(filename, 'w', newline='', encoding='utf-8') as f:
+    csv_out = csv.writer(f)
+    csv_out.writerow(columns)
+    for line in lines:
+      csv_out.writerow([line[column] for column in columns])
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Build and search a positional index of the corpora with keyword-in-context output.')
+  parser.add_argument('command', choices=['build', 'kwic', 'ngos'],
+                      help='build the index, show the context of a phrase, or of every NGO')
+  parser.add_argument('index', type=str,
+                      help='the folder of the index')
+  parser.add_argument('phrase', type=str, nargs='?', default=None,
+                      help='word or phrase to look for (for kwic)')
+  parser.add_argument('--corpus', nargs=2, action='append', metavar=('DATABASE', 'PUBLICATION'), default=None,
+                      help='a database and its publication name (for build; repeat for each corpus)')
+  parser.add_argument('--all-dates', action='store_true',
+                      help='index articles outside of the project\'s date range too (for build)')
+  parser.add_argument('--drop-duplicates', action='store_true',
+                      help='skip non-canonical near-duplicates (for build; needs find_duplicates.py)')
+  parser.add_argument('--window', type=int, default=10,
+                      help='number of words of context on each side')
+  parser.add_argument('--publication', action='append', default=None,
+                      help='only search this publication (repeatable)')
+  parser.add_argument('--csv', type=str, default=None,
+                      help='save the lines to a CSV file instead of printing them')
+  args = parser.parse_args()
+
+  if args.command == 'build':
+    if not args.corpus:
+      parser.error('build needs at least one --corpus')
+    count = build_index(args.index, read_articles(args.corpus, args.all_dates, args.drop_duplicates))
+    print('Indexed {0} articles'.format(count))
+  else:
+    index = ConcordanceIndex(args.index)
+    if args.command == 'kwic':
+      if not args.phrase:
+        parser.error('kwic needs a phrase')
+      lines = index.kwic(args.phrase, args.window, args.publication)
+    else:
+      lines = []
+      for organization in organizations:
+        for line in index.kwic(organization, args.window, args.publication):
+          line['organization'] = organization
+          lines.append(line)
+
+    if args.csv:
+      write_kwic_csv(lines, args.csv, 'organization' if args.command == 'ngos' else None)
+    else:
+      for line in lines:
+        print('{0:>18} {1:>6} | {2:>70} [{3}] {4}'.format(line['publication'], line['id_article'],
+                                                          line['left'][-70:], line['match'], line['right'][:70]))
+    print('{0} matches'.format(len(lines)), file=sys.stderr)
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+
+# Title:          ngo_network.py
+# Description:    Which of the NGOs are mentioned together (in the same article, paragraph, or
+#                 sentence), how strongly (co-mention counts and PMI), and how that changes
+#                 from month to month.
+#
+#                 Building the network reads article_content_no_tags once and saves a sparse
+#                 incidence matrix for each level: one row per article, paragraph, or sentence
+#                 that mentions at least one NGO, one column per NGO, with rows sorted by month.
+#                 The number of units (with or without NGOs) in each month is saved too, since
+#                 PMI needs it. Co-mention counts for any span of months are then one sparse
+#                 product (X' X) of that span's rows, and sliding windows just add up the
+#                 monthly products, so nothing is ever read from the databases again.
+#
+#                 The network is a folder:
+#                   * incidence.npz: the CSR matrix (indptr, indices) and the document of each
+#                     row for every level, plus the first row of each month
+#                   * months.csv: number of articles, paragraphs, and sentences in each month
+#                     and publication
+#                   * documents.csv: publication, id_article, article_date
+#                   * ngos.txt: one organization per line (the line number is the column)
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 ngo_network.py build Output/ngo_network \
+#                   --corpus Corpora/egypt_independent.db egypt_independent \
+#                   --corpus Corpora/ahram.db ahram --corpus Corpora/dne.db dne
+#                 python3 ngo_network.py edges Output/ngo_network --level paragraph --csv Output/ngo_edges.csv
+#                 python3 ngo_network.py edges Output/ngo_network --window 3 --csv Output/ngo_edges_monthly.csv
+#                 In R:
+#                   edges <- read_csv("../Output/ngo_edges.csv")
+#                   graph <- igraph::graph_from_data_frame(edges, directed=FALSE)
+#                 In Python:
+#                   network = CoMentionNetwork('Output/ngo_network')
+#                   counts, n_units = network.comentions('sentence', months=['2012-06', '2012-07'])
+# Notes:          * NGOs are matched like ngo_query() in corpus_helpers.py: the lowercase name
+#                   anywhere in the punctuation-free text of the unit.
+#                 * Paragraphs are split on newlines (like extract_pos.py). Sentences are split
+#                   after ., ?, and ! followed by a space, so abbreviations like "Dr." end a
+#                   sentence early. Each unit counts once no matter how often an NGO is repeated.
+#                 * The diagonal of a co-mention matrix is the number of units mentioning each NGO.
+
+# Import modules
+import argparse
+import csv
+import os
+import re
+import sys
+
+import numpy as np
+import scipy.sparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prepare_corpus'))
+from corpus_helpers import organizations, read_articles, remove_punc
+
+levels = ['article', 'paragraph', 'sentence']
+sentence_regex = re.compile(r'(?<=[.?!])\s+')
+paragraph_regex = re.compile(r'\n+')
+
+
+#-------------------
+# Helper functions
+#-------------------
+def split_units(text):
+  """Split an article into its paragraphs and sentences
+
+  Returns:
+    Dictionary with a list of texts for each level
+  """
+  paragraphs = [paragraph for paragraph in paragraph_regex.split(text) if paragraph.strip()]
+  sentences = [sentence for paragraph in paragraphs
+               for sentence in sentence_regex.split(paragraph) if sentence.strip()]
+  return({'article': [text], 'paragraph': paragraphs, 'sentence': sentences})
+
+
+def find_ngos(text, patterns):
+  """Get the column of every NGO mentioned in a text"""
+  text = remove_punc(text)
+  return([i for i, pattern in enumerate(patterns) if pattern in text])
+
+
+def pmi(counts, n_units):
+  """Pointwise mutual information of every pair of NGOs that are mentioned together
+
+  Arguments:
+    counts: Sparse co-mention matrix (with unit counts on the diagonal)
+    n_units: Number of units the counts come from
+
+  Returns:
+    Tuple of (COO matrix of PMI, COO matrix of normalized PMI between -1 and 1)
+    for the nonzero off-diagonal cells
+  """
+  counts = scipy.sparse.coo_matrix(counts)
+  totals = counts.diagonal().astype(np.float64)
+  keep = counts.row != counts.col
+  rows, cols, joint = counts.row[keep], counts.col[keep], counts.data[keep].astype(np.float64)
+  values = np.log(joint * n_units / (totals[rows] * totals[cols]))
+  normalizer = -np.log(joint / n_units)
+  normalized = np.divide(values, normalizer, out=np.ones_like(values), where=normalizer > 0)
+  shape = counts.shape
+  return(scipy.sparse.coo_matrix((values, (rows, cols)), shape=shape),
+         scipy.sparse.coo_matrix((normalized, (rows, cols)), shape=shape))
+
+
+#----------------------
+# Build the network
+#----------------------
+def build_network(path, articles):
+  """Write the incidence matrices of a corpus
+
+  Arguments:
+    path: Folder for the network
+    articles: Iterable of (publication, id_article, article_date, article_title, text)
+
+  Returns:
+    Number of articles read
+  """
+  if not os.path.exists(path):
+    os.makedirs(path)
+  patterns = [organization.lower() for organization in organizations]
+
+  documents = []
+  unit_totals = {}  # (month, publication) → number of units at each level
+  rows = {level: [] for level in levels}  # (month, doc, NGO columns) of units that mention NGOs
+  for doc, (publication, id_article, article_date, article_title, text) in enumerate(articles):
+    text = text or ''
+    month = str(article_date)[:7]
+    documents.append((publication, id_article, article_date))
+    units = split_units(text)
+    totals = unit_totals.setdefault((month, publication), {level: 0 for level in levels})
+    for level in levels:
+      totals[level] += len(units[level])
+
+    # Paragraphs and sentences can only mention NGOs that the whole article does
+    if not find_ngos(text, patterns):
+      continue
+    for level in levels:
+      for unit in units[level]:
+        columns = find_ngos(unit, patterns)
+        if columns:
+          rows[level].append((month, doc, columns))
+
+  months = sorted(set(month for month, publication in unit_totals))
+  month_ids = {month: i for i, month in enumerate(months)}
+  arrays = {}
+  for level in levels:
+    level_rows = sorted(rows[level], key=lambda row: (month_ids[row[0]], row[1]))
+    lengths = np.array([len(row[2]) for row in level_rows], dtype=np.int64)
+    arrays[level + '_indptr'] = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    arrays[level + '_indices'] = np.array([column for row in level_rows for column in row[2]], dtype=np.int32)
+    arrays[level + '_doc'] = np.array([row[1] for row in level_rows], dtype=np.int64)
+    row_months = np.array([month_ids[row[0]] for row in level_rows], dtype=np.int64)
+    arrays[level + '_month_starts'] = np.searchsorted(row_months, np.arange(len(months) + 1)).astype(np.int64)
+  np.savez_compressed(os.path.join(path, 'incidence.npz'), **arrays)
+
+  with open(os.path.join(path, 'months.csv'), 'w', newline='', encoding='utf-8') as f:
+    csv_out = csv.writer(f)
+    csv_out.writerow(['month', 'publication'] + levels)
+    for month, publication in sorted(unit_totals):
+      csv_out.writerow([month, publication] + [unit_totals[(month, publication)][level] for level in levels])
+  with open(os.path.join(path, 'documents.csv'), 'w', newline='', encoding='utf-8') as f:
+    csv_out = csv.writer(f)
+    csv_out.writerow(['publication', 'id_article', 'article_date'])
+    csv_out.writerows(documents)
+  with open(os.path.join(path, 'ngos.txt'), 'w', encoding='utf-8') as f:
+    f.write('\n'.join(organizations) + '\n')
+  return(len(documents))
+
+
+#-----------------------
+# Query the network
+#-----------------------
+class CoMentionNetwork:
+  """Read a co-mention network
+
+  Attributes:
+    ngos: List of organizations (in column order)
+    months: List of months ("YYYY-MM")
+    documents: List of (publication, id_article, article_date)
+    incidence: Dictionary of CSR incidence matrices for each level
+  """
+  def __init__(self, path):
+    """Open the network
+
+    Arguments:
+      path: String of path to the network folder
+    """
+    self.path = path
+    with open(os.path.join(path, 'ngos.txt'), encoding='utf-8') as f:
+      self.ngos = [line.rstrip('\n') for line in f if line.strip()]
+    with open(os.path.join(path, 'documents.csv'), newline='', encoding='utf-8') as f:
+      rows = csv.reader(f)
+      next(rows)
+      self.documents = [(publication, int(id_article), article_date) for publication, id_article, article_date in rows]
+    self.publications = np.array([document[0] for document in self.documents])
+
+    self.unit_totals = {}
+    with open(os.path.join(path, 'months.csv'), newline='', encoding='utf-8') as f:
+      for row in csv.DictReader(f):
+        self.unit_totals[(row['month'], row['publication'])] = {level: int(row[level]) for level in levels}
+    self.months = sorted(set(month for month, publication in self.unit_totals))
+
+    arrays = np.load(os.path.join(path, 'incidence.npz'))
+    self.incidence = {}
+    self.docs = {}
+    self.month_starts = {}
+    for level in levels:
+      indices = arrays[level + '_indices']
+      indptr = arrays[level + '_indptr']
+      self.incidence[level] = scipy.sparse.csr_matrix((np.ones(len(indices), dtype=np.int64), indices, indptr),
+                                                      shape=(len(indptr) - 1, len(self.ngos)))
+      self.docs[level] = arrays[level + '_doc']
+      self.month_starts[level] = arrays[level + '_month_starts']
+
+  def n_units(self, level, months=None, publications=None):
+    """Count the articles, paragraphs, or sentences in some months and publications"""
+    return(sum(totals[level] for (month, publication), totals in self.unit_totals.items()
+               if (months is None or month in months) and (publications is None or publication in publications)))
+
+  def rows(self, level, months=None, publications=None):
+    """Get the incidence matrix rows for some months and publications"""
+    if months is None:
+      selected = np.arange(self.incidence[level].shape[0])
+    else:
+      starts = self.month_starts[level]
+      selected = np.concatenate([np.arange(starts[i], starts[i + 1]) for i, month in enumerate(self.months)
+                                 if month in months] or [np.zeros(0, dtype=np.int64)])
+    if publications:
+      selected = selected[np.isin(self.publications[self.docs[level][selected]], publications)]
+    return(selected)
+
+  def comentions(self, level='article', months=None, publications=None):
+    """Count how many units mention each pair of NGOs
+
+    Arguments:
+      level: "article", "paragraph", or "sentence"
+      months: Optional list of months ("YYYY-MM") to count
+      publications: Optional list of publications to count
+
+    Returns:
+      Tuple of (sparse NGO × NGO matrix of counts, number of units counted)
+    """
+    incidence = self.incidence[level][self.rows(level, months, publications)]
+    return((incidence.T @ incidence).tocsr(), self.n_units(level, months, publications))
+
+  def windows(self, level='article', width=3, step=1, publications=None):
+    """Co-mention counts in sliding windows of months
+
+    Each month's counts are computed once and the windows are running sums of
+    them.
+
+    Arguments:
+      level: "article", "paragraph", or "sentence"
+      width: Number of months in each window
+      step: Number of months between the starts of windows
+      publications: Optional list of publications to count
+
+    Returns:
+      List of (first month, last month, sparse matrix of counts, number of units)
+    """
+    monthly = [self.comentions(level, [month], publications) for month in self.months]
+    window_counts = []
+    counts = scipy.sparse.csr_matrix((len(self.ngos), len(self.ngos)), dtype=np.int64)
+    n_units = 0
+    for i, (month_counts, month_units) in enumerate(monthly):
+      counts = counts + month_counts
+      n_units += month_units
+      if i >= width:
+        counts = counts - monthly[i - width][0]
+        n_units -= monthly[i - width][1]
+      start = i - width + 1
+      if start >= 0 and start % step == 0:
+        counts.eliminate_zeros()
+        window_counts.append((self.months[start], self.months[i], counts, n_units))
+    return(window_counts)
+
+  def edges(self, counts, n_units, min_count=1):
+    """Convert a co-mention matrix into an edge list
+
+    Returns:
+      List of dictionaries with source, target, count, source_count,
+      target_count, pmi, and npmi for every pair mentioned together at least
+      min_count times
+    """
+    counts = scipy.sparse.coo_matrix(counts)
+    values, normalized = pmi(counts, n_units)
+    totals = counts.diagonal()
+    edge_list = []
+    for i, j, count, value, normalized_value in zip(counts.row[counts.row != counts.col],
+                                                    counts.col[counts.row != counts.col],
+                                                    counts.data[counts.row != counts.col],
+                                                    values.data, normalized.data):
+      if i < j and count >= min_count:
+        edge_list.append({'source': self.ngos[i], 'target': self.ngos[j], 'count': int(count),
+                          'source_count': int(totals[i]), 'target_count': int(totals[j]),
+                          'pmi': float(value), 'npmi': float(normalized_value)})
+    return(sorted(edge_list, key=lambda edge: (-edge['count'], edge['source'], edge['target'])))
+
+
+def write_edges_csv(edge_list, filename):
+  """Save an edge list (with optional first_month and last_month columns) to a CSV file"""
+  columns = ['source', 'target', 'count', 'source_count', 'target_count', 'pmi', 'npmi']
+  if edge_list and 'first_month' in edge_list[0]:
+    columns = ['first_month', 'last_month'] + columns
+  with open(filename, 'w', newline='', encoding='utf-8') as f:
+    csv_out = csv.writer(f)
+    csv_out.writerow(columns)
+    for edge in edge_list:
+      csv_out.writerow([edge[column] for column in columns])
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Build networks of NGOs mentioned together and export their edges for R.')
+  parser.add_argument('command', choices=['build', 'edges'],
+                      help='build the incidence matrices, or export an edge list')
+  parser.add_argument('network', type=str,
+                      help='the folder of the network')
+  parser.add_argument('--corpus', nargs=2, action='append', metavar=('DATABASE', 'PUBLICATION'), default=None,
+                      help='a database and its publication name (for build; repeat for each corpus)')
+  parser.add_argument('--all-dates', action='store_true',
+                      help='include articles outside of the project\'s date range too (for build)')
+  parser.add_argument('--drop-duplicates', action='store_true',
+                      help='skip non-canonical near-duplicates (for build; needs find_duplicates.py)')
+  parser.add_argument('--level', choices=levels, default='article',
+                      help='count NGOs mentioned in the same article, paragraph, or sentence')
+  parser.add_argument('--window', type=int, default=None,
+                      help='export one network for every window of this many months (default: the whole period)')
+  parser.add_argument('--step', type=int, default=1,
+                      help='number of months between the starts of windows')
+  parser.add_argument('--publication', action='append', default=None,
+                      help='only count this publication (repeatable)')
+  parser.add_argument('--min-count', type=int, default=1,
+                      help='drop pairs mentioned together fewer times than this')
+  parser.add_argument('--csv', type=str, default=None,
+                      help='save the edges to a CSV file instead of printing them')
+  args = parser.parse_args()
+
+  if args.command == 'build':
+    if not args.corpus:
+      parser.error('build needs at least one --corpus')
+    count = build_network(args.network, read_articles(args.corpus, args.all_dates, args.drop_duplicates))
+    print('Read {0} articles'.format(count))
+  else:
+    network = CoMentionNetwork(args.network)
+    if args.window:
+      edge_list = []
+      for first_month, last_month, counts, n_units in network.windows(args.level, args.window, args.step, args.publication):
+        for edge in network.edges(counts, n_units, args.min_count):
+          edge.update({'first_month': first_month, 'last_month': last_month})
+          edge_list.append(edge)
+    else:
+      counts, n_units = network.comentions(args.level, publications=args.publication)
+      edge_list = network.edges(counts, n_units, args.min_count)
+
+    if args.csv:
+      write_edges_csv(edge_list, args.csv)
+    else:
+      for edge in edge_list:
+        print('{0:>5} {1:>7.3f}  {2} — {3}'.format(edge['count'], edge['pmi'], edge['source'], edge['target']))
+    print('{0} edges'.format(len(edge_list)), file=sys.stderr)
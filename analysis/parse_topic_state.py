@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+# Title:          parse_topic_state.py
+# Description:    Convert MALLET's topic-state.gz (one line for every token in the corpus and
+#                 its topic assignment) into compact memory-mapped arrays, without ever holding
+#                 the text lines in memory. The state file is read line by line and written out
+#                 in chunks as three flat arrays:
+#                   * docs.u32: document index of every token
+#                   * types.u32: type (word) index of every token
+#                   * topics.u16: topic assignment of every token
+#                 plus vocabulary.txt (one type per line), documents.txt (the source of each
+#                 document), and hyperparameters.txt (α and β from the state header).
+#                 MALLET writes no lines for empty documents (e.g. ones emptied by
+#                 prune_vocabulary.py), so their lines in documents.txt are blank.
+#
+#                 Summaries that R can't easily get from doc-topics and topic-keys are then
+#                 calculated from the arrays:
+#                   * per-document topic counts and smoothed topic distributions for each
+#                     NGO article (with publication and id_article)
+#                   * per-publication topic-word counts
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 parse_topic_state.py Output/topic-state.gz Output/topic_state
+#                 This creates the arrays in Output/topic_state/ along with:
+#                   * doc_topics.csv: publication, id_article, tokens, topic_0, topic_1, ...
+#                   * publication_topic_words.csv: publication, topic, type, count
+#                 In Python:
+#                   state = TopicState('Output/topic_state')
+#                   state.doc_topic_counts(), state.topic_word_counts(publication='dne')
+
+# Import modules
+import argparse
+import csv
+import gzip
+import os
+import sys
+from array import array
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prepare_corpus'))
+from corpus_helpers import split_document_name
+
+
+#-----------------------
+# Parse the state file
+#-----------------------
+def convert_state(state_file, output_folder, chunk_size=1000000):
+  """Stream a MALLET state file into flat arrays
+
+  Arguments:
+    state_file: Path to the gzipped state file
+    output_folder: Folder for the arrays and label files
+    chunk_size: Number of tokens to hold in memory before writing them out
+  """
+  if not os.path.exists(output_folder):
+    os.makedirs(output_folder)
+
+  vocabulary = {}
+  sources = {}
+  alpha = []
+  beta = []
+  docs, types, topics = array('I'), array('I'), array('H')
+
+  out_docs = open(os.path.join(output_folder, 'docs.u32'), 'wb')
+  out_types = open(os.path.join(output_folder, 'types.u32'), 'wb')
+  out_topics = open(os.path.join(output_folder, 'topics.u16'), 'wb')
+
+  def flush():
+    np.asarray(docs, dtype='<u4').tofile(out_docs)
+    np.asarray(types, dtype='<u4').tofile(out_types)
+    np.asarray(topics, dtype='<u2').tofile(out_topics)
+    del docs[:], types[:], topics[:]
+
+  with gzip.open(state_file, 'rt', encoding='utf-8') as f:
+    for line in f:
+      if line.startswith('#'):
+        # Header lines: "#doc source pos ...", "#alpha : 0.1 0.2 ...", "#beta : 0.01"
+        if line.startswith('#alpha'):
+          alpha = [float(a) for a in line.split(':', 1)[1].split()]
+        elif line.startswith('#beta'):
+          beta = [float(b) for b in line.split(':', 1)[1].split()]
+        continue
+
+      # doc source pos typeindex type topic
+      doc, source, pos, typeindex, word, topic = line.split()
+      doc = int(doc)
+      typeindex = int(typeindex)
+      if doc not in sources:
+        sources[doc] = source
+      if typeindex not in vocabulary:
+        vocabulary[typeindex] = word
+
+      docs.append(doc)
+      types.append(typeindex)
+      topics.append(int(topic))
+      if len(docs) >= chunk_size:
+        flush()
+
+  flush()
+  out_docs.close()
+  out_types.close()
+  out_topics.close()
+
+  with open(os.path.join(output_folder, 'vocabulary.txt'), 'w', encoding='utf-8') as f:
+    f.write('\n'.join(vocabulary.get(i, '') for i in range(max(vocabulary, default=-1) + 1)))
+  with open(os.path.join(output_folder, 'documents.txt'), 'w', encoding='utf-8') as f:
+    f.write('\n'.join(sources.get(i, '') for i in range(max(sources, default=-1) + 1)))
+  with open(os.path.join(output_folder, 'hyperparameters.txt'), 'w', encoding='utf-8') as f:
+    f.write('alpha\t' + ' '.join(repr(a) for a in alpha) + '\n')
+    f.write('beta\t' + ' '.join(repr(b) for b in beta) + '\n')
+
+
+#---------------------------
+# Read the converted state
+#---------------------------
+def _memmap(filename, dtype):
+  if os.path.getsize(filename) == 0:
+    return(np.zeros(0, dtype=dtype))
+  return(np.memmap(filename, dtype=dtype, mode='r'))
+
+
+def _read_lines(filename):
+  with open(filename, 'r', encoding='utf-8') as f:
+    text = f.read()
+  return(text.split('\n') if text else [])
+
+
+class TopicState:
+  """Memory-mapped topic assignments from a converted state file
+
+  Attributes:
+    docs, types, topics: Memory-mapped arrays with one entry per token
+    vocabulary: List of types (index = typeindex)
+    sources: List of document sources (index = doc; blank for empty documents)
+    publications: Publication prefix of each document (e.g. "ahram")
+    article_ids: id_article of each document
+    alpha: Array of document-topic Dirichlet parameters
+    beta: Topic-word Dirichlet parameter
+    num_topics: Number of topics
+  """
+  def __init__(self, path, chunk_size=5000000):
+    """Open the converted state
+
+    Arguments:
+      path: Folder created by convert_state()
+      chunk_size: Number of tokens to count at a time
+    """
+    self.chunk_size = chunk_size
+    self.docs = _memmap(os.path.join(path, 'docs.u32'), '<u4')
+    self.types = _memmap(os.path.join(path, 'types.u32'), '<u4')
+    self.topics = _memmap(os.path.join(path, 'topics.u16'), '<u2')
+    self.vocabulary = _read_lines(os.path.join(path, 'vocabulary.txt'))
+    self.sources = _read_lines(os.path.join(path, 'documents.txt'))
+
+    hyperparameters = dict(line.split('\t') for line in _read_lines(os.path.join(path, 'hyperparameters.txt')) if line)
+    self.alpha = np.array([float(a) for a in hyperparameters.get('alpha', '').split()])
+    beta = hyperparameters.get('beta', '').split()
+    self.beta = float(beta[0]) if beta else None
+    self.num_topics = len(self.alpha) if len(self.alpha) else int(self.topics.max()) + 1
+
+    names = [split_document_name(source) if source else ('', None) for source in self.sources]
+    self.publications = [name[0] for name in names]
+    self.article_ids = [name[1] for name in names]
+
+  def _chunks(self):
+    for start in range(0, len(self.docs), self.chunk_size):
+      end = start + self.chunk_size
+      yield(np.asarray(self.docs[start:end], dtype=np.int64),
+            np.asarray(self.types[start:end], dtype=np.int64),
+            np.asarray(self.topics[start:end], dtype=np.int64))
+
+  def doc_topic_counts(self):
+    """Document × topic matrix of token counts"""
+    num_docs = max(len(self.sources), int(self.docs.max()) + 1 if len(self.docs) else 0)
+    counts = np.zeros(num_docs * self.num_topics, dtype=np.int64)
+    for docs, types, topics in self._chunks():
+      counts += np.bincount(docs * self.num_topics + topics, minlength=len(counts))
+    return(counts.reshape(num_docs, self.num_topics))
+
+  def doc_topic_distributions(self):
+    """Smoothed proportion of each topic in each document (like MALLET's doc topics)"""
+    counts = self.doc_topic_counts()
+    alpha = self.alpha if len(self.alpha) else np.zeros(self.num_topics)
+    return((counts + alpha) / (counts.sum(axis=1)[:, None] + alpha.sum()))
+
+  def topic_word_counts(self, publication=None):
+    """Topic × type matrix of token counts, optionally for just one publication"""
+    num_types = len(self.vocabulary)
+    counts = np.zeros(self.num_topics * num_types, dtype=np.int64)
+    if publication is not None:
+      in_publication = np.array([p == publication for p in self.publications], dtype=bool)
+    for docs, types, topics in self._chunks():
+      if publication is not None:
+        keep = in_publication[docs]
+        types, topics = types[keep], topics[keep]
+      counts += np.bincount(topics * num_types + types, minlength=len(counts))
+    return(counts.reshape(self.num_topics, num_types))
+
+
+#--------------
+# Export CSVs
+#--------------
+def write_doc_topics(state, filename):
+  """Save the topic distribution of every article"""
+  counts = state.doc_topic_counts()
+  distributions = state.doc_topic_distributions()
+  with open(filename, 'w', newline='', encoding='utf-8') as f:
+    csv_out = csv.writer(f)
+    csv_out.writerow(['publication', 'id_article', 'tokens'] + ['topic_' + str(k) for k in range(state.num_topics)])
+    for d in range(len(state.sources)):
+      if not state.sources[d]:
+        continue
+      csv_out.writerow([state.publications[d], state.article_ids[d], counts[d].sum()] +
+                       ['{0:g}'.format(p) for p in distributions[d]])
+
+
+def write_publication_topic_words(state, filename):
+  """Save non-zero topic-word counts for each publication in long format"""
+  with open(filename, 'w', newline='', encoding='utf-8') as f:
+    csv_out = csv.writer(f)
+    csv_out.writerow(['publication', 'topic', 'type', 'count'])
+    for publication in sorted(set(state.publications) - {''}):
+      counts = state.topic_word_counts(publication)
+      for topic, typeindex in zip(*np.nonzero(counts)):
+        csv_out.writerow([publication, topic, state.vocabulary[typeindex], counts[topic, typeindex]])
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Convert a MALLET state file into memory-mapped arrays and topic summaries.')
+  parser.add_argument('state_file', type=str,
+                      help='the gzipped MALLET state file')
+  parser.add_argument('output_folder', type=str,
+                      help='the folder to save arrays and summaries')
+  args = parser.parse_args()
+
+  convert_state(args.state_file, args.output_folder)
+  state = TopicState(args.output_folder)
+  write_doc_topics(state, os.path.join(args.output_folder, 'doc_topics.csv'))
+  write_publication_topic_words(state, os.path.join(args.output_folder, 'publication_topic_words.csv'))
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+# Title:          similar_articles.py
+# Description:    Find the articles most like each other ("articles like this one") across the
+#                 three publications, for checking topics in manual_topic_validation.R and
+#                 looking up related coverage.
+#
+#                 Building the index turns the stemmed corpus into a document-term matrix (with
+#                 doc_term_matrix.py), weights it with TF-IDF (1 + log(count) times smoothed
+#                 IDF), and scales every row to length 1, so the cosine similarity of two
+#                 articles is just the dot product of their rows. A batch of queries is one
+#                 sparse product with the whole matrix, and the top k of each row are picked
+#                 with argpartition. With --dimensions, the rows are also projected onto that
+#                 many random directions; queries then compare the short dense vectors first
+#                 and only score the best few candidates exactly.
+#
+#                 The index is a folder:
+#                   * tfidf.npz: the normalized TF-IDF matrix (scipy.sparse)
+#                   * documents.txt and terms.txt: row and column names
+#                   * idf.npy: the IDF of every term
+#                   * projected.npy: the normalized random projections (with --dimensions)
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 similar_articles.py build Output/similarity Output/corpus_store --min-df 2 --dimensions 256
+#                 python3 similar_articles.py neighbours Output/similarity --k 10 --csv Output/similar_articles.csv
+#                 python3 similar_articles.py neighbours Output/similarity --document ahram_17539.txt --other-publications
+#                 In Python:
+#                   index = SimilarityIndex('Output/similarity')
+#                   neighbours = index.neighbours(index.rows(['dne_4512.txt']), k=5)
+#                 In R:
+#                   neighbours <- read.csv("../Output/similar_articles.csv")
+# Notes:          * Sources can be token stores (see token_store.py) or folders of stemmed text
+#                   files, like doc_term_matrix.py. Use both the NGO and control corpora to find
+#                   neighbours outside of the NGO articles.
+#                 * Projected queries are approximate: a true neighbour can be missed if it isn't
+#                   among the --candidates best projected matches (so raise it for better recall).
+
+# Import modules
+import argparse
+import csv
+import os
+import sys
+
+import numpy as np
+import scipy.sparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prepare_corpus'))
+from corpus_helpers import split_document_name
+from doc_term_matrix import build_matrix
+from token_store import TokenStore, read_lines
+
+
+#-------------------
+# Helper functions
+#-------------------
+def tfidf(counts):
+  """Weight a document-term matrix with TF-IDF and normalize its rows
+
+  Arguments:
+    counts: CSR matrix of term counts
+
+  Returns:
+    Tuple of (CSR matrix with rows of length 1, array of IDF weights)
+  """
+  n_docs = counts.shape[0]
+  df = np.bincount(counts.indices, minlength=counts.shape[1])
+  idf = np.log((1 + n_docs) / (1 + df)) + 1
+
+  weights = counts.astype(np.float64).tocsr()
+  weights.data = (1 + np.log(weights.data)) * idf[weights.indices]
+  return(normalize_rows(weights), idf)
+
+
+def normalize_rows(matrix):
+  """Scale every row of a sparse or dense matrix to length 1 (empty rows stay empty)"""
+  if scipy.sparse.issparse(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+  else:
+    norms = np.sqrt((matrix * matrix).sum(axis=1))
+  norms[norms == 0] = 1
+  if scipy.sparse.issparse(matrix):
+    return(scipy.sparse.diags(1 / norms) @ matrix)
+  return(matrix / norms[:, np.newaxis])
+
+
+def random_projection(matrix, dimensions=256, seed=1234):
+  """Project the rows of a sparse matrix onto random directions
+
+  Uses a sparse sign projection (+1, 0, or -1 with probabilities 1/6, 2/3, and
+  1/6), which keeps cosine similarities about the same.
+
+  Returns:
+    Dense float32 array with normalized rows
+  """
+  random_state = np.random.RandomState(seed)
+  directions = random_state.choice([-1, 0, 1], size=(matrix.shape[1], dimensions), p=[1 / 6, 2 / 3, 1 / 6])
+  projected = np.asarray(matrix @ directions.astype(np.float32), dtype=np.float32)
+  return(normalize_rows(projected).astype(np.float32))
+
+
+def top_k(similarities, k):
+  """Get the columns and values of the k largest values in each row, largest first"""
+  k = min(k, similarities.shape[1])
+  if k == 0:
+    return(np.zeros((similarities.shape[0], 0), dtype=np.int64), np.zeros((similarities.shape[0], 0)))
+  columns = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+  values = np.take_along_axis(similarities, columns, axis=1)
+  order = np.argsort(-values, axis=1, kind='stable')
+  return(np.take_along_axis(columns, order, axis=1), np.take_along_axis(values, order, axis=1))
+
+
+#--------------------
+# Build the index
+#--------------------
+def build_index(path, sources, min_df=1, max_df=1.0, dimensions=None):
+  """Write a similarity index
+
+  Arguments:
+    path: Folder for the index
+    sources: List of token stores or folders of stemmed text files
+    min_df: Drop terms that appear in fewer documents than this
+    max_df: Drop terms that appear in more than this proportion of documents
+    dimensions: Optionally also save random projections with this many dimensions
+
+  Returns:
+    Tuple of (number of documents, number of terms)
+  """
+  if not os.path.exists(path):
+    os.makedirs(path)
+
+  # Put every source in the same vocabulary
+  matrices, names, terms = [], [], {}
+  for source in sources:
+    if os.path.exists(os.path.join(source, 'tokens.u32')):
+      source = TokenStore(source)
+    matrix, source_names, source_terms = build_matrix(source)
+    columns = np.array([terms.setdefault(term, len(terms)) for term in source_terms], dtype=np.int32)
+    matrices.append((matrix, columns))
+    names.extend(source_names)
+  counts = scipy.sparse.vstack([scipy.sparse.csr_matrix((matrix.data, columns[matrix.indices], matrix.indptr),
+                                                        shape=(matrix.shape[0], len(terms)))
+                                for matrix, columns in matrices]).tocsr()
+  counts.sum_duplicates()
+
+  df = np.bincount(counts.indices, minlength=counts.shape[1])
+  keep = np.flatnonzero((df >= min_df) & (df <= max_df * counts.shape[0]))
+  counts = counts[:, keep].tocsr()
+  vocabulary = sorted(terms, key=terms.get)
+  terms = [vocabulary[i] for i in keep]
+
+  weights, idf = tfidf(counts)
+  scipy.sparse.save_npz(os.path.join(path, 'tfidf.npz'), weights.tocsr())
+  np.save(os.path.join(path, 'idf.npy'), idf)
+  if dimensions:
+    np.save(os.path.join(path, 'projected.npy'), random_projection(weights, dimensions))
+  elif os.path.exists(os.path.join(path, 'projected.npy')):
+    os.remove(os.path.join(path, 'projected.npy'))
+  with open(os.path.join(path, 'documents.txt'), 'w', encoding='utf-8') as f:
+    f.write('\n'.join(names))
+  with open(os.path.join(path, 'terms.txt'), 'w', encoding='utf-8') as f:
+    f.write('\n'.join(terms))
+  return(len(names), len(terms))
+
+
+#-------------------
+# Query the index
+#-------------------
+class SimilarityIndex:
+  """Read a similarity index
+
+  Attributes:
+    names: List of document names
+    publications: Array of each document's publication
+    matrix: CSR matrix of normalized TF-IDF rows
+    projected: Dense array of normalized random projections (or None)
+  """
+  def __init__(self, path):
+    """Open the index
+
+    Arguments:
+      path: String of path to the index folder
+    """
+    self.path = path
+    self.names = read_lines(os.path.join(path, 'documents.txt'))
+    self.publications = np.array([split_document_name(name)[0] for name in self.names])
+    self.matrix = scipy.sparse.load_npz(os.path.join(path, 'tfidf.npz')).tocsr()
+    self.matrix_t = self.matrix.T.tocsr()
+    projected = os.path.join(path, 'projected.npy')
+    self.projected = np.load(projected, mmap_mode='r') if os.path.exists(projected) else None
+
+  def rows(self, names):
+    """Get the row of each document name"""
+    positions = {name: i for i, name in enumerate(self.names)}
+    missing = [name for name in names if name not in positions]
+    if missing:
+      raise KeyError('not in the index: {0}'.format(', '.join(missing)))
+    return(np.array([positions[name] for name in names], dtype=np.int64))
+
+  def exclude(self, similarities, queries, columns=None, other_publications=False):
+    """Hide each query itself (and its own publication's articles) from its results"""
+    if columns is None:
+      columns = np.broadcast_to(np.arange(similarities.shape[1]), similarities.shape)
+    similarities[columns == queries[:, np.newaxis]] = -np.inf
+    if other_publications:
+      similarities[self.publications[columns] == self.publications[queries][:, np.newaxis]] = -np.inf
+    return(similarities)
+
+  def exact(self, queries, k, other_publications=False):
+    """Score every document against a batch of queries"""
+    similarities = (self.matrix[queries] @ self.matrix_t).toarray()
+    return(top_k(self.exclude(similarities, queries, other_publications=other_publications), k))
+
+  def approximate(self, queries, k, candidates, other_publications=False):
+    """Find candidates with the projections and score only those exactly"""
+    projected = np.asarray(self.projected[queries]) @ np.asarray(self.projected).T
+    projected = self.exclude(projected, queries, other_publications=other_publications)
+    columns, values = top_k(projected, max(k, candidates))
+
+    # Exact cosine similarity of each query with each of its candidates
+    pairs = self.matrix[np.repeat(queries, columns.shape[1])].multiply(self.matrix[columns.ravel()])
+    similarities = np.asarray(pairs.sum(axis=1)).reshape(columns.shape)
+    similarities[np.isinf(values)] = -np.inf
+    best, similarities = top_k(similarities, k)
+    return(np.take_along_axis(columns, best, axis=1), similarities)
+
+  def neighbours(self, queries=None, k=10, candidates=100, exact=False, other_publications=False, batch_size=500):
+    """Find the k most similar documents to each query
+
+    Arguments:
+      queries: Array of document rows (all documents by default)
+      k: Number of neighbours of each document
+      candidates: Number of projected matches to score exactly (if the index
+        has projections)
+      exact: Score every document even if the index has projections
+      other_publications: Only return articles from other publications
+      batch_size: Number of queries to score at once
+
+    Returns:
+      Tuple of (array of neighbour rows, array of cosine similarities), one
+      row per query. Missing neighbours (e.g. too few articles in other
+      publications) have a similarity of -inf.
+    """
+    if queries is None:
+      queries = np.arange(len(self.names))
+    queries = np.asarray(queries, dtype=np.int64)
+    columns, values = [], []
+    for start in range(0, len(queries), batch_size):
+      batch = queries[start:start + batch_size]
+      if self.projected is None or exact:
+        batch_columns, batch_values = self.exact(batch, k, other_publications)
+      else:
+        batch_columns, batch_values = self.approximate(batch, k, candidates, other_publications)
+      columns.append(batch_columns)
+      values.append(batch_values)
+    if not columns:
+      return(np.zeros((0, k), dtype=np.int64), np.zeros((0, k)))
+    return(np.concatenate(columns), np.concatenate(values))
+
+
+def write_neighbours_csv(index, queries, columns, values, filename):
+  """Save neighbours to a CSV file, one row per query and neighbour"""
+  with open(filename, 'w', newline='', encoding='utf-8') as f:
+    csv_out = csv.writer(f)
+    csv_out.writerow(['document', 'publication', 'id_article', 'rank',
+                      'neighbour', 'neighbour_publication', 'neighbour_id_article', 'similarity'])
+    for query, neighbours, similarities in zip(queries, columns, values):
+      publication, id_article = split_document_name(index.names[query])
+      for rank, (neighbour, similarity) in enumerate(zip(neighbours, similarities), start=1):
+        if np.isinf(similarity):
+          continue
+        neighbour_publication, neighbour_id = split_document_name(index.names[neighbour])
+        csv_out.writerow([index.names[query], publication, id_article, rank,
+                          index.names[neighbour], neighbour_publication, neighbour_id, round(float(similarity), 6)])
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Find the most similar articles with TF-IDF cosine similarity.')
+  parser.add_argument('command', choices=['build', 'neighbours'],
+                      help='build the index, or find neighbours')
+  parser.add_argument('index', type=str,
+                      help='the folder of the index')
+  parser.add_argument('sources', type=str, nargs='*',
+                      help='token stores or folders of stemmed text files (for build)')
+  parser.add_argument('--min-df', type=int, default=1,
+                      help='drop terms that appear in fewer documents than this (for build)')
+  parser.add_argument('--max-df', type=float, default=1.0,
+                      help='drop terms that appear in more than this proportion of documents (for build)')
+  parser.add_argument('--dimensions', type=int, default=None,
+                      help='also save random projections with this many dimensions (for build)')
+  parser.add_argument('--document', action='append', default=None,
+                      help='document to find neighbours of (repeatable; defaults to every document)')
+  parser.add_argument('--k', type=int, default=10,
+                      help='number of neighbours of each document')
+  parser.add_argument('--candidates', type=int, default=100,
+                      help='number of projected matches to score exactly')
+  parser.add_argument('--exact', action='store_true',
+                      help='score every document even if the index has projections')
+  parser.add_argument('--other-publications', action='store_true',
+                      help='only find articles from other publications')
+  parser.add_argument('--csv', type=str, default=None,
+                      help='save the neighbours to a CSV file instead of printing them')
+  args = parser.parse_args()
+
+  if args.command == 'build':
+    if not args.sources:
+      parser.error('build needs at least one source')
+    n_docs, n_terms = build_index(args.index, args.sources, args.min_df, args.max_df, args.dimensions)
+    print('Indexed {0} documents with {1} terms'.format(n_docs, n_terms))
+  else:
+    index = SimilarityIndex(args.index)
+    queries = index.rows(args.document) if args.document else np.arange(len(index.names))
+    columns, values = index.neighbours(queries, args.k, args.candidates, args.exact, args.other_publications)
+    if args.csv:
+      write_neighbours_csv(index, queries, columns, values, args.csv)
+    else:
+      for query, neighbours, similarities in zip(queries, columns, values):
+        print(index.names[query])
+        for neighbour, similarity in zip(neighbours, similarities):
+          if not np.isinf(similarity):
+            print('  {0:.3f}  {1}'.format(similarity, index.names[neighbour]))
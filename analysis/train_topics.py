@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+
+# Title:          train_topics.py
+# Description:    Train an LDA topic model in Python, directly on a token store (see
+#                 prepare_corpus/token_store.py), instead of shelling out to MALLET. There's no
+#                 JVM to start and no text to re-import, so it's easy to try different numbers
+#                 of topics or run a few chains at once on different cores.
+#
+#                 The sampler is a collapsed Gibbs sampler that works on blocks of documents
+#                 at a time with NumPy. Every token in a block is resampled at once from the
+#                 counts as they were at the start of the block, minus its own assignment (the
+#                 same approximation AD-LDA uses to sample in parallel), so smaller blocks are
+#                 closer to MALLET's token-by-token sampler. Like MALLET's --optimize-interval,
+#                 the asymmetric document-topic α and symmetric topic-word β are re-estimated
+#                 with Minka's fixed-point updates every few iterations after a burn-in.
+#
+#                 Output files use MALLET's formats, so create_topic_model.R and
+#                 manual_topic_validation.R can read them the same way:
+#                   * topic keys: topic, α, top words
+#                   * doc topics: doc, name, then topic/proportion pairs sorted by proportion
+#                   * state (gzipped): doc source pos typeindex type topic
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 train_topics.py Output/corpus_store \
+#                   --num-topics 20 --num-iterations 1000 --num-top-words 11 \
+#                   --optimize-interval 20 --optimize-burn-in 50 --random-seed 1234 \
+#                   --output-topic-keys Output/topic-keys.txt \
+#                   --output-doc-topics Output/topic-doctopics.txt \
+#                   --output-state Output/topic-state.gz
+#                 Or run `Rscript create_topic_model.R engine=python` from R/.
+#                 With --chains N, N chains are run in separate processes (with seeds
+#                 seed, seed + 1, ...) and "-chainN" is added to each output file name.
+
+# Import modules
+import argparse
+import gzip
+import os
+import sys
+from multiprocessing import Pool
+
+import numpy as np
+from scipy.special import digamma, gammaln
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prepare_corpus'))
+from token_store import TokenStore
+
+
+#---------------------
+# The topic model
+#---------------------
+class TopicModel:
+  """Collapsed Gibbs sampling LDA on a token store
+
+  Attributes:
+    num_topics: Number of topics
+    alpha: Array of document-topic Dirichlet parameters (one per topic)
+    beta: Topic-word Dirichlet parameter
+    z: Topic assignment of every token
+    doc_topics: Document × topic count matrix
+    topic_words: Topic × word count matrix
+    topic_totals: Number of tokens assigned to each topic
+  """
+  def __init__(self, store, num_topics=20, alpha_sum=50.0, beta=0.01, random_seed=1234, block_size=10000):
+    """Randomly initialize topic assignments
+
+    Arguments:
+      store: TokenStore with the corpus
+      num_topics: Number of topics to model
+      alpha_sum: Sum over topics of the document-topic smoothing (MALLET's --alpha)
+      beta: Topic-word smoothing (MALLET's --beta)
+      random_seed: Seed for the random number generator
+      block_size: Approximate number of tokens to sample at the same time
+    """
+    self.store = store
+    self.num_topics = num_topics
+    self.num_types = len(store.vocabulary)
+    self.alpha = np.full(num_topics, alpha_sum / num_topics)
+    self.beta = beta
+    self.rng = np.random.default_rng(random_seed)
+
+    self.words = np.asarray(store.tokens, dtype=np.int64)
+    self.doc_lengths = np.diff(np.asarray(store.offsets))
+    self.docs = np.repeat(np.arange(len(store)), self.doc_lengths)
+    self.z = self.rng.integers(num_topics, size=len(self.words))
+
+    self.doc_topics = np.zeros((len(store), num_topics), dtype=np.int64)
+    self.topic_words = np.zeros((num_topics, self.num_types), dtype=np.int64)
+    np.add.at(self.doc_topics, (self.docs, self.z), 1)
+    np.add.at(self.topic_words, (self.z, self.words), 1)
+    self.topic_totals = self.topic_words.sum(axis=1)
+
+    # Split the corpus into blocks of whole documents
+    offsets = np.asarray(store.offsets)
+    boundaries = [0]
+    for offset in offsets[1:]:
+      if offset - boundaries[-1] >= block_size:
+        boundaries.append(int(offset))
+    if boundaries[-1] != offsets[-1]:
+      boundaries.append(int(offsets[-1]))
+    self.blocks = list(zip(boundaries[:-1], boundaries[1:]))
+
+  def _update_counts(self, docs, words, topics, sign):
+    np.add.at(self.doc_topics, (docs, topics), sign)
+    np.add.at(self.topic_words, (topics, words), sign)
+    self.topic_totals += sign * np.bincount(topics, minlength=self.num_topics)
+
+  def sample(self):
+    """Run one Gibbs sampling iteration over every block"""
+    beta_sum = self.beta * self.num_types
+    for start, end in self.blocks:
+      docs = self.docs[start:end]
+      words = self.words[start:end]
+      old_topics = self.z[start:end]
+
+      # Each token only removes its own assignment from the counts, so it still
+      # sees the rest of its document (including other tokens in the block)
+      own = np.zeros((len(words), self.num_topics))
+      own[np.arange(len(words)), old_topics] = 1
+
+      # p(z = k) ∝ (n_dk + α_k)(n_kw + β) / (n_k + Vβ)
+      p = (self.doc_topics[docs] - own + self.alpha) * \
+          (self.topic_words[:, words].T - own + self.beta) / \
+          (self.topic_totals - own + beta_sum)
+      cumulative = np.cumsum(p, axis=1)
+      draws = self.rng.random(len(words)) * cumulative[:, -1]
+      topics = (cumulative < draws[:, None]).sum(axis=1)
+      topics = np.minimum(topics, self.num_topics - 1)
+
+      self._update_counts(docs, words, old_topics, -1)
+      self._update_counts(docs, words, topics, 1)
+      self.z[start:end] = topics
+
+  def optimize_hyperparameters(self, iterations=20):
+    """Re-estimate α and β with Minka's fixed-point iterations"""
+    doc_lengths = self.doc_lengths
+    for _ in range(iterations):
+      alpha_sum = self.alpha.sum()
+      denominator = (digamma(doc_lengths + alpha_sum) - digamma(alpha_sum)).sum()
+      numerator = (digamma(self.doc_topics + self.alpha) - digamma(self.alpha)).sum(axis=0)
+      self.alpha = np.maximum(self.alpha * numerator / denominator, 1e-10)
+
+    for _ in range(iterations):
+      beta_sum = self.beta * self.num_types
+      numerator = (digamma(self.topic_words + self.beta) - digamma(self.beta)).sum()
+      denominator = self.num_types * (digamma(self.topic_totals + beta_sum) - digamma(beta_sum)).sum()
+      self.beta = max(self.beta * numerator / denominator, 1e-10)
+
+  def log_likelihood(self):
+    """Log likelihood of the current topic assignments"""
+    alpha_sum = self.alpha.sum()
+    beta_sum = self.beta * self.num_types
+    doc_part = (gammaln(alpha_sum) - gammaln(self.doc_lengths + alpha_sum)).sum() + \
+               (gammaln(self.doc_topics + self.alpha) - gammaln(self.alpha)).sum()
+    topic_part = (gammaln(beta_sum) - gammaln(self.topic_totals + beta_sum)).sum() + \
+                 (gammaln(self.topic_words + self.beta) - gammaln(self.beta)).sum()
+    return(doc_part + topic_part)
+
+  def train(self, num_iterations=1000, optimize_interval=20, optimize_burnin=50, verbose=False):
+    """Run the sampler, optimizing hyperparameters along the way"""
+    for iteration in range(1, num_iterations + 1):
+      self.sample()
+      if optimize_interval and iteration > optimize_burnin and iteration % optimize_interval == 0:
+        self.optimize_hyperparameters()
+      if verbose and iteration % 50 == 0:
+        print('Iteration {0}: LL/token = {1:.5f}'.format(iteration, self.log_likelihood() / max(len(self.words), 1)))
+
+  def doc_topic_proportions(self):
+    """Smoothed proportion of each topic in each document (like MALLET's doc topics)"""
+    return((self.doc_topics + self.alpha) / (self.doc_lengths[:, None] + self.alpha.sum()))
+
+
+  #-----------------------
+  # Write MALLET output
+  #-----------------------
+  def write_topic_keys(self, filename, num_top_words=11):
+    """Save each topic's α and its most common words"""
+    with open(filename, 'w', encoding='utf-8') as f:
+      for k in range(self.num_topics):
+        top = np.argsort(-self.topic_words[k], kind='stable')[:num_top_words]
+        f.write('{0}\t{1:g}\t{2} \n'.format(k, self.alpha[k], ' '.join(self.store.vocabulary[w] for w in top)))
+
+  def write_doc_topics(self, filename):
+    """Save every document's topics sorted by proportion"""
+    proportions = self.doc_topic_proportions()
+    with open(filename, 'w', encoding='utf-8') as f:
+      f.write('#doc name topic proportion ...\n')
+      for d, name in enumerate(self.store.names):
+        order = np.argsort(-proportions[d], kind='stable')
+        pairs = '\t'.join('{0}\t{1:g}'.format(k, proportions[d, k]) for k in order)
+        f.write('{0}\t{1}\t{2}\n'.format(d, name, pairs))
+
+  def write_state(self, filename, source_prefix=''):
+    """Save the topic assignment of every token as a gzipped MALLET state file"""
+    with gzip.open(filename, 'wt', encoding='utf-8') as f:
+      f.write('#doc source pos typeindex type topic\n')
+      f.write('#alpha : ' + ' '.join('{0:g}'.format(a) for a in self.alpha) + '\n')
+      f.write('#beta : {0:g}\n'.format(self.beta))
+      for d, name in enumerate(self.store.names):
+        start, end = self.store.offsets[d], self.store.offsets[d + 1]
+        for pos, (w, k) in enumerate(zip(self.words[start:end], self.z[start:end])):
+          f.write('{0} {1}{2} {3} {4} {5} {6}\n'.format(d, source_prefix, name, pos, w, self.store.vocabulary[w], k))
+
+
+#------------
+# Run stuff
+#------------
+def chain_filename(filename, chain, num_chains):
+  """Add -chainN to a file name when running more than one chain"""
+  if filename is None or num_chains == 1:
+    return(filename)
+  base, extension = os.path.splitext(filename)
+  if extension == '.gz':
+    base, inner = os.path.splitext(base)
+    extension = inner + extension
+  return('{0}-chain{1}{2}'.format(base, chain, extension))
+
+
+def run_chain(options):
+  """Train one chain and save its output (used by multiprocessing)"""
+  args, chain = options
+  model = TopicModel(TokenStore(args.store), args.num_topics, args.alpha, args.beta,
+                     args.random_seed + chain, args.block_size)
+  model.train(args.num_iterations, args.optimize_interval, args.optimize_burnin, args.verbose)
+
+  if args.output_topic_keys:
+    model.write_topic_keys(chain_filename(args.output_topic_keys, chain, args.chains), args.num_top_words)
+  if args.output_doc_topics:
+    model.write_doc_topics(chain_filename(args.output_doc_topics, chain, args.chains))
+  if args.output_state:
+    model.write_state(chain_filename(args.output_state, chain, args.chains), args.source_prefix)
+  return(chain, model.log_likelihood())
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Train an LDA topic model on a token store with collapsed Gibbs sampling.')
+  parser.add_argument('store', type=str,
+                      help='the path to the token store')
+  parser.add_argument('--num-topics', type=int, default=20,
+                      help='number of topics to model')
+  parser.add_argument('--num-iterations', type=int, default=1000,
+                      help='number of Gibbs sampling iterations')
+  parser.add_argument('--num-top-words', type=int, default=11,
+                      help='number of most probable words to save for each topic')
+  parser.add_argument('--optimize-interval', type=int, default=20,
+                      help='number of iterations between reestimating dirichlet hyperparameters (0 to turn off)')
+  parser.add_argument('--optimize-burn-in', dest='optimize_burnin', type=int, default=50,
+                      help='number of iterations to run before first estimating dirichlet hyperparameters')
+  parser.add_argument('--alpha', type=float, default=50.0,
+                      help='sum over topics of smoothing over doc-topic distributions')
+  parser.add_argument('--beta', type=float, default=0.01,
+                      help='smoothing parameter for each topic-word')
+  parser.add_argument('--random-seed', type=int, default=1234,
+                      help='seed for the random number generator')
+  parser.add_argument('--block-size', type=int, default=10000,
+                      help='approximate number of tokens to sample at the same time')
+  parser.add_argument('--chains', type=int, default=1,
+                      help='number of independent chains to run in parallel')
+  parser.add_argument('--output-topic-keys', type=str, default=None,
+                      help='file for the top words in each topic')
+  parser.add_argument('--output-doc-topics', type=str, default=None,
+                      help='file for the topic proportions in each document')
+  parser.add_argument('--output-state', type=str, default=None,
+                      help='gzipped file for the topic assignment of every token')
+  parser.add_argument('--source-prefix', type=str, default='articles_stemmed/',
+                      help='prefix added to document names in the state file')
+  parser.add_argument('--verbose', action='store_true',
+                      help='print the log likelihood every 50 iterations')
+  args = parser.parse_args()
+
+  if args.chains == 1:
+    results = [run_chain((args, 0))]
+  else:
+    with Pool(min(args.chains, os.cpu_count() or 1)) as pool:
+      results = pool.map(run_chain, [(args, chain) for chain in range(args.chains)])
+
+  for chain, log_likelihood in results:
+    print('Chain {0}: log likelihood = {1:.1f}'.format(chain, log_likelihood))
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+# Title:          apply_fixes.py
+# Description:    Batch version of manual_fixes.py. Instead of pasting one article at a time into
+#                 the my_* variables, write all the corrections (DNE bylines, Word cruft, files
+#                 that broke parse_html.py, ...) in a fixes file and apply them with one command.
+#                 Every fix is validated first; if anything is wrong, nothing is written.
+#                 Otherwise all the fixes are applied in a single transaction, and author,
+#                 source, and tag ids are looked up once and cached for the whole batch.
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 apply_fixes.py Corpora/dne.db fixes/dne.json --dry-run
+#                 python3 apply_fixes.py Corpora/dne.db fixes/dne.json
+# Notes:          Fixes files are JSON (a list of objects) or CSV (one fix per row, with
+#                 authors, sources, and tags separated by |; empty cells are ignored). Each fix has:
+#                   * action: "insert" or "update"
+#                   * article_url (or id_article, for updates) to find the article
+#                   * any article columns to set (article_title, article_date, article_content, ...)
+#                   * authors, sources, and/or tags, which replace the article's current ones
+#                 For example:
+#                   [{"action": "insert", "article_url": "http://www.dailynewsegypt.com/2012/10/29/...",
+#                     "article_title": "Coptic voters select...", "article_date": "October 29, 2012",
+#                     "article_type": "News", "article_content": "<p>Monday’s election...</p>",
+#                     "sources": ["Daily News Egypt"], "tags": ["DNE", "egypt", "Papa Elections"]},
+#                    {"action": "update", "id_article": 4512, "authors": ["Rana Muhammad Taha"]}]
+#                 * Inserts need a title, date, URL, type, and content. Inserting a URL that's
+#                   already in the database updates that article instead, so running the same
+#                   file twice gives the same database.
+#                 * If article_content is given without article_content_no_tags, the tag-free
+#                   text, punctuation-free text, and word count are rebuilt from it. Tags are
+#                   lowercased like in parse_html.py.
+
+# Import modules
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prepare_corpus'))
+from compressed_text import connect
+from derived_text import clean_content, punc_regex
+
+# Columns that a fix can set
+article_fields = ['article_title', 'article_subtitle', 'article_date', 'article_url', 'article_type',
+                  'article_content', 'article_content_no_tags', 'article_content_no_punc',
+                  'article_word_count', 'article_translated']
+required_fields = ['article_title', 'article_date', 'article_url', 'article_type', 'article_content']
+
+# Junction tables for authors, sources, and tags
+name_tables = {
+  'authors': ('authors', 'id_author', 'author_name', 'articles_authors', 'fk_author'),
+  'sources': ('sources', 'id_source', 'source_name', 'articles_sources', 'fk_source'),
+  'tags': ('tags', 'id_tag', 'tag_name', 'articles_tags', 'fk_tag')
+}
+
+# Date formats used by the three sites (and SQLite)
+date_formats = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+                '%A %d %b %Y', '%B %d, %Y', '%B %d, %Y %H:%M']
+
+
+#----------------------
+# Read the fixes file
+#----------------------
+def read_fixes(filename):
+  """Read a JSON or CSV fixes file into a list of dictionaries"""
+  if filename.endswith('.json'):
+    with open(filename, encoding='utf-8') as f:
+      return(json.load(f))
+
+  fixes = []
+  with open(filename, newline='', encoding='utf-8') as f:
+    for row in csv.DictReader(f):
+      fix = {}
+      for key, value in row.items():
+        if value is None or value == '':
+          continue
+        if key in name_tables:
+          fix[key] = [name.strip() for name in value.split('|') if name.strip() != '']
+        else:
+          fix[key] = value
+      fixes.append(fix)
+  return(fixes)
+
+
+#-------------------
+# Validate fixes
+#-------------------
+def parse_date(value):
+  """Convert a date in any of date_formats to SQLite's timestamp text"""
+  for date_format in date_formats:
+    try:
+      return(datetime.strptime(value.strip(), date_format).strftime('%Y-%m-%d %H:%M:%S'))
+    except ValueError:
+      continue
+  raise ValueError('unknown date format: {0}'.format(value))
+
+
+def normalize_fix(fix):
+  """Check one fix and fill in everything that can be derived
+
+  Returns:
+    The cleaned-up fix
+
+  Raises:
+    ValueError if the fix can't be applied
+  """
+  unknown = set(fix) - set(article_fields) - set(name_tables) - {'action', 'id_article'}
+  if unknown:
+    raise ValueError('unknown fields: {0}'.format(', '.join(sorted(unknown))))
+
+  action = fix.get('action')
+  if action not in ['insert', 'update']:
+    raise ValueError('action must be "insert" or "update", not {0!r}'.format(action))
+  if action == 'insert':
+    missing = [field for field in required_fields if not fix.get(field)]
+    if missing:
+      raise ValueError('inserts need {0}'.format(', '.join(missing)))
+  elif not fix.get('id_article') and not fix.get('article_url'):
+    raise ValueError('updates need id_article or article_url')
+
+  fix = dict(fix)
+  if 'id_article' in fix:
+    fix['id_article'] = int(fix['id_article'])
+  if 'article_date' in fix:
+    fix['article_date'] = parse_date(fix['article_date'])
+  if 'article_word_count' in fix:
+    fix['article_word_count'] = int(fix['article_word_count'])
+  if 'article_translated' in fix:
+    fix['article_translated'] = int(str(fix['article_translated']).lower() in ['1', 'true', 'yes'])
+
+  # Rebuild the cleaned text like parse_html.py does
+  if 'article_content_no_tags' in fix:
+    no_punc = punc_regex.sub(' ', fix['article_content_no_tags'].lower())
+    fix.setdefault('article_content_no_punc', no_punc)
+    fix.setdefault('article_word_count', len(no_punc.split()))
+  elif 'article_content' in fix:
+    no_tags, no_punc, word_count = clean_content(fix['article_content'])
+    fix['article_content_no_tags'] = no_tags
+    fix.setdefault('article_content_no_punc', no_punc)
+    fix.setdefault('article_word_count', word_count)
+
+  for names in name_tables:
+    if names in fix:
+      if isinstance(fix[names], str):
+        raise ValueError('{0} must be a list'.format(names))
+      fix[names] = [name.strip() for name in fix[names] if name.strip() != '']
+  if 'tags' in fix:
+    fix['tags'] = [tag.lower() for tag in fix['tags']]
+  return(fix)
+
+
+def validate_fixes(fixes):
+  """Check every fix
+
+  Returns:
+    Tuple of (list of cleaned-up fixes, list of error messages)
+  """
+  valid = []
+  errors = []
+  for number, fix in enumerate(fixes, start=1):
+    try:
+      valid.append(normalize_fix(fix))
+    except (ValueError, TypeError, AttributeError) as e:
+      errors.append('Fix {0} ({1}): {2}'.format(number, fix.get('article_url', fix.get('id_article')), e))
+  return(valid, errors)
+
+
+#------------------
+# Apply the fixes
+#------------------
+class NameCache:
+  """Ids of every author, source, or tag, loaded once and added to as needed"""
+  def __init__(self, conn, table, id_column, name_column):
+    self.conn = conn
+    self.table = table
+    self.name_column = name_column
+    self.ids = dict(conn.execute('SELECT {0}, {1} FROM {2}'.format(name_column, id_column, table)))
+
+  def get(self, name):
+    if name not in self.ids:
+      cursor = self.conn.execute('INSERT INTO {0} ({1}) VALUES (?)'.format(self.table, self.name_column), (name, ))
+      self.ids[name] = cursor.lastrowid
+    return(self.ids[name])
+
+
+def find_article(conn, fix):
+  """Get the id of the article a fix is for (or None if it's new)"""
+  if fix.get('id_article'):
+    row = conn.execute('SELECT id_article FROM articles WHERE id_article = ?', (fix['id_article'], )).fetchone()
+  else:
+    row = conn.execute('SELECT id_article FROM articles WHERE article_url = ?', (fix['article_url'], )).fetchone()
+  return(row[0] if row else None)
+
+
+def apply_fix(conn, fix, caches):
+  """Insert or update one article and replace its authors, sources, and tags
+
+  Returns:
+    "inserted" or "updated"
+  """
+  id_article = find_article(conn, fix)
+  fields = [field for field in article_fields if field in fix]
+
+  if id_article is None:
+    if fix['action'] == 'update':
+      raise ValueError('no article matches {0}'.format(fix.get('id_article') or fix.get('article_url')))
+    conn.execute('INSERT INTO articles ({0}) VALUES ({1})'.format(
+      ', '.join(fields), ', '.join('?' for _ in fields)), [fix[field] for field in fields])
+    # cursor.lastrowid isn't set by inserts into the `articles` view of compressed
+    # and derived databases, so always look the new article up by its URL
+    id_article = find_article(conn, {'article_url': fix['article_url']})
+    result = 'inserted'
+  else:
+    if fields:
+      conn.execute('UPDATE articles SET {0} WHERE id_article = ?'.format(
+        ', '.join('{0} = ?'.format(field) for field in fields)), [fix[field] for field in fields] + [id_article])
+    result = 'updated'
+
+  for names, (table, id_column, name_column, junction, fk_column) in name_tables.items():
+    if names not in fix:
+      continue
+    ids = set(caches[names].get(name) for name in fix[names])
+    conn.execute('DELETE FROM {0} WHERE fk_article = ?'.format(junction), (id_article, ))
+    conn.executemany('INSERT INTO {0} (fk_article, {1}) VALUES (?, ?)'.format(junction, fk_column),
+                     [(id_article, name_id) for name_id in sorted(ids)])
+  return(result)
+
+
+def apply_fixes(database, fixes, dry_run=False):
+  """Validate a list of fixes and apply them all in one transaction
+
+  Arguments:
+    database: Path to the corpus database
+    fixes: List of fix dictionaries (see read_fixes())
+    dry_run: Roll everything back at the end
+
+  Returns:
+    Dictionary with the number of inserted and updated articles
+
+  Raises:
+    ValueError (and writes nothing) if any fix is invalid
+  """
+  fixes, errors = validate_fixes(fixes)
+  if errors:
+    raise ValueError('\n'.join(errors))
+
+  conn = connect(database, isolation_level=None)
+  conn.execute('PRAGMA foreign_keys = ON')
+  counts = {'inserted': 0, 'updated': 0}
+  conn.execute('BEGIN')
+  try:
+    caches = {names: NameCache(conn, table, id_column, name_column)
+              for names, (table, id_column, name_column, junction, fk_column) in name_tables.items()}
+    for number, fix in enumerate(fixes, start=1):
+      try:
+        counts[apply_fix(conn, fix, caches)] += 1
+      except (ValueError, sqlite3.IntegrityError) as e:
+        raise ValueError('Fix {0} ({1}): {2}'.format(number, fix.get('article_url', fix.get('id_article')), e))
+  except Exception:
+    conn.execute('ROLLBACK')
+    conn.close()
+    raise
+  conn.execute('ROLLBACK' if dry_run else 'COMMIT')
+  conn.close()
+  return(counts)
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Apply a file of manual fixes to a corpus database in one transaction.')
+  parser.add_argument('database', type=str,
+                      help='the path to the database')
+  parser.add_argument('fixes', type=str,
+                      help='JSON or CSV file of fixes')
+  parser.add_argument('--dry-run', action='store_true',
+                      help='check and apply the fixes, then roll everything back')
+  args = parser.parse_args()
+
+  try:
+    counts = apply_fixes(args.database, read_fixes(args.fixes), args.dry_run)
+  except ValueError as e:
+    print(e)
+    sys.exit(1)
+  print('{0} {1} articles and {2} {3} articles'.format('Would insert' if args.dry_run else 'Inserted', counts['inserted'],
+                                                       'would update' if args.dry_run else 'updated', counts['updated']))
@@ -1,43 +1,37 @@
 #!/usr/bin/env python3
 
 # Title:          clean_egind.py
-# Description:    Filter a directory of HTML files, copying legitimate files to a new folder
+# Description:    Filter a directory of HTML files, linking legitimate files into a new folder
 #                 Necessary because Egypt Independent's Drupal installation served up multiple 
 #                 versions of each page (probably because of Views), and httrack added a bunch 
 #                 of temporary files
+#                 The list of legitimate files comes from the mirror's index (see
+#                 mirror_index.py), which is built the first time the script runs. Files are
+#                 reflinked or hard linked instead of copied when the filesystem allows it
+#                 (see `link_method` and mirror_index.flatten_mirror()).
 # Author:         Andrew Heiss
-# Last updated:   2013-07-05
+# Last updated:   2026-10-18
 # Python version: ≥3.0
-# Usage:          Edit the two variables below and run the script
-#                 Manual hand-holding: I'm too lazy to programmatically filter out directories, 
-#                   so the script chokes every time it comes across one. When that happens, just 
-#                   delete the folder (and any corresponding folder.tmp or folder.html) files and
-#                   run the script again. (Or add a check for directories or something :) )
+# Usage:          Edit the variables below and run the script
+#                 Set `rescan` to True if the mirror has changed since it was indexed.
+# Notes:          Folders and .tmp files are filtered out by the index, so the script doesn't
+#                 choke on them anymore.
+#                 Hard links are the same file as the mirror, so fixing a file in the clean
+#                 folder fixes it in the mirror too. Use 'copy' to keep the mirror pristine.
 
 #---------
 # Set up
 #---------
-files_to_clean = 'egind_test/*'  # Must have trailing /*
+files_to_clean = 'egind_test'  # Folder of downloaded files
 folder_for_clean_files = 'egind_clean'  # Just the name of the folder (no trailing /)
+mirror_index = None  # Defaults to egind_test.index.db
+rescan = False
+link_method = 'auto'  # 'auto', 'reflink', 'hardlink', 'symlink', or 'copy'
 
 
 # Import modules
-from os import path, makedirs
-from shutil import copy2
-from glob import glob
+from mirror_index import flatten_mirror
 
-# Strings to ignore (weird things added by Drupal and/or httrack in Egypt Independent)
-ignore_these = ('.tmp', '2d85.html', 'b6c9.html', 'ed36.html')
-
-# Make a list of just the clean HTML files
-clean_file_list = [html_file for html_file in glob(files_to_clean) 
-                    if not any(extension in html_file for extension in ignore_these)
-                  ]
-
-# Make the new folder
-if not path.exists(folder_for_clean_files):
-  makedirs(folder_for_clean_files)
-
-# Copy files to the new folder
-for clean_file in clean_file_list:
-  copy2(clean_file, folder_for_clean_files)
+# Link just the clean HTML files (the ignored ones are in mirror_index.egind_ignore) into the new folder
+counts = flatten_mirror(files_to_clean, 'egind', folder_for_clean_files, link_method, mirror_index, rescan)
+print(counts)
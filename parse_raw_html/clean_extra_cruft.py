@@ -1,73 +1,184 @@
 #!/usr/bin/env python3
 
 # Title:          clean_extra_cruft.py
-# Description:    When initially importing the articles, I forgot to strip out <style> tags 
-#                 from all three publications and Word HTML comments from Daily News Egypt 
-#                 and Egypt Independent. This script finds all database entries with errant 
+# Description:    When initially importing the articles, I forgot to strip out <style> tags
+#                 from all three publications and Word HTML comments from Daily News Egypt
+#                 and Egypt Independent. This script finds all database entries with errant
 #                 tags and re-cleans the content.
+#
+#                 Each kind of cruft has a detector (an SQL condition) below, so there's no
+#                 need to edit the SELECT statement anymore. Matching articles are read in
+#                 chunks, re-cleaned by a pool of worker processes, and written back in one
+#                 transaction per chunk (with the database in WAL mode). Only articles whose
+#                 text actually changes are updated.
 # Author:         Andrew Heiss
-# Last updated:   2013-08-28
+# Last updated:   2026-10-18
 # Python version: ≥3.0
-# Usage:          Edit the database variable AND modify the SQL SELECT statement to search for the correct offending entries
-
-
-# Database to work with
-database = 'Corpora/egypt_independent.db'
+# Usage:          python3 clean_extra_cruft.py Corpora/egypt_independent.db --dry-run
+#                 python3 clean_extra_cruft.py Corpora/egypt_independent.db --detector style --processes 4
+#                 Without --detector, all detectors are used. --dry-run counts the matching
+#                 articles and how many would change without writing anything.
+# Notes:          * The cleaning is the same as before: remove HTML comments, extract <script>,
+#                   <style>, <br>, and <div> tags (like Article._strip_extra_tags()), then
+#                   rebuild the tag-free text, punctuation-free text, and word count.
+#                 * BeautifulSoup uses Python's built-in html.parser, so the output doesn't
+#                   depend on whether lxml is installed (lxml wraps fragments in <html><body>).
+#                 * Works with compressed and derived databases (see prepare_corpus/compressed_text.py).
 
 # Import modules
-import sqlite3
-import string
-import re
+import argparse
+import os
+import sys
+from collections import deque
+from multiprocessing import Pool
+
 from bs4 import BeautifulSoup, Comment
-from parse_html import Article  # Import functions from parse_html.py
 
-# Connect to database
-conn = sqlite3.connect(database, detect_types=sqlite3.PARSE_DECLTYPES)
-conn.row_factory = sqlite3.Row  # Use a dictionary cursor
-c = conn.cursor()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prepare_corpus'))
+from compressed_text import connect
+from derived_text import clean_content
 
-# Turn on foreign keys (just for fun)
-c.execute("""PRAGMA foreign_keys = ON""")
 
-# Select potentially offending articles
-# c.execute("SELECT * FROM articles WHERE article_content LIKE \"%<style type%\"")
-# c.execute("SELECT * FROM articles WHERE article_content LIKE \"%if gte%\"")
-c.execute("SELECT * FROM articles WHERE article_content_no_tags LIKE \"%<%\"")
+# Kinds of cruft and the SQL conditions that find them
+detectors = {
+  'word_comments': "article_content LIKE '%if gte%'",  # Word HTML comments
+  'style': "article_content LIKE '%<style%'",  # <style> blocks
+  'leftover_tags': "article_content_no_tags LIKE '%<%'"  # Tags that survived stripping
+}
 
-rows = c.fetchall()  # Get the results
 
-# Loop through the results
-for row in rows:
-  id_article = row['id_article']
+#---------------------
+# Cleaning functions
+#---------------------
+def reclean_article(content):
+  """Re-clean the HTML of one article
+
+  Returns:
+    Tuple of (content, content without tags, content without punctuation, word count)
+  """
+  soup = BeautifulSoup(content, 'html.parser')
 
   # Remove lame Word HTML comments
-  soup = BeautifulSoup(row['article_content'])
-  for comment in soup.findAll(
-    text=lambda text: isinstance(text, Comment)):
+  for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
     comment.extract()
-  article_content = str(soup)
-
-  # Re-clean the content
-  article_content_fixed = Article._strip_extra_tags(None, article_content)
-
-  # Strip all tags
-  fixed_list = article_content_fixed.split('\n')  # Split
-  article_content_no_tags_fixed = [Article._strip_all_tags(None, chunk) for chunk in fixed_list]
-  article_content_no_tags_fixed = '\n'.join([chunk for chunk in article_content_no_tags_fixed if chunk != ''])
-
-  # No punctuation
-  punc = string.punctuation.replace('-', '') + '–—”’“‘'  # Define punctuation
-  regex = re.compile('[%s]' % re.escape(punc))
-  article_content_no_punc_fixed = regex.sub(' ', article_content_no_tags_fixed.lower()) 
-
-  # Word count
-  word_count_fixed = len(article_content_no_punc_fixed.split())
-
-  # Update the entry with the cleaned and fixed data
-  c.execute("UPDATE articles SET article_content=?, article_content_no_tags=?, article_content_no_punc=?, article_word_count=? WHERE id_article=?", (article_content_fixed, article_content_no_tags_fixed, article_content_no_punc_fixed, word_count_fixed, id_article))
-  conn.commit()
-
 
-# Close everything up
-c.close()
-conn.close()
+  # Get rid of extraneous tags
+  for tag in soup.find_all(['script', 'style', 'br', 'div']):
+    tag.extract()
+
+  content_fixed = str(soup)
+  return((content_fixed, ) + clean_content(content_fixed))
+
+
+def reclean_chunk(rows):
+  """Re-clean a chunk of (id_article, content, content_no_tags, content_no_punc, word_count) rows
+
+  Returns:
+    List of (content, no_tags, no_punc, word_count, id_article) for articles that changed
+  """
+  updates = []
+  for id_article, content, no_tags, no_punc, word_count in rows:
+    fixed = reclean_article(content)
+    if fixed != (content, no_tags, no_punc, word_count):
+      updates.append(fixed + (id_article, ))
+  return(updates)
+
+
+#---------------------
+# Database functions
+#---------------------
+def read_chunks(conn, where, chunk_size):
+  """Yield chunks of matching articles in id order
+
+  Each chunk is a new query starting after the last id of the previous one, so
+  updates between chunks don't disturb the scan.
+  """
+  sql = """SELECT id_article, article_content, article_content_no_tags, article_content_no_punc, article_word_count
+    FROM articles WHERE id_article > ? AND ({0}) ORDER BY id_article LIMIT ?""".format(where)
+  last_id = -1
+  while True:
+    rows = conn.execute(sql, (last_id, chunk_size)).fetchall()
+    if not rows:
+      break
+    last_id = rows[-1][0]
+    yield(rows)
+
+
+def write_updates(conn, updates):
+  """Save a chunk of re-cleaned articles in one transaction"""
+  with conn:
+    conn.executemany("""UPDATE articles SET article_content = ?, article_content_no_tags = ?,
+      article_content_no_punc = ?, article_word_count = ? WHERE id_article = ?""", updates)
+
+
+def reclean_database(database, detector_names=None, chunk_size=200, processes=1, dry_run=False):
+  """Find and re-clean every article with cruft
+
+  Arguments:
+    database: Path to the corpus database
+    detector_names: List of detectors to use (defaults to all of them)
+    chunk_size: Number of articles to read, clean, and write at a time
+    processes: Number of worker processes
+    dry_run: Count articles without changing anything
+
+  Returns:
+    Tuple of (dictionary of matches per detector, number of changed articles)
+  """
+  detector_names = detector_names or list(detectors)
+  conn = connect(database)
+  if not dry_run:
+    # WAL mode is saved in the database file, so leave it alone for dry runs
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+
+  matches = {name: conn.execute('SELECT COUNT(*) FROM articles WHERE ' + detectors[name]).fetchone()[0]
+             for name in detector_names}
+  where = ' OR '.join('(' + detectors[name] + ')' for name in detector_names)
+
+  changed = 0
+
+  def finish(updates):
+    if not dry_run and updates:
+      write_updates(conn, updates)
+    return(len(updates))
+
+  if processes > 1:
+    # Keep a few chunks in flight so the workers don't wait on the database
+    with Pool(processes) as pool:
+      pending = deque()
+      for rows in read_chunks(conn, where, chunk_size):
+        pending.append(pool.apply_async(reclean_chunk, (rows, )))
+        if len(pending) >= processes * 2:
+          changed += finish(pending.popleft().get())
+      while pending:
+        changed += finish(pending.popleft().get())
+  else:
+    for rows in read_chunks(conn, where, chunk_size):
+      changed += finish(reclean_chunk(rows))
+
+  conn.close()
+  return(matches, changed)
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Find and re-clean articles with leftover HTML cruft.')
+  parser.add_argument('database', type=str,
+                      help='the path to the database')
+  parser.add_argument('--detector', action='append', choices=sorted(detectors), default=None,
+                      help='kind of cruft to look for (repeatable; defaults to all)')
+  parser.add_argument('--chunk-size', type=int, default=200,
+                      help='number of articles to clean and write at a time')
+  parser.add_argument('--processes', type=int, default=1,
+                      help='number of worker processes')
+  parser.add_argument('--dry-run', action='store_true',
+                      help='count matching and changed articles without writing anything')
+  args = parser.parse_args()
+
+  matches, changed = reclean_database(args.database, args.detector, args.chunk_size,
+                                      args.processes, args.dry_run)
+  for name, count in matches.items():
+    print('{0}: {1} articles'.format(name, count))
+  print('{0} {1} articles'.format('Would change' if args.dry_run else 'Changed', changed))
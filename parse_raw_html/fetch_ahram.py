@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+# Title:          fetch_ahram.py
+# Description:    Download the al-Ahram shortlinks that httrack missed. This replaces running
+#                 the ~74k sequential wget commands from finish_ahram.py (which took days) and
+#                 grepping out the soft 404s afterward.
+#                   * A pool of workers shares a bounded number of connections, and requests to
+#                     each host are spaced out by --delay seconds
+#                   * Timeouts, connection errors, 429s, and 5xx responses are retried with
+#                     exponential backoff
+#                   * al-Ahram serves its own "Page doesn't exist" page instead of a real 404.
+#                     Responses are checked for that marker as they stream in, so the download
+#                     stops as soon as it shows up and junk pages never touch the disk
+#                   * Good pages are saved as {shortlink}.html (the same names wget used) and
+#                     every finished shortlink is logged in a small SQLite state file, so an
+#                     interrupted run picks up where it left off
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 fetch_ahram.py ahram/blah/english.ahram.org.eg/News --database Corpora/ahram.db
+#                 python3 fetch_ahram.py ahram/News --shortlinks 1-500 --connections 4 --delay 0.5
+#                 Without --shortlinks, the missing shortlinks come from finish_ahram.py's gap
+#                 analysis. --base-url can point at a local test server, e.g.
+#                 --base-url http://localhost:8000/News/{0}.aspx
+# Notes:          * Shortlinks logged as "soft404" or "404" aren't requested again. Use --retry-failed
+#                   to try them (and any "error" shortlinks) again.
+
+# Import modules
+import argparse
+import asyncio
+import os
+import re
+import sqlite3
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from finish_ahram import find_gaps
+
+# al-Ahram's soft 404 page. Pages are matched as raw bytes, so the apostrophe can be
+# any single byte (ASCII or cp1252), a UTF-8 curly quote, or an HTML entity.
+soft_404 = re.compile(rb"Page doesn(?:.|\xe2\x80\x99|&#(?:39|x27|8217|x2019);|&rsquo;)t exist")
+
+# Statuses that mean the shortlink is done and shouldn't be requested again
+finished_statuses = ['saved', 'soft404', '404']
+
+
+#-------------------
+# Helper functions
+#-------------------
+def parse_ranges(text):
+  """Expand ranges like "1-5, 9, 12-20" into a list of shortlinks"""
+  shortlinks = []
+  for part in text.split(','):
+    part = part.strip()
+    if not part:
+      continue
+    start, _, end = part.partition('-')
+    shortlinks.extend(range(int(start), int(end or start) + 1))
+  return(shortlinks)
+
+
+class HostThrottle:
+  """Space out the requests to each host by at least `delay` seconds"""
+  def __init__(self, delay):
+    self.delay = delay
+    self.next_slot = {}
+    self.lock = asyncio.Lock()
+
+  async def wait(self, host):
+    async with self.lock:
+      now = time.monotonic()
+      slot = max(now, self.next_slot.get(host, now))
+      self.next_slot[host] = slot + self.delay
+    if slot > now:
+      await asyncio.sleep(slot - now)
+
+
+#-----------------
+# Resumable state
+#-----------------
+class FetchState:
+  """Log of every shortlink that has been fetched, kept in an SQLite file"""
+  def __init__(self, filename):
+    self.conn = sqlite3.connect(filename)
+    with self.conn:
+      self.conn.execute("""CREATE TABLE IF NOT EXISTS fetched (
+        shortlink integer PRIMARY KEY,
+        status text NOT NULL,
+        http_status integer,
+        size integer,
+        fetched_at text NOT NULL DEFAULT CURRENT_TIMESTAMP
+      )""")
+
+  def finished(self, retry_failed=False):
+    """Shortlinks that don't need to be requested again"""
+    statuses = ['saved'] if retry_failed else finished_statuses
+    sql = 'SELECT shortlink FROM fetched WHERE status IN ({0})'.format(', '.join('?' * len(statuses)))
+    return(set(row[0] for row in self.conn.execute(sql, statuses)))
+
+  def record(self, shortlink, status, http_status=None, size=None):
+    with self.conn:
+      self.conn.execute("""INSERT OR REPLACE INTO fetched (shortlink, status, http_status, size)
+        VALUES (?, ?, ?, ?)""", (shortlink, status, http_status, size))
+
+  def close(self):
+    self.conn.close()
+
+
+#------------------
+# Fetch functions
+#------------------
+async def read_page(response, chunk_size=16384):
+  """Read a response, stopping early if it's a soft 404
+
+  Returns:
+    The page as bytes, or None if it's a soft 404
+  """
+  chunks = []
+  tail = b''
+  overlap = 64  # Enough to catch the marker when it's split across chunks
+  async for chunk in response.content.iter_chunked(chunk_size):
+    if soft_404.search(tail + chunk):
+      return(None)
+    chunks.append(chunk)
+    tail = (tail + chunk)[-overlap:]
+  return(b''.join(chunks))
+
+
+def save_page(page, filename):
+  """Write a page to a temporary file and move it into place, so partial pages never exist"""
+  temp_filename = filename + '.part'
+  with open(temp_filename, 'wb') as f:
+    f.write(page)
+  os.replace(temp_filename, filename)
+
+
+async def fetch_shortlink(session, throttle, shortlink, base_url, output_folder, retries=3, backoff=2):
+  """Download one shortlink
+
+  Returns:
+    Tuple of (status, HTTP status, size in bytes), where status is "saved",
+    "soft404", "404", or "error"
+  """
+  url = base_url.format(shortlink)
+  host = urlsplit(url).netloc
+  http_status = None
+  for attempt in range(retries + 1):
+    if attempt > 0:
+      await asyncio.sleep(backoff ** attempt)
+    await throttle.wait(host)
+    try:
+      async with session.get(url) as response:
+        http_status = response.status
+        if response.status == 404:
+          return('404', http_status, None)
+        if response.status == 429 or response.status >= 500:
+          continue
+        if response.status != 200:
+          return('error', http_status, None)
+        page = await read_page(response)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+      continue
+    if page is None:
+      return('soft404', http_status, None)
+    save_page(page, os.path.join(output_folder, '{0}.html'.format(shortlink)))
+    return('saved', http_status, len(page))
+  return('error', http_status, None)
+
+
+async def fetch_all(shortlinks, output_folder, state, base_url, connections=8, delay=0.25,
+                    retries=3, timeout=60):
+  """Download a list of shortlinks concurrently
+
+  Arguments:
+    shortlinks: List of shortlinks to download
+    output_folder: Folder to save the pages in
+    state: FetchState for logging the results
+    base_url: URL template with {0} for the shortlink
+    connections: Maximum number of open connections (and workers)
+    delay: Minimum number of seconds between requests to the same host
+    retries: Number of times to retry after a timeout or server error
+    timeout: Seconds before giving up on one request
+
+  Returns:
+    Dictionary with the number of shortlinks that ended in each status
+  """
+  queue = asyncio.Queue()
+  for shortlink in shortlinks:
+    queue.put_nowait(shortlink)
+
+  counts = {}
+  throttle = HostThrottle(delay)
+  connector = aiohttp.TCPConnector(limit=connections, limit_per_host=connections)
+  client_timeout = aiohttp.ClientTimeout(total=timeout)
+  started = time.monotonic()
+
+  async def worker(session):
+    while True:
+      try:
+        shortlink = queue.get_nowait()
+      except asyncio.QueueEmpty:
+        return
+      status, http_status, size = await fetch_shortlink(session, throttle, shortlink, base_url,
+                                                        output_folder, retries)
+      state.record(shortlink, status, http_status, size)
+      counts[status] = counts.get(status, 0) + 1
+      done = sum(counts.values())
+      if done % 500 == 0:
+        print('{0}/{1} shortlinks ({2:.0f} seconds)'.format(done, len(shortlinks), time.monotonic() - started))
+
+  async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+    await asyncio.gather(*[worker(session) for _ in range(connections)])
+  return(counts)
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Download missing al-Ahram shortlinks concurrently, skipping soft 404s.')
+  parser.add_argument('output_folder', type=str,
+                      help='folder to save the pages in (usually the mirror folder)')
+  parser.add_argument('--shortlinks', type=str, default=None,
+                      help='ranges of shortlinks to fetch (e.g. "1-500, 812"); defaults to the ones missing from the mirror')
+  parser.add_argument('--database', type=str, default=None,
+                      help='ahram.db, passed along to the gap analysis')
+  parser.add_argument('--max-id', type=int, default=74567,
+                      help='highest potential shortlink')
+  parser.add_argument('--state', type=str, default=None,
+                      help='SQLite file for resuming (defaults to fetch_state.db in the output folder)')
+  parser.add_argument('--base-url', type=str, default='http://english.ahram.org.eg/News/{0}.aspx',
+                      help='URL template, with {0} for the shortlink')
+  parser.add_argument('--connections', type=int, default=8,
+                      help='maximum number of simultaneous connections')
+  parser.add_argument('--delay', type=float, default=0.25,
+                      help='minimum seconds between requests to the same host')
+  parser.add_argument('--retries', type=int, default=3,
+                      help='number of retries after timeouts and server errors')
+  parser.add_argument('--timeout', type=float, default=60,
+                      help='seconds before giving up on a request')
+  parser.add_argument('--retry-failed', action='store_true',
+                      help='request shortlinks that were already logged as soft 404s, 404s, or errors')
+  args = parser.parse_args()
+
+  if not os.path.exists(args.output_folder):
+    os.makedirs(args.output_folder)
+
+  if args.shortlinks:
+    shortlinks = parse_ranges(args.shortlinks)
+  else:
+    gaps = find_gaps(args.output_folder, args.database, args.max_id)
+    shortlinks = [shortlink for start, end in gaps['missing'] for shortlink in range(start, end + 1)]
+
+  state = FetchState(args.state or os.path.join(args.output_folder, 'fetch_state.db'))
+  finished = state.finished(args.retry_failed)
+  shortlinks = [shortlink for shortlink in shortlinks if shortlink not in finished]
+  print('Fetching {0} shortlinks ({1} already finished)'.format(len(shortlinks), len(finished)))
+
+  counts = asyncio.run(fetch_all(shortlinks, args.output_folder, state, args.base_url, args.connections,
+                                 args.delay, args.retries, args.timeout))
+  state.close()
+
+  for status, count in sorted(counts.items()):
+    print('{0}: {1}'.format(status, count))
@@ -1,43 +1,66 @@
 #!/usr/bin/env python3
 
 # Title:          finish_ahram.py
-# Description:    Despite running for days and days, httrack wasn't able to get everything from 
-#                 al-Ahram. However, al-Ahram has a cool system of sequential shortlinks for its 
-#                 articles (though not all numbers are used). This script compares the list of 
-#                 shortlinks for the articles that actually downloaded with a list of potential 
-#                 article shortlinks. It then generates a list of wget commands in a bash script 
-#                 that can then be run to download everything. al-Ahram doesn't believe in actual 
-#                 404 pages and instead delivers its own, so wget ends up downloading every shortlink 
-#                 regardless of whether or not it actually exists. Blergh. 
-#                 Also, I could probably do this more efficiently inside Python with urllib2 instead 
-#                 of wget, but I don't want to spend the time figuring that out. So we get this 
-#                 solution instead :)
+# Description:    Despite running for days and days, httrack wasn't able to get everything from
+#                 al-Ahram. However, al-Ahram has a cool system of sequential shortlinks for its
+#                 articles (though not all numbers are used). This script compares the list of
+#                 shortlinks for the articles that actually downloaded with a list of potential
+#                 article shortlinks. It can then generate a list of wget commands in a bash script
+#                 that can then be run to download everything. al-Ahram doesn't believe in actual
+#                 404 pages and instead delivers its own, so wget ends up downloading every shortlink
+#                 regardless of whether or not it actually exists. Blergh.
+#
+#                 Shortlinks are kept in boolean arrays indexed by shortlink number (one for the
+#                 mirror and one for article_url in ahram.db), so finding what's missing is just
+#                 set algebra on two arrays and takes milliseconds. It's cheap enough to run after
+#                 every crawl. (With --index, the mirror isn't even scanned; see mirror_index.py,
+#                 and rescan the index after a crawl.) Two sets are reported, as compressed
+#                 ranges (e.g. "5-9, 12"):
+#                   * missing: shortlinks between 1 and --max-id that aren't in the mirror
+#                   * unsaved: shortlinks in the mirror that aren't in the database
 # Author:         Andrew Heiss
-# Last updated:   2013-07-03
+# Last updated:   2026-10-18
 # Python version: ≥3.0
-# Usage:          * Edit the file names below and run. 
+# Usage:          python3 finish_ahram.py ahram/blah/english.ahram.org.eg/News \
+#                   --database Corpora/ahram.db --wget download_ahram.sh --ranges missing.txt
 #                 * Run the resultant bash script (either locally or on a server somewhere)
 #                 * Filter the downloaded files in bash with `grep -l "Page doesn.t exist" *.html | xargs rm`
-
-#---------
-# Set up
-#---------
-ahram_news = "/Users/andrew/Downloads/ahram/blah/english.ahram.org.eg/News/*"  # Needs trailing /*
-pickle_file = 'missing.p'
-wget_file = 'dowload_ahram.sh'
-
+#                 Or skip the bash script and run fetch_ahram.py, which downloads the missing
+#                 shortlinks concurrently and drops the soft 404s as they stream in.
+# Notes:          * Mirror files are matched on their leading digits, so 57831-2.html (an httrack
+#                   duplicate) counts as 57831 instead of 578312.
 
 # Import modules
+import argparse
+import os
 import re
-import pickle
-import os.path
-from glob import glob
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prepare_corpus'))
+from compressed_text import connect
+from mirror_index import mirror_files, scan_tree
+
 
+#-------------------
 # Helper functions
-def only_numbers(text):
-  """Strip all non-numeric characters from a string and return the numbers"""
-  text = re.sub(r'[^\d]+', '', text)
-  return(int(text))
+#-------------------
+def shortlink_from_filename(filename):
+  """Get the shortlink from a downloaded file name (e.g. "57831.html" or "57831-2.html")"""
+  match = re.match(r'(\d+)', os.path.basename(filename))
+  return(int(match.group(1)) if match else None)
+
+
+def shortlink_from_url(url):
+  """Get the shortlink from an article URL
+
+  Handles both http://english.ahram.org.eg/News/57831.aspx and
+  http://english.ahram.org.eg/NewsContent/1/64/57831/Egypt/Politics-/Title.aspx
+  """
+  match = re.search(r'/News/(\d+)', url) or re.search(r'/NewsContent/\d+/\d+/(\d+)', url)
+  return(int(match.group(1)) if match else None)
+
 
 def wgetize(shortlink):
   """Build a wget command"""
@@ -45,40 +68,117 @@ def wgetize(shortlink):
   return(command)
 
 
-if not os.path.exists(pickle_file):
-  # Compare list of articles downloaded with httrack to a list of potential
-  # articles. Save the numbers httrack missed (or al-Ahram didn't use) to a
-  # pickle.
-  existing_articles = sorted([only_numbers(article) for article in glob(ahram_news)])
-  hypothetical_articles = list(range(1, 74568))
-  missing_articles = [article for article in hypothetical_articles if article not in existing_articles]
+def to_bitmap(shortlinks, size):
+  """Convert shortlinks into a boolean array where bitmap[shortlink] is True"""
+  bitmap = np.zeros(size, dtype=bool)
+  shortlinks = np.fromiter((s for s in shortlinks if s is not None), dtype=np.int64)
+  bitmap[shortlinks[shortlinks < size]] = True
+  return(bitmap)
+
 
-  pickle.dump(missing_articles, open(pickle_file, 'wb'))
-else:
-  # Load pickle and create a bash script
-  missing_articles = pickle.load(open(pickle_file, 'rb'))
-  wget_handle = open(wget_file, 'w')
-  for article in missing_articles:
-    print(wgetize(article), file=wget_handle)
+def compress_ranges(bitmap):
+  """Collapse the True positions of a bitmap into (start, end) ranges"""
+  ids = np.flatnonzero(bitmap)
+  if len(ids) == 0:
+    return([])
+  breaks = np.flatnonzero(np.diff(ids) > 1)
+  starts = np.concatenate(([ids[0]], ids[breaks + 1]))
+  ends = np.concatenate((ids[breaks], [ids[-1]]))
+  return(list(zip(starts.tolist(), ends.tolist())))
 
-def check_missing_articles():
-  import fnmatch
 
-  conn = sqlite3.connect('/Users/andrew/Dropbox/Media and NGOs in the ME/Media and NGOs/Corpora/ahram.db', detect_types=sqlite3.PARSE_DECLTYPES)
-  c = conn.cursor()
+def format_ranges(ranges):
+  """Format ranges like "1-5, 9, 12-20" """
+  return(', '.join(str(start) if start == end else '{0}-{1}'.format(start, end) for start, end in ranges))
 
-  saved_articles = [only_numbers(row[0]) for row in c.execute('SELECT article_url FROM articles')]
 
-  matches = []
-  for root, dirnames, filenames in os.walk('/Users/andrew/Downloads/ahram/blah/english.ahram.org.eg/News'):
-    for filename in fnmatch.filter(filenames, '*.html'):
-        matches.append(filename)
+#--------------------
+# Shortlink sources
+#--------------------
+def mirror_shortlinks(mirror_folder, index=None):
+  """Find the shortlinks of every downloaded .html file in the mirror
 
-  existing_articles = [only_numbers(match) for match in matches]
+  Reads the mirror_index.py index if one is given, and scans the folder otherwise
+  """
+  if index:
+    return([int(key) for path, key in mirror_files(mirror_folder, 'ahram', index, ('keep', 'duplicate'))])
+  return([shortlink_from_filename(path) for path, size, mtime in scan_tree(mirror_folder)
+          if path.endswith('.html')])
 
-  missing_articles = [article for article in existing_articles if article not in saved_articles]
-  print(missing_articles)
 
-  # Close everything up
-  c.close()
+def database_shortlinks(database):
+  """Find the shortlinks of every article saved in ahram.db"""
+  conn = connect(database)
+  shortlinks = [shortlink_from_url(row[0]) for row in conn.execute('SELECT article_url FROM articles')]
   conn.close()
+  return(shortlinks)
+
+
+#---------------
+# Gap analysis
+#---------------
+def find_gaps(mirror_folder, database=None, max_id=74567, index=None):
+  """Compare potential, downloaded, and saved shortlinks
+
+  Arguments:
+    mirror_folder: Folder with the downloaded al-Ahram articles
+    database: Optional path to ahram.db
+    max_id: Highest potential shortlink
+    index: Optional mirror_index.py index of the mirror
+
+  Returns:
+    Dictionary with "missing" (not downloaded) and, if a database is given,
+    "unsaved" (downloaded but not in the database) ranges
+  """
+  downloaded = mirror_shortlinks(mirror_folder, index)
+  size = max([max_id] + [s for s in downloaded if s is not None]) + 1
+  in_mirror = to_bitmap(downloaded, size)
+
+  potential = np.zeros(size, dtype=bool)
+  potential[1:max_id + 1] = True
+
+  gaps = {'missing': compress_ranges(potential & ~in_mirror)}
+  if database:
+    in_database = to_bitmap(database_shortlinks(database), size)
+    gaps['unsaved'] = compress_ranges(in_mirror & ~in_database)
+  return(gaps)
+
+
+def count_ranges(ranges):
+  """Count the shortlinks in a list of ranges"""
+  return(sum(end - start + 1 for start, end in ranges))
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Find al-Ahram shortlinks that were never downloaded or never saved.')
+  parser.add_argument('mirror_folder', type=str,
+                      help='folder of downloaded articles (e.g. blah/english.ahram.org.eg/News)')
+  parser.add_argument('--database', type=str, default=None,
+                      help='ahram.db, to find downloaded articles that were never saved')
+  parser.add_argument('--max-id', type=int, default=74567,
+                      help='highest potential shortlink')
+  parser.add_argument('--index', type=str, default=None,
+                      help='read the mirror from this mirror_index.py index instead of scanning it')
+  parser.add_argument('--wget', type=str, default=None,
+                      help='bash script of wget commands for the missing shortlinks')
+  parser.add_argument('--ranges', type=str, default=None,
+                      help='text file of the missing and unsaved ranges')
+  args = parser.parse_args()
+
+  gaps = find_gaps(args.mirror_folder, args.database, args.max_id, args.index)
+  for name, ranges in gaps.items():
+    print('{0}: {1} shortlinks in {2} ranges'.format(name, count_ranges(ranges), len(ranges)))
+
+  if args.ranges:
+    with open(args.ranges, 'w') as f:
+      for name, ranges in gaps.items():
+        print('{0}: {1}'.format(name, format_ranges(ranges)), file=f)
+
+  if args.wget:
+    with open(args.wget, 'w') as wget_handle:
+      for start, end in gaps['missing']:
+        for shortlink in range(start, end + 1):
+          print(wgetize(shortlink), file=wget_handle)
@@ -9,6 +9,7 @@
 # Python version: ≥3.0
 # Usage:          Configure which database you want to add to, then paste all the 
 #                 information from an article into the variables below.
+#                 To apply lots of fixes at once, use apply_fixes.py with a JSON or CSV file instead.
 
 #---------------------
 # Database to add to
@@ -21,6 +22,11 @@ from datetime import datetime
 import string
 import sqlite3
 import re
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prepare_corpus'))
+from compressed_text import connect
 
 #----------------------------
 #----------------------------
@@ -173,7 +179,8 @@ class SingleArticle:
 #----------------------------------------
 # Connect to the database
 # PARSE_DECLTYPES so datetime works (see http://stackoverflow.com/a/4273249/120898)
-conn = sqlite3.connect(database, detect_types=sqlite3.PARSE_DECLTYPES)
+# connect() also works with compressed and derived databases (see prepare_corpus/compressed_text.py)
+conn = connect(database, detect_types=sqlite3.PARSE_DECLTYPES)
 c = conn.cursor()
 
 # # Turn on foreign keys
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+
+# Title:          mirror_index.py
+# Description:    Scan a downloaded mirror once and save an inventory of every file in a small
+#                 SQLite index, so the cleaning, gap analysis, and parsing steps can query the
+#                 index instead of walking the same multi-GB tree over and over.
+#
+#                 For every file the index records its path (relative to the mirror), size,
+#                 modification time, the article key, and a status:
+#                   * dne: the key is YYYY_MM_DD_slug for YYYY/MM/DD/slug/index.html (the name
+#                     clean_dne.py gives the file). Anything else (feeds, page/ folders, the
+#                     photo gallery, httrack's nested copies) is "not_article".
+#                   * egind: the key is the file name. Drupal's extra copies, httrack's
+#                     temporary files, and anything inside a folder are "ignored".
+#                   * ahram: the key is the shortlink number. httrack's copies (57831-2.html)
+#                     are "duplicate".
+#                 Everything that should be parsed is "keep".
+#
+#                 Folders are read with os.scandir in a pool of threads (directory listing is
+#                 mostly waiting on the disk), and each folder's subfolders are queued as soon
+#                 as they're found.
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 mirror_index.py scan dne_test dne --index dne_test.index.db --threads 16
+#                 python3 mirror_index.py info --index dne_test.index.db
+#                 python3 mirror_index.py flatten dne_test dne --output dne_clean --method auto
+#                 In Python:
+#                   from mirror_index import mirror_files
+#                   for path, key in mirror_files('dne_test', 'dne'): ...
+#                 mirror_files() scans the mirror the first time and reads the index after that.
+#                 Rescan after downloading more files.
+#
+#                 Flattening (what clean_dne.py and clean_egind.py do) links each article into a
+#                 flat folder as {article key}.html instead of copying it, so it costs metadata
+#                 operations instead of gigabytes of writes. "auto" uses a reflink (copy-on-write
+#                 clone) where the filesystem supports it, then a hard link, and only copies if
+#                 neither works (e.g. across filesystems). parse_html.py can also skip the flat
+#                 folder and read the list of articles straight from the index.
+
+# Import modules
+import argparse
+import os
+import re
+import sqlite3
+import time
+from shutil import copy2
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Files that Drupal and/or httrack added to Egypt Independent
+egind_ignore = ('.tmp', '2d85.html', 'b6c9.html', 'ed36.html')
+
+dne_article = re.compile(r'^(\d{4})/(\d{2})/(\d{2})/([^/]+)/index\.html$')
+ahram_article = re.compile(r'^(\d+)(-\d+)?\.html$')
+
+
+#--------------------
+# Article keys
+#--------------------
+def classify_dne(relative_path):
+  """Key and status of a file in the nested WordPress mirror"""
+  match = dne_article.match(relative_path.replace(os.sep, '/'))
+  if not match:
+    return(None, 'not_article')
+  return('_'.join(match.groups()), 'keep')
+
+
+def classify_egind(relative_path):
+  """Key and status of a file in the flat Drupal mirror"""
+  filename = os.path.basename(relative_path)
+  if filename != relative_path:
+    return(None, 'ignored')  # Files inside folders aren't articles
+  if not filename.endswith('.html') or any(ignore in filename for ignore in egind_ignore):
+    return(None, 'ignored')
+  return(filename[:-len('.html')], 'keep')
+
+
+def classify_ahram(relative_path):
+  """Key and status of a file in the al-Ahram News folder"""
+  match = ahram_article.match(os.path.basename(relative_path))
+  if not match:
+    return(None, 'ignored')
+  return(match.group(1), 'duplicate' if match.group(2) else 'keep')
+
+
+classifiers = {'dne': classify_dne, 'egind': classify_egind, 'ahram': classify_ahram}
+
+
+#-------------------
+# Scan the mirror
+#-------------------
+def scan_folder(folder):
+  """List one folder
+
+  Returns:
+    Tuple of ([(path, size, mtime), ...], [subfolder, ...])
+  """
+  files = []
+  subfolders = []
+  with os.scandir(folder) as entries:
+    for entry in entries:
+      if entry.is_dir(follow_symlinks=False):
+        subfolders.append(entry.path)
+      elif entry.is_file(follow_symlinks=False):
+        stat = entry.stat(follow_symlinks=False)
+        files.append((entry.path, stat.st_size, stat.st_mtime))
+  return(files, subfolders)
+
+
+def scan_tree(root, threads=8):
+  """List every file under root, reading folders in parallel"""
+  files = []
+  with ThreadPoolExecutor(threads) as executor:
+    pending = {executor.submit(scan_folder, root)}
+    while pending:
+      done, pending = wait(pending, return_when=FIRST_COMPLETED)
+      for future in done:
+        folder_files, subfolders = future.result()
+        files.extend(folder_files)
+        pending |= {executor.submit(scan_folder, subfolder) for subfolder in subfolders}
+  return(files)
+
+
+#--------------------
+# Index functions
+#--------------------
+def default_index(root):
+  """Index file next to the mirror (e.g. dne_test.index.db)"""
+  return(os.path.normpath(root) + '.index.db')
+
+
+def create_index(conn):
+  """Create the index tables if they don't exist"""
+  conn.execute("""CREATE TABLE IF NOT EXISTS mirror (
+    root text PRIMARY KEY,
+    publication text NOT NULL,
+    scanned_at real NOT NULL,
+    files integer NOT NULL
+  )""")
+  conn.execute("""CREATE TABLE IF NOT EXISTS files (
+    root text NOT NULL,
+    path text NOT NULL,
+    size integer NOT NULL,
+    mtime real NOT NULL,
+    article_key text,
+    status text NOT NULL,
+    PRIMARY KEY (root, path)
+  )""")
+  conn.execute('CREATE INDEX IF NOT EXISTS files_key ON files (root, article_key)')
+
+
+def build_index(root, publication, index=None, threads=8):
+  """Scan a mirror and replace its rows in the index
+
+  Arguments:
+    root: Folder of the mirror
+    publication: "dne", "egind", or "ahram"
+    index: Path to the index database (defaults to default_index(root))
+    threads: Number of folders to read at once
+
+  Returns:
+    Dictionary with the number of files with each status
+  """
+  classify = classifiers[publication]
+  root_key = os.path.abspath(root)
+
+  rows = []
+  counts = {}
+  for path, size, mtime in scan_tree(root, threads):
+    relative_path = os.path.relpath(path, root)
+    article_key, status = classify(relative_path)
+    rows.append((root_key, relative_path, size, mtime, article_key, status))
+    counts[status] = counts.get(status, 0) + 1
+
+  conn = sqlite3.connect(index or default_index(root))
+  with conn:
+    create_index(conn)
+    conn.execute('DELETE FROM files WHERE root = ?', (root_key, ))
+    conn.executemany('INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)', rows)
+    conn.execute('INSERT OR REPLACE INTO mirror VALUES (?, ?, ?, ?)',
+                 (root_key, publication, time.time(), len(rows)))
+  conn.close()
+  return(counts)
+
+
+def is_indexed(root, index=None):
+  """Check whether a mirror has been scanned into the index"""
+  index = index or default_index(root)
+  if not os.path.exists(index):
+    return(False)
+  conn = sqlite3.connect(index)
+  create_index(conn)
+  indexed = conn.execute('SELECT 1 FROM mirror WHERE root = ?', (os.path.abspath(root), )).fetchone()
+  conn.close()
+  return(indexed is not None)
+
+
+def query_index(root, index=None, statuses=('keep', )):
+  """Read a mirror's files from the index
+
+  Returns:
+    List of (full path, article key, size) tuples in path order
+  """
+  root_key = os.path.abspath(root)
+  conn = sqlite3.connect(index or default_index(root))
+  rows = conn.execute("""SELECT path, article_key, size FROM files
+    WHERE root = ? AND status IN ({0}) ORDER BY path""".format(', '.join('?' * len(statuses))),
+    (root_key, ) + tuple(statuses)).fetchall()
+  conn.close()
+  return([(os.path.join(root, path), article_key, size) for path, article_key, size in rows])
+
+
+def mirror_files(root, publication, index=None, statuses=('keep', ), rescan=False, threads=8):
+  """Files in a mirror, scanning it only if it isn't in the index yet
+
+  Returns:
+    List of (full path, article key) tuples
+  """
+  if rescan or not is_indexed(root, index):
+    build_index(root, publication, index, threads)
+  return([(path, article_key) for path, article_key, size in query_index(root, index, statuses)])
+
+
+def index_summary(index):
+  """Number of files with each status in each indexed mirror"""
+  conn = sqlite3.connect(index)
+  rows = conn.execute("""SELECT mirror.root, mirror.publication, files.status, COUNT(*), SUM(files.size)
+    FROM mirror JOIN files ON (files.root = mirror.root)
+    GROUP BY mirror.root, files.status ORDER BY mirror.root, files.status""").fetchall()
+  conn.close()
+  return(rows)
+
+
+#----------------------
+# Flatten the mirror
+#----------------------
+def reflink_file(source, destination):
+  """Make a copy-on-write clone of a file (Btrfs, XFS, APFS-style filesystems on Linux)"""
+  import fcntl
+  ficlone = getattr(fcntl, 'FICLONE', 0x40049409)
+  try:
+    with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file:
+      fcntl.ioctl(destination_file.fileno(), ficlone, source_file.fileno())
+  except OSError:
+    os.remove(destination)
+    raise
+
+
+def link_file(source, destination, methods=('reflink', 'hardlink', 'copy')):
+  """Put a file at destination with the first method that works
+
+  Hard links share the file with the mirror, so editing one edits the other.
+  Reflinks are separate copies that share disk blocks until one is changed.
+
+  Returns:
+    The method that worked
+  """
+  for method in methods:
+    try:
+      if method == 'reflink':
+        reflink_file(source, destination)
+      elif method == 'hardlink':
+        os.link(source, destination)
+      elif method == 'symlink':
+        os.symlink(os.path.abspath(source), destination)
+      else:
+        copy2(source, destination)
+      return(method)
+    except (OSError, ImportError):
+      continue
+  raise OSError('Could not link {0} to {1}'.format(source, destination))
+
+
+link_methods = {'auto': ('reflink', 'hardlink', 'copy'), 'reflink': ('reflink', 'copy'),
+                'hardlink': ('hardlink', 'copy'), 'symlink': ('symlink', ), 'copy': ('copy', )}
+
+
+def flatten_mirror(root, publication, folder, method='auto', index=None, rescan=False):
+  """Fill a flat folder with {article key}.html links to a mirror's articles
+
+  Arguments:
+    root: Folder of the mirror
+    publication: "dne", "egind", or "ahram"
+    folder: Folder for the flattened files
+    method: One of link_methods ("auto" tries reflink, then hard link, then copy)
+    index: Path to the index database (defaults to default_index(root))
+    rescan: Scan the mirror again before flattening
+
+  Returns:
+    Dictionary with the number of files placed with each method
+  """
+  if not os.path.exists(folder):
+    os.makedirs(folder)
+  counts = {}
+  for path, article_key in mirror_files(root, publication, index, rescan=rescan):
+    destination = os.path.join(folder, article_key + '.html')
+    if os.path.lexists(destination):
+      continue
+    used = link_file(path, destination, link_methods[method])
+    counts[used] = counts.get(used, 0) + 1
+  return(counts)
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Build and inspect an SQLite inventory of a downloaded mirror.')
+  parser.add_argument('command', choices=['scan', 'info', 'flatten'],
+                      help='scan a mirror into the index, summarize the index, or link its articles into a flat folder')
+  parser.add_argument('root', type=str, nargs='?', default=None,
+                      help='folder of the mirror (for scan and flatten)')
+  parser.add_argument('publication', choices=sorted(classifiers), nargs='?', default=None,
+                      help='which site the mirror is from (for scan and flatten)')
+  parser.add_argument('--index', type=str, default=None,
+                      help='the index database (defaults to ROOT.index.db)')
+  parser.add_argument('--threads', type=int, default=8,
+                      help='number of folders to read at once')
+  parser.add_argument('--output', type=str, default=None,
+                      help='folder for the flattened files (for flatten)')
+  parser.add_argument('--method', choices=sorted(link_methods), default='auto',
+                      help='how to flatten: reflink, hard link, symlink, or copy (auto tries them in that order, minus symlink)')
+  args = parser.parse_args()
+
+  if args.command in ['scan', 'flatten'] and (not args.root or not args.publication):
+    parser.error('{0} needs a root folder and a publication'.format(args.command))
+
+  if args.command == 'flatten':
+    if not args.output:
+      parser.error('flatten needs --output')
+    counts = flatten_mirror(args.root, args.publication, args.output, args.method, args.index)
+    for method, count in sorted(counts.items()):
+      print('{0}: {1} files'.format(method, count))
+  elif args.command == 'scan':
+    started = time.time()
+    counts = build_index(args.root, args.publication, args.index, args.threads)
+    print('Indexed {0} files in {1:.1f} seconds'.format(sum(counts.values()), time.time() - started))
+    for status, count in sorted(counts.items()):
+      print('  {0}: {1}'.format(status, count))
+  else:
+    if not args.index and not args.root:
+      parser.error('info needs --index or a root folder')
+    for root, publication, status, count, size in index_summary(args.index or default_index(args.root)):
+      print('{0} ({1}) {2}: {3} files, {4:.1f} MB'.format(root, publication, status, count, size / 1024 / 1024))
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+
+# Title:          normalize_names.py
+# Description:    Find author and source names that are really the same person or organization
+#                 (mostly the Daily News Egypt byline fragments that parse_html.py leaves behind,
+#                 like "By Rana Muhammad Taha" or "Rana Muhammad Taha," next to
+#                 "Rana Muhammad Taha") and merge them.
+#
+#                 Comparing every name with every other name doesn't scale, so names are put
+#                 into blocks first. Each name lands in one block per word, keyed by the word's
+#                 Soundex code (so "Mohamed" and "Muhammad" share a block), and names are only
+#                 compared with the other names in their blocks. Names are compared word by
+#                 word, so sharing a common first name isn't enough: two names match only if
+#                 they have the same number of words, the last words (surnames) are nearly
+#                 identical, and every other word is nearly identical or sounds the same and is
+#                 fairly similar ("Muhammad" and "Mohamed"). Words of four letters or fewer have
+#                 to match exactly, so "Hana Ali" and "Hany Ali" or "Mai Ali" and "May Ali" aren't
+#                 merged. "Mohamed Hassan" and "Mohamed Hussein" stay apart too. Matching pairs are grouped into clusters, and the
+#                 most-used tidy name (no "By", no trailing commas) in each cluster is its
+#                 canonical name.
+#
+#                 `find` saves the clusters to a canonical_names table (and optionally a CSV
+#                 file) without changing anything else, so they can be checked (and edited in
+#                 the table) first. `apply` then moves every article from the old names to the
+#                 canonical ones in bulk, in one transaction.
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 normalize_names.py find Corpora/dne.db --csv dne_names.csv
+#                 python3 normalize_names.py apply Corpora/dne.db --prune
+# Notes:          * Blocks with more than --max-block names (very common words) are skipped;
+#                   their names are still compared through their other words.
+#                 * --prune deletes the merged names from authors and sources after apply.
+
+# Import modules
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import sys
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prepare_corpus'))
+from find_duplicates import cluster_pairs
+
+# Name tables and their junction tables
+name_tables = {
+  'authors': ('id_author', 'author_name', 'articles_authors', 'fk_author'),
+  'sources': ('id_source', 'source_name', 'articles_sources', 'fk_source')
+}
+
+# Words that don't say anything about who wrote an article
+ignore_words = set(['by', 'and', 'the', 'of', 'in', 'from', 'with'])
+
+# Job titles tacked onto the end of bylines ("Daily News Egypt staff")
+job_titles = r'(\s+(staff|writer|reporter|correspondent))+$'
+
+soundex_codes = {letter: str(code) for code, letters in
+                 enumerate(['aeiouyhw', 'bfpv', 'cgjkqsxz', 'dt', 'l', 'mn', 'r']) for letter in letters}
+
+
+#-------------------
+# Name functions
+#-------------------
+def clean_name(name):
+  """Lowercase a name and remove punctuation, a leading "By", job titles, and extra spaces"""
+  name = re.sub(r'[^\w\s]', ' ', name.lower())
+  name = re.sub(r'^\s*by\s+', '', name)
+  name = re.sub(job_titles, '', name.rstrip())
+  return(' '.join(name.split()))
+
+
+def is_tidy(name):
+  """Check that a name doesn't have a leading "By" or stray spaces or punctuation"""
+  return(name == name.strip() and not re.match(r'by\s', name, re.IGNORECASE) and not re.search(r'[^\w.)]$', name))
+
+
+def soundex(word):
+  """Soundex code of a word (e.g. "mohamed" and "muhammad" are both M530)"""
+  word = ''.join(letter for letter in word if letter in soundex_codes)
+  if not word:
+    return(None)
+  codes = [soundex_codes[letter] for letter in word]
+  key = word[0].upper()
+  previous = codes[0]
+  for letter, code in zip(word[1:], codes[1:]):
+    if code != '0' and code != previous:
+      key += code
+    if letter not in 'hw':
+      previous = code
+  return((key + '000')[:4])
+
+
+def blocking_keys(cleaned):
+  """Blocks a cleaned name belongs to: the Soundex code of each of its words"""
+  keys = set()
+  for word in cleaned.split():
+    if len(word) > 2 and word not in ignore_words:
+      code = soundex(word)
+      if code:
+        keys.add(code)
+  return(keys)
+
+
+def words_match(a, b, threshold=0.88, phonetic_threshold=0.65, short_word=4):
+  """Check if two cleaned names match word by word
+
+  Arguments:
+    a, b: Cleaned names
+    threshold: Minimum similarity of each pair of words
+    phonetic_threshold: Minimum similarity of a pair of first or middle names
+      with the same Soundex code (e.g. "mohamed" and "muhammad")
+    short_word: Words this long or shorter have to match exactly, since one
+      letter is the whole difference between names like "hana" and "hany"
+
+  Returns:
+    True if the names have the same number of words (ignoring ignore_words)
+    and every pair of words matches. Surnames have to meet threshold.
+  """
+  a_words = [word for word in a.split() if word not in ignore_words]
+  b_words = [word for word in b.split() if word not in ignore_words]
+  if len(a_words) != len(b_words) or not a_words:
+    return(a == b)
+  for position, (a_word, b_word) in enumerate(zip(a_words, b_words)):
+    if a_word == b_word:
+      continue
+    if min(len(a_word), len(b_word)) <= short_word:
+      return(False)
+    similarity = SequenceMatcher(None, a_word, b_word).ratio()
+    if similarity >= threshold:
+      continue
+    is_surname = position == len(a_words) - 1
+    if not is_surname and similarity >= phonetic_threshold and soundex(a_word) == soundex(b_word):
+      continue
+    return(False)
+  return(True)
+
+
+def name_similarity(a, b):
+  """Similarity of two cleaned names between 0 and 1, ignoring word order"""
+  direct = SequenceMatcher(None, a, b).ratio()
+  sorted_words = SequenceMatcher(None, ' '.join(sorted(a.split())), ' '.join(sorted(b.split()))).ratio()
+  return(max(direct, sorted_words))
+
+
+#----------------------
+# Cluster the names
+#----------------------
+def cluster_names(names, threshold=0.88, phonetic_threshold=0.65, max_block=200):
+  """Group similar names
+
+  Arguments:
+    names: List of (id, name, number of articles) tuples
+    threshold: Minimum similarity of each pair of words for two names to be
+      merged (see words_match())
+    phonetic_threshold: Minimum similarity of first or middle names that
+      sound the same (e.g. "Mohamed" and "Muhammad")
+    max_block: Skip blocks with more names than this
+
+  Returns:
+    List of dictionaries with id_name, name, canonical_id, canonical_name, and
+    similarity (to the canonical name) for every name in a cluster of two or more
+  """
+  cleaned = [clean_name(name) for id_name, name, articles in names]
+
+  # Identical cleaned names are always the same
+  pairs = set()
+  first_seen = {}
+  for i, name in enumerate(cleaned):
+    if name in first_seen:
+      pairs.add((first_seen[name], i))
+    else:
+      first_seen[name] = i
+
+  # Compare the remaining distinct names within each block
+  blocks = defaultdict(list)
+  for name, i in first_seen.items():
+    for key in blocking_keys(name):
+      blocks[key].append(i)
+
+  compared = set()
+  for members in blocks.values():
+    if len(members) > max_block:
+      continue
+    for x in range(len(members)):
+      for y in range(x + 1, len(members)):
+        pair = (min(members[x], members[y]), max(members[x], members[y]))
+        if pair in compared:
+          continue
+        compared.add(pair)
+        if words_match(cleaned[pair[0]], cleaned[pair[1]], threshold, phonetic_threshold):
+          pairs.add(pair)
+
+  roots = cluster_pairs(pairs, len(names))
+  members = defaultdict(list)
+  for i, root in enumerate(roots):
+    members[root].append(i)
+
+  clusters = []
+  for indexes in members.values():
+    if len(indexes) < 2:
+      continue
+    # The most-used tidy name wins (then the longest, then the first alphabetically)
+    canonical = min(indexes, key=lambda i: (not is_tidy(names[i][1]), -names[i][2], -len(names[i][1]), names[i][1]))
+    for i in sorted(indexes, key=lambda i: names[i][1]):
+      clusters.append({'id_name': names[i][0], 'name': names[i][1],
+                       'canonical_id': names[canonical][0], 'canonical_name': names[canonical][1],
+                       'similarity': name_similarity(cleaned[i], cleaned[canonical])})
+  return(clusters)
+
+
+#----------------------
+# Database functions
+#----------------------
+def create_mapping_table(conn):
+  """Create the canonical_names table if it doesn't exist"""
+  conn.execute("""CREATE TABLE IF NOT EXISTS canonical_names (
+    name_table text NOT NULL,
+    id_name integer NOT NULL,
+    name text NOT NULL,
+    canonical_id integer NOT NULL,
+    canonical_name text NOT NULL,
+    similarity real NOT NULL,
+    PRIMARY KEY (name_table, id_name)
+  )""")
+
+
+def load_names(conn, table):
+  """Get every name in a table with the number of articles that use it"""
+  id_column, name_column, junction, fk_column = name_tables[table]
+  return(conn.execute("""SELECT {0}, {1}, COUNT(fk_article) FROM {2}
+    LEFT JOIN {3} ON ({3}.{4} = {2}.{0}) GROUP BY {0} ORDER BY {0}""".format(
+      id_column, name_column, table, junction, fk_column)).fetchall())
+
+
+def find_names(database, tables=None, threshold=0.88, phonetic_threshold=0.65, max_block=200):
+  """Cluster the names in a database and save the mapping to canonical_names
+
+  Returns:
+    Dictionary of clusters (see cluster_names()) for each table
+  """
+  tables = tables or list(name_tables)
+  conn = sqlite3.connect(database)
+  found = {}
+  with conn:
+    create_mapping_table(conn)
+    for table in tables:
+      found[table] = cluster_names(load_names(conn, table), threshold, phonetic_threshold, max_block)
+      conn.execute('DELETE FROM canonical_names WHERE name_table = ?', (table, ))
+      conn.executemany('INSERT INTO canonical_names VALUES (?, ?, ?, ?, ?, ?)',
+                       [(table, c['id_name'], c['name'], c['canonical_id'], c['canonical_name'], c['similarity'])
+                        for c in found[table]])
+  conn.close()
+  return(found)
+
+
+def apply_names(database, tables=None, prune=False):
+  """Move articles from merged names to their canonical names (in one transaction)
+
+  Returns:
+    Dictionary with the number of merged names in each table
+  """
+  tables = tables or list(name_tables)
+  conn = sqlite3.connect(database, isolation_level=None)
+  conn.execute('PRAGMA foreign_keys = ON')
+  merged = {}
+  conn.execute('BEGIN')
+  for table in tables:
+    id_column, name_column, junction, fk_column = name_tables[table]
+    mapped = """SELECT id_name FROM canonical_names
+      WHERE name_table = '{0}' AND canonical_id != id_name""".format(table)
+    merged[table] = conn.execute('SELECT COUNT(*) FROM ({0})'.format(mapped)).fetchone()[0]
+
+    conn.execute("""INSERT OR IGNORE INTO {0} (fk_article, {1})
+      SELECT {0}.fk_article, canonical_names.canonical_id FROM {0}
+      JOIN canonical_names ON (canonical_names.name_table = ? AND canonical_names.id_name = {0}.{1})
+      WHERE canonical_names.canonical_id != canonical_names.id_name""".format(junction, fk_column), (table, ))
+    conn.execute('DELETE FROM {0} WHERE {1} IN ({2})'.format(junction, fk_column, mapped))
+    if prune:
+      conn.execute('DELETE FROM {0} WHERE {1} IN ({2})'.format(table, id_column, mapped))
+  conn.execute('COMMIT')
+  conn.close()
+  return(merged)
+
+
+def write_names_csv(found, filename):
+  """Save the clusters to a CSV file for checking"""
+  columns = ['canonical_id', 'canonical_name', 'id_name', 'name', 'similarity']
+  with open(filename, 'w', newline='', encoding='utf-8') as f:
+    csv_out = csv.writer(f)
+    csv_out.writerow(['name_table'] + columns)
+    for table, clusters in found.items():
+      for cluster in sorted(clusters, key=lambda c: (c['canonical_name'], c['name'])):
+        csv_out.writerow([table] + [cluster[column] for column in columns])
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Merge near-identical author and source names.')
+  parser.add_argument('command', choices=['find', 'apply'],
+                      help='find clusters of names, or apply the saved clusters to the junction tables')
+  parser.add_argument('database', type=str,
+                      help='the path to the database')
+  parser.add_argument('--table', action='append', choices=sorted(name_tables), default=None,
+                      help='table of names to normalize (repeatable; defaults to authors and sources)')
+  parser.add_argument('--threshold', type=float, default=0.88,
+                      help='minimum similarity between each pair of words in merged names')
+  parser.add_argument('--phonetic-threshold', type=float, default=0.65,
+                      help='minimum similarity between first or middle names that sound the same')
+  parser.add_argument('--max-block', type=int, default=200,
+                      help='skip blocks with more names than this')
+  parser.add_argument('--csv', type=str, default=None,
+                      help='CSV file of the clusters (for find)')
+  parser.add_argument('--prune', action='store_true',
+                      help='delete merged names after moving their articles (for apply)')
+  args = parser.parse_args()
+
+  if args.command == 'find':
+    found = find_names(args.database, args.table, args.threshold, args.phonetic_threshold, args.max_block)
+    if args.csv:
+      write_names_csv(found, args.csv)
+    for table, clusters in found.items():
+      canonical = len(set(cluster['canonical_id'] for cluster in clusters))
+      print('{0}: {1} names in {2} clusters'.format(table, len(clusters), canonical))
+  else:
+    for table, count in apply_names(args.database, args.table, args.prune).items():
+      print('{0}: merged {1} names'.format(table, count))
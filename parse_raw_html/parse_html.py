@@ -21,8 +21,8 @@
 #                   * The number of rows in the final database may not correspond to the number of files 
 #                     downloaded. For example, httrack downloaded `57831.html` and `57831-2.html`. Because 
 #                     both files are identical and technically have the same URL, only one is inserted 
-#                     into the database. The helper function `check_missing_articles()` in `finish_ahram.py` 
-#                     compares files with database rows if needed.
+#                     into the database. `finish_ahram.py --database` lists downloaded files that
+#                     aren't in the database if needed.
 #                   * httrack surprisingly didn't download every article. However, al-Ahram has a cool 
 #                     sequentially numbered shortlink system. `finish_ahram.py` determines which shortlinked 
 #                     articles were not downloaded and creates a bash script to download all potentially 
@@ -46,6 +46,11 @@ database = 'Corpora/dne.db'  # Create this beforehand; schema is in `schema.sql`
 files_to_parse = 'broken_dne_unicode/*'  # Needs * to work properly
 broken_files = 'broken_again'  # Location for broken files
 
+# Or parse the articles straight from a downloaded mirror, using its index (see
+# mirror_index.py) instead of a flattened folder. Broken files are copied to
+# `broken_files` instead of being moved out of the mirror.
+mirror_folder = None  # e.g. 'dne_test'
+
 
 #---------------------------------------------------------------------
 #---------------------------------------------------------------------
@@ -63,6 +68,12 @@ import sqlite3
 import re
 import glob
 import shutil
+import os
+import sys
+from mirror_index import mirror_files
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prepare_corpus'))
+from compressed_text import connect
 
 
 #----------------------
@@ -580,14 +591,32 @@ class Article:
 #----------------------------------------
 # Connect to the database
 # PARSE_DECLTYPES so datetime works (see http://stackoverflow.com/a/4273249/120898)
-conn = sqlite3.connect(database, detect_types=sqlite3.PARSE_DECLTYPES)
+# connect() also works with compressed and derived databases (see prepare_corpus/compressed_text.py)
+conn = connect(database, detect_types=sqlite3.PARSE_DECLTYPES)
 c = conn.cursor()
 
 # Turn on foreign keys
 c.execute("""PRAGMA foreign_keys = ON""")
 
+# Get the list of files, either from the mirror's index or from files_to_parse
+if mirror_folder:
+  html_files = mirror_files(mirror_folder, publication)
+else:
+  html_files = [(html_file, None) for html_file in glob.glob(files_to_parse)]
+
+def save_broken(html_file, article_key):
+  """Move a broken file to `broken_files`, or copy it there if it's in a mirror
+
+  Mirrored DNE articles are all named index.html, so copies are named after
+  their article key instead.
+  """
+  if article_key is None:
+    shutil.move(html_file, broken_files)
+  else:
+    shutil.copy2(html_file, os.path.join(broken_files, article_key + '.html'))
+
 # Loop through the list, parse each file, and write it to the database
-for html_file in [html_file for html_file in glob.glob(files_to_parse)]:
+for html_file, article_key in html_files:
   print('\n'+html_file)
   try:
     article = Article(html_file)
@@ -595,7 +624,7 @@ for html_file in [html_file for html_file in glob.glob(files_to_parse)]:
     article.write_to_db(conn, c)
   except IndexError:
     # If the file doesn't parse right, save it for later
-    shutil.move(html_file, broken_files)
+    save_broken(html_file, article_key)
 
 # Close everything up
 c.close()
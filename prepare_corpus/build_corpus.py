@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+# Title:          build_corpus.py
+# Description:    Go straight from the SQLite corpora to the stemmed, bigrammed MALLET input
+#                 in one Python 3 process. This replaces running export_to_mallet.py (which
+#                 writes every article to a plain text file) and then process_natural_language.py
+#                 (which reads all those files back in with Python 2). Articles are streamed
+#                 from the databases, normalized, filtered, stemmed, and bigrammed in memory,
+#                 and only the final documents are written to disk.
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 build_corpus.py Output/articles_stemmed prepare_corpus/stopwords.txt Output/bigrams.csv \
+#                   --corpus Corpora/egypt_independent.db egypt_independent \
+#                   --corpus Corpora/ahram.db ahram \
+#                   --corpus Corpora/dne.db dne
+#                 Add --control to build the control corpus instead. Add --store Output/corpus_store
+#                 to also save the final documents as a binary token store (see token_store.py).
+#                 Add --cache Output/preprocess_cache.db to reuse filtered and stemmed tokens from
+#                 earlier runs (see preprocess_cache.py). Add --drop-duplicates to skip the
+#                 non-canonical copies of near-duplicate articles (see find_duplicates.py).
+# Notes:          * The tokens are the same as the two-step path, since both use the same article
+#                   text (title + subtitle + content_no_tags), punctuation, stopwords, and stemmer
+#                   (the helpers live in corpus_helpers.py now).
+#                 * process_natural_language.py fed NLTK the documents in whatever order Python 2's
+#                   dict happened to use, so bigrams that span two documents could change from run
+#                   to run. Documents here are always concatenated in sorted file name order.
+
+# Import modules
+import argparse
+import os
+import sqlite3
+from itertools import chain
+
+from compressed_text import connect
+from corpus_helpers import (ngo_query, control_query, article_text, document_name,
+                            load_stopwords, get_stemmer, filter_words, stem_words,
+                            replace_bigrams, significant_bigrams, write_bigram_csv)
+
+
+#-------------------
+# Helper functions
+#-------------------
+def stream_articles(database, prefix, control=False, drop_duplicates=False):
+  """Yield (document name, text) for every selected article in a database
+
+  Arguments:
+    database: Path to the SQLite database
+    prefix: Prefix for document names (e.g. "egypt_independent")
+    control: Select the pseudo control group instead of NGO mentions
+    drop_duplicates: Skip non-canonical near-duplicates (see find_duplicates.py)
+  """
+  columns = 'id_article, article_title, article_subtitle, article_content_no_tags'
+  if control:
+    sql_statement = control_query(columns, drop_duplicates=drop_duplicates)
+  else:
+    sql_statement = ngo_query(columns, drop_duplicates=drop_duplicates)
+
+  conn = connect(database, detect_types=sqlite3.PARSE_DECLTYPES)
+  conn.row_factory = sqlite3.Row  # Use a dictionary cursor
+  try:
+    for row in conn.execute(sql_statement):
+      yield(document_name(prefix, row['id_article']), article_text(row))
+  finally:
+    conn.close()
+
+
+def process_corpora(corpora, stopwords, stemmer, control=False, cache=None, stemmer_name='snowball',
+                    drop_duplicates=False):
+  """Filter and stem every article in a list of databases
+
+  Arguments:
+    corpora: List of (database, prefix) pairs
+    stopwords: Set of stopwords
+    stemmer: NLTK stemmer object
+    control: Select the pseudo control group instead of NGO mentions
+    cache: Optional PreprocessCache with earlier results
+    stemmer_name: Name of the stemmer (part of the cache key)
+    drop_duplicates: Skip non-canonical near-duplicates
+
+  Returns:
+    Dictionary of stemmed tokens with the document name as the key
+  """
+  if cache:
+    from preprocess_cache import content_hash, config_hashes
+    configs = config_hashes(stopwords, stemmer_name)
+
+  vocabulary = {}
+  for database, prefix in corpora:
+    for name, text in stream_articles(database, prefix, control, drop_duplicates):
+      if not cache:
+        vocabulary[name] = stem_words(filter_words(text, stopwords), stemmer)
+        continue
+
+      # Only redo the stages whose configuration actually changed
+      text_hash = content_hash(text)
+      stemmed = cache.get('stemmed', name, text_hash, configs['stemmed'])
+      if stemmed is None:
+        words = cache.get('filtered', name, text_hash, configs['filtered'])
+        if words is None:
+          words = filter_words(text, stopwords)
+          cache.put('filtered', name, text_hash, configs['filtered'], words)
+        stemmed = stem_words(words, stemmer)
+        cache.put('stemmed', name, text_hash, configs['stemmed'], stemmed)
+      vocabulary[name] = stemmed
+  return(vocabulary)
+
+
+def write_documents(vocabulary, bigrams, output_folder, store=None):
+  """Join/replace bigrams in each document and save the final MALLET input to disk
+
+  Arguments:
+    vocabulary: Dictionary of stemmed tokens with the document name as the key
+    bigrams: List of (w1, w2) tuples to join
+    output_folder: Folder for the final text files
+    store: Optional path to a token store to write as well
+  """
+  bigrams = set(bigrams)
+  writer = None
+  if store:
+    from token_store import TokenStoreWriter  # Only needs numpy if a store is requested
+    writer = TokenStoreWriter(store)
+  for document in sorted(vocabulary):
+    words_fixed = replace_bigrams(vocabulary[document], bigrams)
+    with open(os.path.join(output_folder, document), 'w', encoding='utf-8') as f:
+      f.write(" ".join(words_fixed))
+    if writer:
+      writer.add(document, words_fixed)
+  if writer:
+    writer.close()
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  # Get command line information
+  parser = argparse.ArgumentParser(description='Stem and create bigrams for articles straight from the SQLite corpora.')
+  parser.add_argument('output_folder', type=str,
+                      help='the path to save final stemmed text files')
+  parser.add_argument('stopwords', type=str,
+                      help='a list of stopwords to remove')
+  parser.add_argument('bigram_csv', type=str,
+                      help='CSV of most common bigrams')
+  parser.add_argument('--corpus', nargs=2, action='append', required=True, metavar=('DATABASE', 'PREFIX'),
+                      help='a database to read and the prefix for its article ids (can be repeated)')
+  parser.add_argument('--control', action='store_true',
+                      help='Select a pseudo control group of articles instead of NGO mentions')
+  parser.add_argument('--drop-duplicates', action='store_true',
+                      help='skip near-duplicate copies of articles (run find_duplicates.py first)')
+  parser.add_argument('--stemmer', type=str, default='snowball', choices=['snowball', 'porter', 'lancaster'],
+                      help='the stemming algorithm to use')
+  parser.add_argument('--bigram-min', type=int, default=10,
+                      help='minimum bigram frequency')
+  parser.add_argument('--store', type=str, default=None,
+                      help='the path to save the final documents as a binary token store')
+  parser.add_argument('--cache', type=str, default=None,
+                      help='the path to a cache of preprocessed articles')
+  parser.add_argument('--cache-size', type=int, default=512,
+                      help='maximum size of the cache in MB')
+  args = parser.parse_args()
+
+  # Save arguments
+  corpora = [(os.path.abspath(database), prefix) for database, prefix in args.corpus]
+  output_folder = os.path.abspath(args.output_folder)
+
+  if not os.path.exists(output_folder):
+    os.makedirs(output_folder)
+
+  cache = None
+  if args.cache:
+    from preprocess_cache import PreprocessCache
+    cache = PreprocessCache(args.cache, max_bytes=args.cache_size * 1024 * 1024)
+
+  # Filter and stem everything
+  vocabulary = process_corpora(corpora, load_stopwords(args.stopwords),
+                               get_stemmer(args.stemmer), args.control,
+                               cache, args.stemmer, args.drop_duplicates)
+  if cache:
+    print('Preprocessing cache: {0} hits, {1} misses'.format(cache.hits, cache.misses))
+    cache.close()
+
+  # Find and save significant bigrams
+  token_list = list(chain.from_iterable(vocabulary[document] for document in sorted(vocabulary)))
+  bigrams_significant = significant_bigrams(token_list, args.bigram_min)
+  write_bigram_csv(bigrams_significant, args.bigram_csv)
+
+  # Create clean, final documents
+  write_documents(vocabulary, [pair[0] for pair in bigrams_significant], output_folder, args.store)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+
+# Title:          compressed_text.py
+# Description:    Optional compressed storage for the article text in a corpus database.
+#                 Every article stores three versions of its text (article_content,
+#                 article_content_no_tags, and article_content_no_punc), which is most of
+#                 the 160–500 MB in each database. Articles from the same site share lots of
+#                 boilerplate and vocabulary, so a zstd dictionary trained on that
+#                 publication's articles compresses them far better than compressing each
+#                 article on its own.
+#
+#                 Compressing a database:
+#                   * trains a dictionary and saves it in the zstd_dictionary table
+#                   * renames the real table to articles_packed and compresses its text columns
+#                   * creates an `articles` view that decompresses the text on the fly, with
+#                     triggers so INSERT, UPDATE, and DELETE on `articles` still work
+#                 The view uses the zstd_compress() and zstd_decompress() SQL functions, so
+#                 open compressed databases with connect() below (which registers them)
+#                 instead of sqlite3.connect(). Existing queries then work unchanged.
+#                 zstandard is only imported for compressed databases, so the scripts that
+#                 use connect() still run without it on plain databases.
+#                 The view also handles derived text columns (see derived_text.py), and the
+#                 two storage modes can be used together.
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 compressed_text.py compress Corpora/ahram.db
+#                 python3 compressed_text.py decompress Corpora/ahram.db
+#                 python3 compressed_text.py info Corpora/ahram.db
+#                 In Python:
+#                   conn = connect('Corpora/ahram.db', detect_types=sqlite3.PARSE_DECLTYPES)
+#                   conn.execute('SELECT article_content_no_punc FROM articles')
+# Notes:          * R (RSQLite) can't call Python functions, so decompress a copy of the
+#                   database or use the Parquet export (export_parquet.py) for R.
+#                 * cursor.lastrowid isn't set after inserting into the view, so look up new
+#                   articles by article_url (like parse_html.py already does).
+
+# Import modules
+import argparse
+import os
+import sqlite3
+
+
+# Text columns that get compressed
+text_columns = ['article_content', 'article_content_no_tags', 'article_content_no_punc']
+
+# All columns in the articles table, in schema order
+article_columns = ['id_article', 'article_title', 'article_subtitle', 'article_date',
+                   'article_url', 'article_type', 'article_content', 'article_content_no_tags',
+                   'article_content_no_punc', 'article_word_count', 'article_translated']
+
+
+#-------------------
+# Helper functions
+#-------------------
+def table_exists(conn, name):
+  """Check if a table exists in a database"""
+  row = conn.execute("""SELECT COUNT(*) FROM sqlite_master
+    WHERE type = 'table' AND name = ?""", (name, )).fetchone()
+  return(row[0] > 0)
+
+
+def is_packed(conn):
+  """Check if the articles are stored in articles_packed behind an `articles` view"""
+  return(table_exists(conn, 'articles_packed'))
+
+
+def is_compressed(conn):
+  """Check if a database uses compressed storage"""
+  return(table_exists(conn, 'zstd_dictionary'))
+
+
+def is_derived(conn):
+  """Check if a database derives its cleaned text columns (see derived_text.py)"""
+  return(table_exists(conn, 'derived_text'))
+
+
+def packed_columns(conn):
+  """List the columns that are actually stored in articles_packed"""
+  return([row[1] for row in conn.execute('PRAGMA table_info(articles_packed)')])
+
+
+def load_dictionary(conn):
+  """Get the trained dictionary (as bytes) from a database, or None if there isn't one"""
+  if not is_compressed(conn):
+    return(None)
+  row = conn.execute('SELECT dictionary FROM zstd_dictionary').fetchone()
+  return(row[0] if row else None)
+
+
+def register_functions(conn, dictionary=None, level=9):
+  """Add zstd_compress() and zstd_decompress() to a connection
+
+  Both functions pass NULLs and uncompressed text through unchanged, so a
+  half-converted table still reads correctly.
+
+  Arguments:
+    conn: SQLite connection
+    dictionary: ZstdCompressionDict to use (defaults to the one in the database)
+    level: Compression level for zstd_compress()
+  """
+  import zstandard
+  if dictionary is None and load_dictionary(conn) is not None:
+    dictionary = zstandard.ZstdCompressionDict(load_dictionary(conn))
+  if dictionary is not None:
+    compressor = zstandard.ZstdCompressor(level=level, dict_data=dictionary)
+    decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+  else:
+    compressor = zstandard.ZstdCompressor(level=level)
+    decompressor = zstandard.ZstdDecompressor()
+
+  def compress(value):
+    if value is None or isinstance(value, bytes):
+      return(value)
+    return(compressor.compress(str(value).encode('utf-8')))
+
+  def decompress(value):
+    if not isinstance(value, bytes):
+      return(value)
+    return(decompressor.decompress(value).decode('utf-8'))
+
+  conn.create_function('zstd_compress', 1, compress, deterministic=True)
+  conn.create_function('zstd_decompress', 1, decompress, deterministic=True)
+  return(conn)
+
+
+def connect(database, **kwargs):
+  """Open a corpus database, compressed or not
+
+  Takes the same arguments as sqlite3.connect()
+  """
+  conn = sqlite3.connect(database, **kwargs)
+  if is_compressed(conn):
+    register_functions(conn)
+  if is_derived(conn):
+    from derived_text import register_functions as register_derived_functions
+    register_derived_functions(conn)
+  return(conn)
+
+
+def train_dictionary(conn, dict_size=112640, max_samples=3000):
+  """Train a zstd dictionary on an even sample of a database's articles
+
+  Arguments:
+    conn: Connection to an uncompressed corpus database
+    dict_size: Size of the dictionary in bytes (110 KB is zstd's default)
+    max_samples: Maximum number of articles to sample
+
+  Returns:
+    ZstdCompressionDict
+  """
+  import zstandard
+  table, columns = stored_text_columns(conn)
+  ids = [row[0] for row in conn.execute('SELECT id_article FROM {0} ORDER BY id_article'.format(table))]
+  step = max(1, len(ids) // max_samples)
+  sample_ids = ids[::step][:max_samples]
+
+  samples = []
+  sql = 'SELECT {0} FROM {1} WHERE id_article = ?'.format(', '.join(columns), table)
+  for id_article in sample_ids:
+    for text in conn.execute(sql, (id_article, )).fetchone():
+      if text:
+        samples.append(text.encode('utf-8'))
+  return(zstandard.train_dictionary(dict_size, samples))
+
+
+def stored_text_columns(conn):
+  """Find the table that physically stores the articles and its text columns
+
+  Returns:
+    Tuple of (table name, list of text columns stored in it)
+  """
+  if not is_packed(conn):
+    return('articles', text_columns)
+  stored = packed_columns(conn)
+  return('articles_packed', [column for column in text_columns if column in stored])
+
+
+#-------------------------
+# The `articles` view
+#-------------------------
+def view_sql(compressed, derived):
+  """SQL statements for the `articles` view and the triggers that make it writable
+
+  Arguments:
+    compressed: True if the stored text columns are compressed
+    derived: True if article_content_no_tags, article_content_no_punc, and
+      article_word_count are derived from article_content (see derived_text.py)
+  """
+  from_clause = 'articles_packed'
+  derived_columns = []
+  if derived:
+    from derived_text import derived_columns, derived_select
+    from_clause = """articles_packed LEFT JOIN derived_text
+      ON (derived_text.fk_article = articles_packed.id_article AND derived_text.version = derived_version())"""
+
+  stored = [column for column in article_columns if column not in derived_columns]
+
+  def read(column):
+    value = 'articles_packed.' + column
+    if compressed and column in text_columns:
+      value = 'zstd_decompress({0})'.format(value)
+    return(value)
+
+  select_columns = []
+  for column in article_columns:
+    if column in derived_columns:
+      select_columns.append('{0} AS {1}'.format(derived_select(column, read('article_content')), column))
+    else:
+      select_columns.append('{0} AS {1}'.format(read(column), column))
+
+  values = ['zstd_compress(NEW.{0})'.format(column) if compressed and column in text_columns else 'NEW.' + column
+            for column in stored]
+  assignments = ['{0} = {1}'.format(column, value) for column, value in zip(stored, values)]
+
+  # Derived values in an INSERT or UPDATE are ignored, and changing an article
+  # throws away its cached derived text
+  forget_derived = 'DELETE FROM derived_text WHERE fk_article = OLD.id_article;' if derived else ''
+
+  return([
+    'CREATE VIEW articles AS SELECT {0} FROM {1}'.format(', '.join(select_columns), from_clause),
+    """CREATE TRIGGER articles_insert INSTEAD OF INSERT ON articles BEGIN
+      INSERT INTO articles_packed ({0}) VALUES ({1});
+    END""".format(', '.join(stored), ', '.join(values)),
+    """CREATE TRIGGER articles_update INSTEAD OF UPDATE ON articles BEGIN
+      {1}
+      UPDATE articles_packed SET {0} WHERE id_article = OLD.id_article;
+    END""".format(', '.join(assignments), forget_derived),
+    """CREATE TRIGGER articles_delete INSTEAD OF DELETE ON articles BEGIN
+      {0}
+      DELETE FROM articles_packed WHERE id_article = OLD.id_article;
+    END""".format(forget_derived)
+  ])
+
+
+def drop_view(conn):
+  """Remove the `articles` view and its triggers (and the NGO aggregate triggers; see ngo_aggregates.py)"""
+  from ngo_aggregates import drop_triggers
+  drop_triggers(conn)
+  for statement in ['DROP TRIGGER IF EXISTS articles_insert', 'DROP TRIGGER IF EXISTS articles_update',
+                    'DROP TRIGGER IF EXISTS articles_delete', 'DROP VIEW IF EXISTS articles']:
+    conn.execute(statement)
+
+
+def pack(conn):
+  """Move the articles table to articles_packed (if it isn't there already)"""
+  if not is_packed(conn):
+    # Renaming also points the junction tables' foreign keys at articles_packed
+    conn.execute('ALTER TABLE articles RENAME TO articles_packed')
+
+
+def rebuild_view(conn):
+  """Recreate the `articles` view for however the database is stored now
+
+  If the articles are stored as plain, complete rows again, the view is
+  removed and articles_packed goes back to being the articles table.
+  """
+  drop_view(conn)
+  compressed, derived = is_compressed(conn), is_derived(conn)
+  if compressed or derived:
+    for statement in view_sql(compressed, derived):
+      conn.execute(statement)
+  elif is_packed(conn):
+    conn.execute('ALTER TABLE articles_packed RENAME TO articles')
+
+  # Converting can change the text the NGO counts come from (derived text isn't
+  # always the stored text), so count everything again too
+  from ngo_aggregates import has_aggregates, install_triggers, recount
+  if has_aggregates(conn):
+    recount(conn)
+    install_triggers(conn)
+
+
+#------------------------------
+# Convert the whole database
+#------------------------------
+def compress_database(database, level=9, dict_size=112640):
+  """Convert a database to compressed storage (in one transaction)"""
+  conn = connect(database, isolation_level=None)
+  if is_compressed(conn):
+    conn.close()
+    raise ValueError('{0} is already compressed'.format(database))
+
+  dictionary = train_dictionary(conn, dict_size)
+  register_functions(conn, dictionary, level)
+
+  conn.execute('BEGIN')
+  conn.execute('CREATE TABLE zstd_dictionary (dictionary blob NOT NULL)')
+  conn.execute('INSERT INTO zstd_dictionary (dictionary) VALUES (?)', (dictionary.as_bytes(), ))
+  pack(conn)
+  drop_view(conn)
+  table, columns = stored_text_columns(conn)
+  conn.execute('UPDATE articles_packed SET ' +
+               ', '.join('{0} = zstd_compress({0})'.format(column) for column in columns))
+  rebuild_view(conn)
+  conn.execute('COMMIT')
+
+  conn.execute('VACUUM')
+  conn.close()
+
+
+def decompress_database(database):
+  """Convert a database back to plain text storage (in one transaction)"""
+  conn = connect(database, isolation_level=None)
+  if not is_compressed(conn):
+    conn.close()
+    raise ValueError('{0} is not compressed'.format(database))
+
+  conn.execute('BEGIN')
+  drop_view(conn)
+  table, columns = stored_text_columns(conn)
+  conn.execute('UPDATE articles_packed SET ' +
+               ', '.join('{0} = zstd_decompress({0})'.format(column) for column in columns))
+  conn.execute('DROP TABLE zstd_dictionary')
+  rebuild_view(conn)
+  conn.execute('COMMIT')
+
+  conn.execute('VACUUM')
+  conn.close()
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Compress or decompress the article text in a corpus database.')
+  parser.add_argument('command', choices=['compress', 'decompress', 'info'],
+                      help='what to do with the database')
+  parser.add_argument('database', type=str,
+                      help='the path to the database')
+  parser.add_argument('--level', type=int, default=9,
+                      help='zstd compression level (1–22)')
+  parser.add_argument('--dict-size', type=int, default=112640,
+                      help='size of the trained dictionary in bytes')
+  args = parser.parse_args()
+
+  size_before = os.path.getsize(args.database)
+  if args.command == 'compress':
+    compress_database(args.database, args.level, args.dict_size)
+  elif args.command == 'decompress':
+    decompress_database(args.database)
+  else:
+    conn = sqlite3.connect(args.database)
+    print('{0}: {1}, {2}, {3:.1f} MB'.format(args.database,
+                                             'compressed' if is_compressed(conn) else 'not compressed',
+                                             'derived text' if is_derived(conn) else 'stored text',
+                                             size_before / 1024 / 1024))
+    conn.close()
+
+  if args.command != 'info':
+    print('{0}: {1:.1f} MB → {2:.1f} MB'.format(args.database, size_before / 1024 / 1024,
+                                                os.path.getsize(args.database) / 1024 / 1024))
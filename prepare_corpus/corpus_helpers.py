@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+# Title:          corpus_helpers.py
+# Description:    Shared pieces of the corpus preparation pipeline: the list of NGOs, the
+#                 queries for selecting NGO and control articles, a generator that reads the
+#                 articles for the analysis scripts, and the text normalization, stopword,
+#                 stemming, and bigram helpers originally written for process_natural_language.py
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          Import into other scripts (e.g. `from corpus_helpers import remove_punc`)
+
+# Import modules
+import random
+import re
+import string
+
+from compressed_text import connect
+
+
+#------------
+# Variables
+#------------
+# List of signatory organizations in http://www.eipr.org/en/pressrelease/2013/05/30/1720
+organizations = ["The Cairo Institute for Human Rights Studies", "Misryon Against Religious Discrimination", "The Egyptian Coalition for the Rights of the Child", "Arab Program for Human Rights Activists", "Egyptian Association for Economic and Social Rights", "The Egyptian Association for Community Participation Enhancement", "Rural Development Association", "Mother Association for Rights and Development", "The Human Right Association for the Assistance of the Prisoners", "Arab Network for Human Rights Information", "The Egyptian Initiative for Personal Rights", "Initiators for Culture and Media", "The Human Rights Legal Assistance Group", "The Land Center for Human Rights", "The International Center for Supporting Rights and Freedoms", "Shahid Center for Human Rights", "Egyptian Center for Support of Human Rights", "The Egyptian Center for Public Policy Studies", "The Egyptian Center for Economic and Social Rights", "Andalus Institute for Tolerance and Anti-Violence Studies", "Habi Center for Environmental Rights", "Hemaia Center for Supporting Human Rights Defenders", "Social Democracy Studies Center", "The Hesham Mobarak Law Center", "Arab Penal Reform Organization", "Appropriate Communications Techniques for Development", "Forum for Women in Development", "The Egyptian Organization for Human Rights", "Tanweer Center for Development and Human Rights", "Better Life Association", "The Arab Foundation for Democracy Studies and Human Rights", "Arab Foundation for Civil Society and Human Right Support", "The New Woman Foundation", "Women and Memory Forum", "The Egyptian Foundation for the Advancement of Childhood Conditions", "Awlad Al Ard Association", "Baheya Ya Masr", "Association for Freedom of Expression and of Thought", "Center for Egyptian Women’s Legal Assistance", "Nazra for Feminist Studies"]
+
+# Date range of the project
+date_range = 'article_date BETWEEN \'2011-11-24 00:00:00\' AND \'2013-04-25 23:59:59\''
+
+# Punctuation stripped by process_natural_language.py (everything but hyphens,
+# plus smart quotes, dashes, and non-breaking spaces)
+punc = string.punctuation.replace('-', '') + '–—”’“‘\xa0'
+punc_regex = re.compile('[%s]' % re.escape(punc))
+
+# Skip the non-canonical copies of near-duplicate articles (see find_duplicates.py)
+duplicate_filter = 'id_article NOT IN (SELECT fk_article FROM duplicates WHERE is_canonical = 0)'
+
+
+#-------------------
+# Article selection
+#-------------------
+def ngo_query(columns='*', drop_duplicates=False):
+  """Build the SQL statement that selects all articles mentioning an NGO
+
+  Arguments:
+    columns: String of columns to select
+    drop_duplicates: Skip non-canonical near-duplicates (needs the duplicates table)
+
+  Returns:
+    SQL statement as string
+  """
+  org_sql = ['article_content_no_punc LIKE "%'+org.lower()+'%"' for org in organizations]
+  where = '(' + ' OR '.join(org for org in org_sql) + ') AND ' + date_range
+  if drop_duplicates:
+    where += ' AND ' + duplicate_filter
+  return('SELECT ' + columns + ' FROM articles WHERE ' + where)
+
+
+def control_query(columns='*', seed=1234, limit=200, drop_duplicates=False):
+  """Build the SQL statement that selects a pseudo-random control group of articles
+
+  SQLite doesn't let you specify a seed for RANDOM() (using ORDER BY RANDOM()),
+  so instead, we can sort by a hash of the id, multiplying by the id by a
+  random decimal number and then ignoring everything before the decimal.
+  Convoluted, but it works.
+  See http://stackoverflow.com/questions/2171578/seeding-sqlite-random
+
+  Arguments:
+    columns: String of columns to select
+    seed: Seed for Python's random number generator
+    limit: Number of articles to select
+    drop_duplicates: Skip non-canonical near-duplicates (needs the duplicates table)
+
+  Returns:
+    SQL statement as string
+  """
+  random.seed(seed)
+  pseudo_seed = random.random()
+  where = date_range + (' AND ' + duplicate_filter if drop_duplicates else '')
+  return('SELECT ' + columns + ' FROM articles WHERE ' + where + ' ORDER BY (substr(id_article * ' + str(pseudo_seed) + ' , length(id_article) + 2)) LIMIT ' + str(limit))
+
+
+def read_articles(corpora, all_dates=False, drop_duplicates=False):
+  """Yield (publication, id_article, article_date, article_title, text) for every article"""
+  for database, publication in corpora:
+    conditions = []
+    if not all_dates:
+      conditions.append(date_range)
+    if drop_duplicates:
+      conditions.append(duplicate_filter)
+    where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+    conn = connect(database)
+    for row in conn.execute("""SELECT id_article, article_date, article_title, article_content_no_tags
+        FROM articles{0} ORDER BY id_article""".format(where)):
+      yield((publication, ) + tuple(row))
+    conn.close()
+
+
+def article_text(row):
+  """Combine the title, subtitle, and tag-free content of an article row
+
+  This is exactly the text export_to_mallet.py writes to each plain text file.
+  """
+  text = row['article_title'] + '\n\n'
+  if row['article_subtitle']:
+    text += row['article_subtitle'] + '\n\n'
+  text += row['article_content_no_tags']
+  return(text)
+
+
+def document_name(prefix, id_article):
+  """Build the file name MALLET sees for an article (e.g. "ahram_17539.txt")"""
+  return(prefix + '_' + str(id_article) + '.txt')
+
+
+def split_document_name(name):
+  """Split a document name like "egypt_independent_13.txt" into its prefix and article id"""
+  name = name.split('/')[-1].replace('.txt', '')
+  prefix, id_article = name.rsplit('_', 1)
+  return(prefix, int(id_article))
+
+
+#---------------------
+# Text normalization
+#---------------------
+def remove_punc(text):
+  """Strip punctuation and make everything lowercase"""
+  return(punc_regex.sub(' ', text.lower()))
+
+
+def load_stopwords(stopword_file):
+  """Load a list of stopwords (one per line) into a set
+
+  Using set() speeds up "not in" searches.
+
+  Arguments:
+    stopword_file: Path to stopword file or an open file object
+  """
+  if isinstance(stopword_file, str):
+    with open(stopword_file, 'r', encoding='utf-8') as f:
+      return(set([word.strip() for word in f]))
+  return(set([word.strip() for word in stopword_file]))
+
+
+def get_stemmer(name='snowball'):
+  """Select the stemming algorithm
+
+  Arguments:
+    name: "snowball" (newest, made by Porter in 2001(?)), "porter" (from 1980),
+      or "lancaster" (from 1990)
+  """
+  import nltk
+  if name == 'snowball':
+    return(nltk.stem.snowball.EnglishStemmer())
+  elif name == 'porter':
+    return(nltk.stem.porter.PorterStemmer())
+  elif name == 'lancaster':
+    return(nltk.stem.lancaster.LancasterStemmer())
+  else:
+    raise Exception("You must specify 'snowball', 'porter', or 'lancaster' as the stemmer.")
+
+
+def filter_words(text, stopwords):
+  """Remove punctuation and stopwords from a document and split it into words
+
+  al- and el- aren't taken care of in stopwords, so they have to manually be removed
+  """
+  words = remove_punc(text).strip().split()
+  return([word.replace('el-', '').replace('al-', '') for word in words if word not in stopwords])
+
+
+def stem_words(words, stemmer):
+  """Stem a list of words"""
+  return([stemmer.stem(word) for word in words])
+
+
+# Loop through all the words in the document, find adjacent unigrams that
+# match significat bigrams, and replace them with an underscore-separated
+# token. See process_natural_language.py for the full explanation.
+def replace_bigrams(words, bigrams):
+  words_fixed = []
+  last = None
+  for word in words:
+    if (last, word) in bigrams:
+      words_fixed.append("{0}_{1}".format(last, word))
+      last = None
+    else:
+      if last:
+        words_fixed.append(last)
+      last = word
+  if last:
+    words_fixed.append(last)
+  return(words_fixed)
+
+
+#----------
+# Bigrams
+#----------
+# Select only super significant bigrams
+# scipy.stats.chi2.ppf(0.999, 1) = qchisq(0.999, df=1) = 10.82757
+critical_value = 10.82757
+
+def significant_bigrams(token_list, bigram_min=10):
+  """Find the most important bigram collocations in a flat list of tokens
+
+  See https://nltk.googlecode.com/svn/trunk/doc/howto/collocations.html
+
+  Arguments:
+    token_list: List (or iterable) of all tokens in the corpus
+    bigram_min: Minimum bigram frequency
+
+  Returns:
+    List of ((w1, w2), -2LL) tuples, sorted by likelihood ratio
+  """
+  import nltk
+  from nltk.collocations import BigramCollocationFinder
+
+  bigram_measures = nltk.collocations.BigramAssocMeasures()
+  bigram_finder = BigramCollocationFinder.from_words(token_list)
+  bigram_finder.apply_freq_filter(bigram_min)
+  bigrams_likerat = bigram_finder.score_ngrams(bigram_measures.likelihood_ratio)
+  return([bigram for bigram in bigrams_likerat if bigram[1] > critical_value])
+
+
+def write_bigram_csv(bigrams_significant, csv_path):
+  """Save significant bigrams as a CSV file with -2LL, W1, and W2 columns"""
+  import csv
+  with open(csv_path, 'w', newline='', encoding='utf-8') as csv_file:
+    csv_out = csv.writer(csv_file, delimiter=',', quoting=csv.QUOTE_ALL)
+    csv_out.writerow(['-2LL', 'W1', 'W2'])
+    for bigram in bigrams_significant:
+      csv_out.writerow([bigram[1], bigram[0][0], bigram[0][1]])
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+
+# Title:          derived_text.py
+# Description:    Optional storage mode where only the HTML of each article is stored and the
+#                 cleaned versions are derived from it. article_content_no_tags,
+#                 article_content_no_punc, and article_word_count are all pure functions of
+#                 article_content, but parse_html.py stores all three when it imports an
+#                 article, and clean_extra_cruft.py has to keep them in sync by hand.
+#
+#                 Deriving a database:
+#                   * moves the articles table to articles_packed and drops the three derived
+#                     columns
+#                   * creates an `articles` view (the same one compressed_text.py uses, so the
+#                     two modes can be combined) that fills in the derived columns with the
+#                     article_no_tags(), article_no_punc(), and article_word_count() SQL
+#                     functions. The cleaning runs once per article and is kept in an LRU
+#                     cache, so reading all three columns only parses the HTML once.
+#                   * creates a derived_text table, which can optionally hold precomputed
+#                     (materialized) derived text for faster queries (`refresh` below)
+#                 Every materialized row is stamped with `cleaning_version`. If the cleaning
+#                 functions below change, bump cleaning_version: old rows are ignored until
+#                 they're refreshed, so nothing needs to be rewritten by hand.
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 derived_text.py check Corpora/ahram.db  # Compare the derived text with the stored text
+#                 python3 derived_text.py derive Corpora/ahram.db
+#                 python3 derived_text.py refresh Corpora/ahram.db  # Materialize stale or missing rows
+#                 python3 derived_text.py clear Corpora/ahram.db  # Forget materialized rows
+#                 python3 derived_text.py underive Corpora/ahram.db  # Store the columns again
+#                 Open derived databases with compressed_text.connect(), which registers the
+#                 SQL functions.
+# Notes:          * clean_content() is not exactly what parse_html.py stored. Each publication
+#                   was cleaned a little differently (egind kept empty chunks, DNE's text was
+#                   cleaned before the Related posts and CDATA cruft was cut from the HTML), and
+#                   parse_html.py used BeautifulSoup's default parser. Deriving a database
+#                   throws away the stored text and replaces it with clean_content()'s version,
+#                   which can change which articles ngo_query() selects. Run `check` first to
+#                   see how many articles would change. derive refuses to run if any article's
+#                   text would change, unless --force is used.
+#                 * Derived values that are passed to INSERT or UPDATE on `articles` are ignored.
+#                 * Queries that filter on article_content_no_punc (like ngo_query()) have to
+#                   clean every article unless derived_text is refreshed first.
+#                 * Underiving adds the columns back at the end of articles, so `SELECT *`
+#                   returns them in a different order than schema.sql.
+
+# Import modules
+import argparse
+import os
+import re
+import string
+import sys
+from functools import lru_cache
+
+from bs4 import BeautifulSoup
+
+from compressed_text import connect, drop_view, is_compressed, is_derived, pack, rebuild_view
+from corpus_helpers import organizations
+
+# Bump this whenever the cleaning functions below change
+cleaning_version = 1
+
+# Number of articles to keep in the in-memory cache
+cache_size = 512
+
+# Columns that are derived from article_content, with the SQL function for each
+derived_columns = ['article_content_no_tags', 'article_content_no_punc', 'article_word_count']
+derived_functions = {'article_content_no_tags': 'article_no_tags',
+                     'article_content_no_punc': 'article_no_punc',
+                     'article_word_count': 'article_word_count'}
+
+# Punctuation removed by parse_html.py (not the same as corpus_helpers.punc, which is for tokenizing)
+punc = string.punctuation.replace('-', '') + '–—”’“‘'
+punc_regex = re.compile('[%s]' % re.escape(punc))
+
+
+#----------------------
+# Cleaning functions
+#----------------------
+def strip_all_tags(html):
+  """Remove all HTML tags from the given string (like Article._strip_all_tags())"""
+  html_bs = BeautifulSoup(html, 'html.parser')
+  html_list = html_bs.find_all(string=True)  # Get only the text from all tags
+  html_list = [chunk.strip() for chunk in html_list if chunk.strip() != '']  # Remove blank list elements
+  return(' '.join(html_list))  # Return a string of all list elements combined
+
+
+@lru_cache(maxsize=cache_size)
+def clean_content(content):
+  """Derive the cleaned versions of an article's HTML
+
+  Returns:
+    Tuple of (content without tags, lowercase content without punctuation, word count)
+  """
+  no_tags = [strip_all_tags(chunk) for chunk in content.split('\n')]
+  no_tags = '\n'.join([chunk for chunk in no_tags if chunk != ''])
+  no_punc = punc_regex.sub(' ', no_tags.lower())
+  return(no_tags, no_punc, len(no_punc.split()))
+
+
+#-----------------
+# SQL functions
+#-----------------
+def register_functions(conn):
+  """Add derived_version() and the article_*() cleaning functions to a connection"""
+  def derive(position):
+    def function(content):
+      if content is None:
+        return(None)
+      return(clean_content(content)[position])
+    return(function)
+
+  conn.create_function('derived_version', 0, lambda: cleaning_version, deterministic=True)
+  for position, column in enumerate(derived_columns):
+    conn.create_function(derived_functions[column], 1, derive(position), deterministic=True)
+  return(conn)
+
+
+def derived_select(column, content_sql):
+  """SQL for reading a derived column in the `articles` view
+
+  Uses the materialized value if there is a current one, and cleans the
+  article otherwise.
+  """
+  return('COALESCE(derived_text.{0}, {1}({2}))'.format(column, derived_functions[column], content_sql))
+
+
+def content_sql(conn):
+  """SQL for reading the (possibly compressed) stored article_content"""
+  if is_compressed(conn):
+    return('zstd_decompress(articles_packed.article_content)')
+  return('articles_packed.article_content')
+
+
+#------------------------------
+# Compare with the stored text
+#------------------------------
+def mentions_ngo(no_punc):
+  """Check if punctuation-free text would be selected by ngo_query()"""
+  return(any(organization.lower() in no_punc for organization in organizations))
+
+
+def compare_derived(conn):
+  """Compare clean_content() with the text stored in a database that isn't derived yet
+
+  Returns:
+    Dictionary with the number of articles checked, the number whose
+    article_content_no_tags, article_content_no_punc, or article_word_count
+    would change, the number whose NGO selection would change
+    (ngo_selection), and the ids of the changed articles (changed_ids)
+  """
+  differences = {'articles': 0, 'ngo_selection': 0, 'changed_ids': []}
+  differences.update({column: 0 for column in derived_columns})
+  for row in conn.execute('SELECT id_article, article_content, {0} FROM articles'.format(', '.join(derived_columns))):
+    id_article, content, stored = row[0], row[1], row[2:]
+    derived = clean_content(content or '')
+    differences['articles'] += 1
+    changed = False
+    for column, old, new in zip(derived_columns, stored, derived):
+      if old != new:
+        differences[column] += 1
+        changed = True
+    if changed:
+      differences['changed_ids'].append(id_article)
+      if mentions_ngo(stored[1] or '') != mentions_ngo(derived[1]):
+        differences['ngo_selection'] += 1
+  return(differences)
+
+
+def check_database(database):
+  """Compare the derived text with the stored text (see compare_derived())"""
+  conn = connect(database)
+  if is_derived(conn):
+    conn.close()
+    raise ValueError('{0} already derives its text, so there is nothing to compare'.format(database))
+  differences = compare_derived(conn)
+  conn.close()
+  return(differences)
+
+
+#------------------------------
+# Convert the whole database
+#------------------------------
+def derive_database(database, force=False):
+  """Stop storing the derived columns (in one transaction)
+
+  Arguments:
+    database: Path to the corpus database
+    force: Derive the database even if the derived text differs from the
+      stored text for some articles (see compare_derived())
+
+  Raises:
+    ValueError if the database is already derived, or if any article's text
+    would change and force is False
+  """
+  conn = connect(database, isolation_level=None)
+  if is_derived(conn):
+    conn.close()
+    raise ValueError('{0} already derives its text'.format(database))
+  if not force:
+    differences = compare_derived(conn)
+    if differences['changed_ids']:
+      conn.close()
+      raise ValueError(('{0}: the derived text differs from the stored text in {1} of {2} articles '
+                        '({3} would change NGO selection); run check, or use --force to derive anyway').format(
+                          database, len(differences['changed_ids']), differences['articles'], differences['ngo_selection']))
+
+  conn.execute('BEGIN')
+  pack(conn)
+  drop_view(conn)
+  for column in derived_columns:
+    conn.execute('ALTER TABLE articles_packed DROP COLUMN {0}'.format(column))
+  conn.execute("""CREATE TABLE derived_text (
+    fk_article integer PRIMARY KEY,
+    version integer NOT NULL,
+    article_content_no_tags text NOT NULL,
+    article_content_no_punc text NOT NULL,
+    article_word_count integer NOT NULL,
+    FOREIGN KEY (fk_article) REFERENCES articles_packed (id_article) ON DELETE CASCADE
+  )""")
+  register_functions(conn)
+  rebuild_view(conn)
+  conn.execute('COMMIT')
+
+  conn.execute('VACUUM')
+  conn.close()
+
+
+def underive_database(database):
+  """Store the derived columns in the table again (in one transaction)"""
+  conn = connect(database, isolation_level=None)
+  if not is_derived(conn):
+    conn.close()
+    raise ValueError('{0} already stores its text'.format(database))
+
+  compressed = is_compressed(conn)
+  conn.execute('BEGIN')
+  drop_view(conn)
+  conn.execute("ALTER TABLE articles_packed ADD COLUMN article_content_no_tags text NOT NULL DEFAULT ''")
+  conn.execute("ALTER TABLE articles_packed ADD COLUMN article_content_no_punc text NOT NULL DEFAULT ''")
+  conn.execute('ALTER TABLE articles_packed ADD COLUMN article_word_count integer NOT NULL DEFAULT 0')
+
+  content = content_sql(conn)
+  values = []
+  for column in derived_columns:
+    value = '{0}({1})'.format(derived_functions[column], content)
+    if compressed and column != 'article_word_count':
+      value = 'zstd_compress({0})'.format(value)
+    values.append('{0} = {1}'.format(column, value))
+  conn.execute('UPDATE articles_packed SET ' + ', '.join(values))
+
+  conn.execute('DROP TABLE derived_text')
+  rebuild_view(conn)
+  conn.execute('COMMIT')
+
+  conn.execute('VACUUM')
+  conn.close()
+
+
+def refresh_cache(database, batch_size=500):
+  """Materialize derived text for articles that are missing or out of date
+
+  Returns:
+    Number of articles refreshed
+  """
+  conn = connect(database)
+  if not is_derived(conn):
+    conn.close()
+    raise ValueError('{0} stores its text, so there is nothing to refresh'.format(database))
+
+  rows = conn.execute("""SELECT articles_packed.id_article, {0} FROM articles_packed
+    LEFT JOIN derived_text ON (derived_text.fk_article = articles_packed.id_article)
+    WHERE derived_text.fk_article IS NULL OR derived_text.version != ?""".format(content_sql(conn)),
+    (cleaning_version, )).fetchall()
+
+  for start in range(0, len(rows), batch_size):
+    batch = [(id_article, cleaning_version) + clean_content(content)
+             for id_article, content in rows[start:start + batch_size]]
+    with conn:
+      conn.executemany("""INSERT OR REPLACE INTO derived_text
+        (fk_article, version, article_content_no_tags, article_content_no_punc, article_word_count)
+        VALUES (?, ?, ?, ?, ?)""", batch)
+
+  conn.close()
+  return(len(rows))
+
+
+def clear_cache(database):
+  """Forget all materialized derived text"""
+  conn = connect(database)
+  with conn:
+    conn.execute('DELETE FROM derived_text')
+  conn.execute('VACUUM')
+  conn.close()
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Derive the cleaned text columns of a corpus database instead of storing them.')
+  parser.add_argument('command', choices=['check', 'derive', 'underive', 'refresh', 'clear'],
+                      help='what to do with the database')
+  parser.add_argument('database', type=str,
+                      help='the path to the database')
+  parser.add_argument('--force', action='store_true',
+                      help='derive even if the derived text differs from the stored text (for derive)')
+  args = parser.parse_args()
+
+  if args.command == 'check':
+    differences = check_database(args.database)
+    print('{0}: {1} articles checked'.format(args.database, differences['articles']))
+    for column in derived_columns + ['ngo_selection']:
+      print('  {0}: {1} would change'.format(column, differences[column]))
+    if differences['changed_ids']:
+      print('  First changed articles: {0}'.format(', '.join(str(i) for i in differences['changed_ids'][:20])))
+    sys.exit(1 if differences['changed_ids'] else 0)
+
+  size_before = os.path.getsize(args.database)
+  if args.command == 'derive':
+    try:
+      derive_database(args.database, args.force)
+    except ValueError as e:
+      print(e)
+      sys.exit(1)
+  elif args.command == 'underive':
+    underive_database(args.database)
+  elif args.command == 'refresh':
+    print('Refreshed {0} articles'.format(refresh_cache(args.database)))
+  else:
+    clear_cache(args.database)
+
+  print('{0}: {1:.1f} MB → {2:.1f} MB'.format(args.database, size_before / 1024 / 1024,
+                                              os.path.getsize(args.database) / 1024 / 1024))
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+# Title:          doc_term_matrix.py
+# Description:    Build a sparse document-term matrix from the stemmed corpus and export it
+#                 as a Matrix Market file (plus files with the row and column labels), so R
+#                 doesn't have to re-derive word counts from text.
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 doc_term_matrix.py Output/corpus_store Output/dtm --min-df 2 --max-df 0.9
+#                 The source can be a token store (see token_store.py) or a folder of stemmed
+#                 text files. This creates Output/dtm.mtx, Output/dtm_rows.txt (document names),
+#                 and Output/dtm_cols.txt (terms). In R:
+#                   dtm <- Matrix::readMM("../Output/dtm.mtx")
+#                   rownames(dtm) <- readLines("../Output/dtm_rows.txt")
+#                   colnames(dtm) <- readLines("../Output/dtm_cols.txt")
+#                 In Python:
+#                   matrix, rows, cols = build_matrix(TokenStore('Output/corpus_store'))
+
+# Import modules
+import argparse
+import os
+
+import numpy as np
+import scipy.io
+import scipy.sparse
+
+from token_store import TokenStore, read_folder
+
+
+#-------------------
+# Helper functions
+#-------------------
+def prune_terms(df, n_docs, min_df=1, max_df=1.0, max_terms=None):
+  """Decide which terms to keep based on their document frequencies
+
+  Arguments:
+    df: Array of the number of documents each term appears in
+    n_docs: Number of documents in the corpus
+    min_df: Drop terms that appear in fewer documents than this
+    max_df: Drop terms that appear in more than this proportion of documents
+    max_terms: Optionally keep only this many of the remaining terms (the ones
+      that appear in the most documents; ties go to the lower term id)
+
+  Returns:
+    Boolean array, True for terms to keep
+  """
+  df = np.asarray(df)
+  keep = (df >= min_df) & (df <= max_df * n_docs)
+  if max_terms is not None and keep.sum() > max_terms:
+    candidates = np.flatnonzero(keep)
+    ranked = candidates[np.lexsort((candidates, -df[candidates]))]
+    keep[:] = False
+    keep[ranked[:max_terms]] = True
+  return(keep)
+
+
+def folder_documents(folder):
+  """Convert a folder of text files into (names, vocabulary, token id arrays)"""
+  term_ids = {}
+  names = []
+  documents = []
+  for name, tokens in read_folder(folder):
+    names.append(name)
+    documents.append(np.fromiter((term_ids.setdefault(token, len(term_ids)) for token in tokens),
+                                 dtype=np.uint32, count=len(tokens)))
+  vocabulary = sorted(term_ids, key=term_ids.get)
+  return(names, vocabulary, documents)
+
+
+#---------------------
+# Build the matrix
+#---------------------
+def build_matrix(source, min_df=1, max_df=1.0, max_terms=None):
+  """Stream a corpus into a CSR document-term matrix
+
+  Arguments:
+    source: A TokenStore or a path to a folder of stemmed text files
+    min_df: Drop terms that appear in fewer documents than this
+    max_df: Drop terms that appear in more than this proportion of documents
+    max_terms: Optionally keep only this many terms
+
+  Returns:
+    Tuple of (CSR matrix of counts, list of document names, list of terms)
+  """
+  if isinstance(source, TokenStore):
+    names, vocabulary = source.names, source.vocabulary
+    documents = (source.document(i) for i in range(len(source)))
+  else:
+    names, vocabulary, documents = folder_documents(source)
+
+  # Count each document on its own, so only one document is ever dense
+  indptr = [0]
+  indices = []
+  data = []
+  for document in documents:
+    ids, counts = np.unique(document, return_counts=True)
+    indices.append(ids.astype(np.int32))
+    data.append(counts.astype(np.int32))
+    indptr.append(indptr[-1] + len(ids))
+
+  indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32)
+  data = np.concatenate(data) if data else np.zeros(0, dtype=np.int32)
+  matrix = scipy.sparse.csr_matrix((data, indices, np.asarray(indptr, dtype=np.int64)),
+                                   shape=(len(names), len(vocabulary)))
+
+  # Document frequencies are just the number of stored entries in each column
+  df = np.bincount(matrix.indices, minlength=len(vocabulary))
+  keep = prune_terms(df, len(names), min_df, max_df, max_terms)
+  matrix = matrix[:, np.flatnonzero(keep)].tocsr()
+  terms = [term for term, kept in zip(vocabulary, keep) if kept]
+  return(matrix, list(names), terms)
+
+
+def write_matrix_market(matrix, rows, cols, prefix):
+  """Save a sparse matrix as prefix.mtx, with labels in prefix_rows.txt and prefix_cols.txt"""
+  scipy.io.mmwrite(prefix + '.mtx', matrix, field='integer')
+  with open(prefix + '_rows.txt', 'w', encoding='utf-8') as f:
+    f.write('\n'.join(rows) + '\n')
+  with open(prefix + '_cols.txt', 'w', encoding='utf-8') as f:
+    f.write('\n'.join(cols) + '\n')
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Build a sparse document-term matrix and export it for R.')
+  parser.add_argument('source', type=str,
+                      help='a token store or a folder of stemmed text files')
+  parser.add_argument('output_prefix', type=str,
+                      help='prefix for the .mtx, _rows.txt, and _cols.txt files')
+  parser.add_argument('--min-df', type=int, default=1,
+                      help='drop terms that appear in fewer documents than this')
+  parser.add_argument('--max-df', type=float, default=1.0,
+                      help='drop terms that appear in more than this proportion of documents')
+  parser.add_argument('--max-terms', type=int, default=None,
+                      help='keep only this many terms (the ones in the most documents)')
+  args = parser.parse_args()
+
+  if os.path.exists(os.path.join(args.source, 'tokens.u32')):
+    source = TokenStore(args.source)
+  else:
+    source = args.source
+
+  matrix, rows, cols = build_matrix(source, args.min_df, args.max_df, args.max_terms)
+  write_matrix_market(matrix, rows, cols, args.output_prefix)
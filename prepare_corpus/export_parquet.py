@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+# Title:          export_parquet.py
+# Description:    Export the SQLite corpora to a partitioned Parquet dataset, so R (or Python)
+#                 can load just the columns and date range it needs instead of running
+#                 SELECT * on all three databases. The dataset looks like this:
+#                   articles/publication=ahram/month=2012-01/part-0.parquet
+#                   articles_authors/publication=ahram/part-0.parquet
+#                   articles_sources/publication=ahram/part-0.parquet
+#                   articles_tags/publication=ahram/part-0.parquet
+#                   duplicates/publication=ahram/part-0.parquet (if find_duplicates.py was run)
+#                 Articles are streamed from each database in date order, so only one month
+#                 of one publication is ever held in memory. Repetitive text columns
+#                 (article_type and the author, source, and tag names) are dictionary-encoded,
+#                 which R reads as factors.
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 export_parquet.py Output/parquet \
+#                   --corpus Corpora/egypt_independent.db egypt_independent \
+#                   --corpus Corpora/ahram.db ahram --corpus Corpora/dne.db dne
+#                 In R:
+#                   library(arrow); library(dplyr)
+#                   articles <- open_dataset("../Output/parquet/articles") %>%
+#                     filter(publication == "dne", month >= "2012-06") %>%
+#                     select(id_article, article_date, article_word_count) %>% collect()
+
+# Import modules
+import argparse
+import datetime
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from compressed_text import connect, table_exists
+
+
+# Column types for the articles table. Everything else in the database is text.
+article_schema = pa.schema([
+  ('id_article', pa.int64()),
+  ('article_title', pa.string()),
+  ('article_subtitle', pa.string()),
+  ('article_date', pa.timestamp('s')),
+  ('article_url', pa.string()),
+  ('article_type', pa.dictionary(pa.int32(), pa.string())),
+  ('article_content', pa.string()),
+  ('article_content_no_tags', pa.string()),
+  ('article_content_no_punc', pa.string()),
+  ('article_word_count', pa.int64()),
+  ('article_translated', pa.int64())
+])
+
+# Junction tables, denormalized so each one can be read on its own
+junction_queries = {
+  'articles_authors': ('author_name', """SELECT fk_article, author_name FROM articles_authors
+                                         JOIN authors ON (fk_author = id_author) ORDER BY fk_article"""),
+  'articles_sources': ('source_name', """SELECT fk_article, source_name FROM articles_sources
+                                         JOIN sources ON (fk_source = id_source) ORDER BY fk_article"""),
+  'articles_tags': ('tag_name', """SELECT fk_article, tag_name FROM articles_tags
+                                   JOIN tags ON (fk_tag = id_tag) ORDER BY fk_article""")
+}
+
+
+#-------------------
+# Helper functions
+#-------------------
+def parse_date(value):
+  """Convert SQLite's timestamp text (e.g. "2012-01-31 14:05:00") to a datetime"""
+  if value is None or isinstance(value, datetime.datetime):
+    return(value)
+  return(datetime.datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S'))
+
+
+def partition_folder(output_folder, table, publication, month=None):
+  """Build a Hive-style partition folder (key=value), which arrow uses as columns"""
+  folder = os.path.join(output_folder, table, 'publication=' + publication)
+  if month is not None:
+    folder = os.path.join(folder, 'month=' + month)
+  if not os.path.exists(folder):
+    os.makedirs(folder)
+  return(os.path.join(folder, 'part-0.parquet'))
+
+
+def rows_to_table(rows, schema):
+  """Convert a list of row tuples into an arrow table"""
+  columns = list(zip(*rows)) if rows else [[] for _ in schema]
+  arrays = []
+  for field, column in zip(schema, columns):
+    if pa.types.is_dictionary(field.type):
+      arrays.append(pa.array(column, type=field.type.value_type).dictionary_encode())
+    else:
+      arrays.append(pa.array(column, type=field.type))
+  return(pa.Table.from_arrays(arrays, schema=schema))
+
+
+#---------------------
+# Export the corpora
+#---------------------
+def export_articles(conn, publication, output_folder, batch_size=5000):
+  """Stream one database's articles into monthly Parquet files
+
+  Arguments:
+    conn: Connection to a corpus database
+    publication: Name of the publication partition (e.g. "ahram")
+    output_folder: Root folder of the dataset
+    batch_size: Number of articles in each row group
+
+  Returns:
+    Number of articles exported
+  """
+  columns = ', '.join(field.name for field in article_schema)
+  cursor = conn.execute('SELECT {0} FROM articles ORDER BY article_date, id_article'.format(columns))
+  date_index = article_schema.get_field_index('article_date')
+
+  writer = None
+  month = None
+  rows = []
+  count = 0
+
+  def flush():
+    if rows:
+      writer.write_table(rows_to_table(rows, article_schema))
+      del rows[:]
+
+  while True:
+    batch = cursor.fetchmany(batch_size)
+    if not batch:
+      break
+    for row in batch:
+      row = list(row)
+      row[date_index] = parse_date(row[date_index])
+      row_month = row[date_index].strftime('%Y-%m')
+
+      # Articles come in date order, so a new month means the last one is done
+      if row_month != month:
+        flush()
+        if writer:
+          writer.close()
+        month = row_month
+        writer = pq.ParquetWriter(partition_folder(output_folder, 'articles', publication, month), article_schema)
+
+      rows.append(row)
+      count += 1
+      if len(rows) >= batch_size:
+        flush()
+
+  flush()
+  if writer:
+    writer.close()
+  return(count)
+
+
+def export_junctions(conn, publication, output_folder):
+  """Save the author, source, and tag names of every article"""
+  for table, (name_column, sql) in junction_queries.items():
+    schema = pa.schema([('id_article', pa.int64()),
+                        (name_column, pa.dictionary(pa.int32(), pa.string()))])
+    rows = conn.execute(sql).fetchall()
+    pq.write_table(rows_to_table(rows, schema), partition_folder(output_folder, table, publication))
+
+
+def export_duplicates(conn, publication, output_folder):
+  """Save the near-duplicate clusters (see find_duplicates.py), if there are any"""
+  if not table_exists(conn, 'duplicates'):
+    return
+  schema = pa.schema([('id_article', pa.int64()), ('cluster', pa.int64()),
+                      ('canonical_publication', pa.dictionary(pa.int32(), pa.string())),
+                      ('canonical_article', pa.int64()), ('similarity', pa.float64()),
+                      ('is_canonical', pa.int64())])
+  rows = conn.execute("""SELECT fk_article, cluster, canonical_publication, canonical_article,
+    similarity, is_canonical FROM duplicates ORDER BY fk_article""").fetchall()
+  pq.write_table(rows_to_table(rows, schema), partition_folder(output_folder, 'duplicates', publication))
+
+
+def export_corpora(corpora, output_folder, batch_size=5000):
+  """Export every corpus to one Parquet dataset
+
+  Arguments:
+    corpora: List of (database path, publication name) pairs
+    output_folder: Root folder of the dataset (existing partitions for these
+      publications are replaced)
+    batch_size: Number of articles in each row group
+  """
+  for database, publication in corpora:
+    # Remove old partitions so months that no longer exist don't linger
+    for table in ['articles', 'duplicates'] + list(junction_queries):
+      old = os.path.join(output_folder, table, 'publication=' + publication)
+      if os.path.exists(old):
+        shutil.rmtree(old)
+
+    conn = connect(database)
+    count = export_articles(conn, publication, output_folder, batch_size)
+    export_junctions(conn, publication, output_folder)
+    export_duplicates(conn, publication, output_folder)
+    conn.close()
+    print('Exported {0} articles from {1}'.format(count, publication))
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Export the SQLite corpora to a partitioned Parquet dataset.')
+  parser.add_argument('output_folder', type=str,
+                      help='the folder to save the dataset')
+  parser.add_argument('--corpus', nargs=2, action='append', metavar=('DATABASE', 'PUBLICATION'), required=True,
+                      help='a database and its publication name (e.g. "Corpora/ahram.db ahram"); repeat for each corpus')
+  parser.add_argument('--batch-size', type=int, default=5000,
+                      help='number of articles in each row group')
+  args = parser.parse_args()
+
+  export_corpora(args.corpus, args.output_folder, args.batch_size)
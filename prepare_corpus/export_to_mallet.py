@@ -16,6 +16,8 @@ import os
 import sqlite3
 import random
 
+from compressed_text import connect
+
 # Get command line information
 parser = argparse.ArgumentParser(description='Export all articles in a database to individual plain text files.')
 parser.add_argument('database', type=str, 
@@ -26,6 +28,8 @@ parser.add_argument('output_folder', type=str,
                     help='the path to save final text files')
 parser.add_argument('--control', action='store_true',
                     help='Select a pseudo control group of articles instead of NGO mentions')
+parser.add_argument('--drop-duplicates', action='store_true',
+                    help='Skip near-duplicate copies of articles (run find_duplicates.py first)')
 args = parser.parse_args()
 
 # Save arguments
@@ -34,11 +38,14 @@ prefix = args.prefix
 output_folder = os.path.abspath(args.output_folder)
 control = args.control
 
+# Skip the non-canonical copies of near-duplicate articles (see find_duplicates.py)
+duplicate_filter = ' AND id_article NOT IN (SELECT fk_article FROM duplicates WHERE is_canonical = 0)' if args.drop_duplicates else ''
+
 
 #------------------------------------
 # Connect to and query the database
 #------------------------------------
-conn = sqlite3.connect(database, detect_types=sqlite3.PARSE_DECLTYPES)
+conn = connect(database, detect_types=sqlite3.PARSE_DECLTYPES)
 conn.row_factory = sqlite3.Row  # Use a dictionary cursor
 c = conn.cursor()
 
@@ -48,7 +55,7 @@ if not control:
 
   # Query using the organization names
   org_sql = ['article_content_no_punc LIKE "%'+org.lower()+'%"' for org in organizations]
-  sql_statement = 'SELECT * FROM articles WHERE ('+' OR '.join(org for org in org_sql) + ') AND article_date BETWEEN \'2011-11-24 00:00:00\' AND \'2013-04-25 23:59:59\''
+  sql_statement = 'SELECT * FROM articles WHERE ('+' OR '.join(org for org in org_sql) + ') AND article_date BETWEEN \'2011-11-24 00:00:00\' AND \'2013-04-25 23:59:59\'' + duplicate_filter
   c.execute(sql_statement)
 else:
   # SQLite dosn't let you specify a seed for RANDOM() (using ORDER BY RANDOM()),
@@ -58,7 +65,7 @@ else:
   # See http://stackoverflow.com/questions/2171578/seeding-sqlite-random
   random.seed(1234)
   pseudo_seed = random.random()
-  control_statement = 'SELECT * FROM articles WHERE article_date BETWEEN \'2011-11-24 00:00:00\' AND \'2013-04-25 23:59:59\' ORDER BY (substr(id_article * ' + str(pseudo_seed) + ' , length(id_article) + 2)) LIMIT 200'
+  control_statement = 'SELECT * FROM articles WHERE article_date BETWEEN \'2011-11-24 00:00:00\' AND \'2013-04-25 23:59:59\'' + duplicate_filter + ' ORDER BY (substr(id_article * ' + str(pseudo_seed) + ' , length(id_article) + 2)) LIMIT 200'
   c.execute(control_statement)
 
 # Fetch the results
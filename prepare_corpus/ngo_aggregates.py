@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+
+# Title:          ngo_aggregates.py
+# Description:    Materialized counts of articles, words, and NGO mentions over time, kept up
+#                 to date by triggers inside each corpus database. The summary tables and plots
+#                 only need a few thousand of these rows instead of every article.
+#
+#                 Installing the aggregates adds these tables:
+#                   * ngo_list: the organizations from corpus_helpers.py and the lowercase
+#                     text matched in article_content_no_punc (like ngo_query())
+#                   * ngo_article_counts: each article's day, type, word count, and whether it
+#                     mentions any NGO
+#                   * ngo_article_mentions: how many times each article mentions each NGO
+#                   * ngo_daily: articles, words, NGO articles, and NGO article words per day
+#                     and article type
+#                   * ngo_daily_mentions: articles mentioning each NGO (and total mentions) per
+#                     day and article type
+#                 and views that roll the daily tables up by week (starting on Sunday, like
+#                 lubridate's floor_date(x, "week")) and month: ngo_weekly, ngo_monthly,
+#                 ngo_weekly_mentions, and ngo_monthly_mentions.
+#
+#                 Triggers on the articles table update every table whenever an article is
+#                 inserted, changed (date, type, or text), or deleted, so parse_html.py,
+#                 manual_fixes.py, apply_fixes.py, clean_extra_cruft.py, etc. keep them current
+#                 without doing anything special. Deleting an article subtracts its saved
+#                 counts, so nothing is ever recounted from scratch.
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 ngo_aggregates.py install Corpora/ahram.db
+#                 python3 ngo_aggregates.py install Corpora/ahram.db --replace  # Rebuild if already installed (what `make aggregates` runs)
+#                 python3 ngo_aggregates.py rebuild Corpora/ahram.db  # Recount everything (e.g. after changing the NGO list)
+#                 python3 ngo_aggregates.py check Corpora/ahram.db  # Compare the daily tables with a fresh count
+#                 python3 ngo_aggregates.py remove Corpora/ahram.db
+#                 In R (see R/aggregate_data.R, used by plot_corpus_summary.R and summary_tables.R):
+#                   dbGetQuery(con, "SELECT * FROM ngo_monthly WHERE month BETWEEN '2011-11-01' AND '2013-04-01'")
+# Notes:          * The tables and views are plain SQL, so R can read them even from compressed
+#                   databases. Writing articles to a compressed or derived database still needs
+#                   compressed_text.connect(), since the triggers clean or decompress the text.
+#                 * compressed_text.py and derived_text.py recount everything and reinstall the
+#                   triggers when they convert a database, since derived text can differ from
+#                   the stored text.
+#                 * Days come straight from article_date (local Cairo time, like tz="EET" in
+#                   load_data.R). Filters like egind's article_word_count < 10000 aren't applied.
+
+# Import modules
+import argparse
+import sqlite3
+
+from compressed_text import connect, is_compressed, is_derived, is_packed, table_exists
+from corpus_helpers import organizations
+
+trigger_names = ['ngo_aggregates_insert', 'ngo_aggregates_update', 'ngo_aggregates_delete']
+
+table_sql = [
+  """CREATE TABLE ngo_list (
+    id_ngo integer PRIMARY KEY,
+    ngo_name text NOT NULL,
+    pattern text NOT NULL
+  )""",
+  """CREATE TABLE ngo_article_counts (
+    fk_article integer PRIMARY KEY,
+    day text NOT NULL,
+    article_type text NOT NULL,
+    words integer NOT NULL,
+    ngo_mention integer NOT NULL
+  )""",
+  """CREATE TABLE ngo_article_mentions (
+    fk_article integer NOT NULL,
+    id_ngo integer NOT NULL,
+    mentions integer NOT NULL,
+    PRIMARY KEY (fk_article, id_ngo)
+  )""",
+  """CREATE TABLE ngo_daily (
+    day text NOT NULL,
+    article_type text NOT NULL,
+    articles integer NOT NULL,
+    words integer NOT NULL,
+    ngo_articles integer NOT NULL,
+    ngo_words integer NOT NULL,
+    PRIMARY KEY (day, article_type)
+  )""",
+  """CREATE TABLE ngo_daily_mentions (
+    day text NOT NULL,
+    article_type text NOT NULL,
+    id_ngo integer NOT NULL,
+    articles integer NOT NULL,
+    mentions integer NOT NULL,
+    PRIMARY KEY (day, article_type, id_ngo)
+  )"""
+]
+
+# SQLite's %w is 0 for Sunday, so this is the Sunday on or before each day
+week_sql = "date(day, '-' || strftime('%w', day) || ' days')"
+month_sql = "strftime('%Y-%m-01', day)"
+
+
+#-----------------------
+# Tables and views
+#-----------------------
+def view_sql():
+  """SQL for the weekly and monthly views"""
+  statements = []
+  for name, period in [('week', week_sql), ('month', month_sql)]:
+    statements.append("""CREATE VIEW ngo_{0}ly AS SELECT {1} AS {0}, article_type,
+      SUM(articles) AS articles, SUM(words) AS words,
+      SUM(ngo_articles) AS ngo_articles, SUM(ngo_words) AS ngo_words
+      FROM ngo_daily GROUP BY {0}, article_type""".format(name, period))
+    statements.append("""CREATE VIEW ngo_{0}ly_mentions AS SELECT {1} AS {0}, article_type,
+      ngo_daily_mentions.id_ngo, ngo_name, SUM(articles) AS articles, SUM(mentions) AS mentions
+      FROM ngo_daily_mentions JOIN ngo_list ON (ngo_list.id_ngo = ngo_daily_mentions.id_ngo)
+      GROUP BY {0}, article_type, ngo_daily_mentions.id_ngo""".format(name, period))
+  return(statements)
+
+
+def has_aggregates(conn):
+  """Check if the aggregate tables are installed"""
+  return(table_exists(conn, 'ngo_list'))
+
+
+#-------------
+# Triggers
+#-------------
+def row_sql(conn, row):
+  """SQL for the punctuation-free text and word count of NEW or OLD
+
+  The text comes from wherever the database actually keeps it: the articles
+  table, compressed columns in articles_packed, or derived from
+  article_content (see compressed_text.py and derived_text.py).
+  """
+  def stored(column):
+    value = '{0}.{1}'.format(row, column)
+    if is_compressed(conn):
+      value = 'zstd_decompress({0})'.format(value)
+    return(value)
+
+  if is_derived(conn):
+    content = stored('article_content')
+    return('article_no_punc({0})'.format(content), 'article_word_count({0})'.format(content))
+  return(stored('article_content_no_punc'), '{0}.article_word_count'.format(row))
+
+
+def add_article_sql(conn, row):
+  """Trigger statements that count an article and add it to the daily tables"""
+  no_punc, word_count = row_sql(conn, row)
+  return("""
+    INSERT INTO ngo_article_mentions (fk_article, id_ngo, mentions)
+      SELECT {0}.id_article, id_ngo, (length(text.t) - length(replace(text.t, pattern, ''))) / length(pattern)
+      FROM (SELECT {1} AS t) AS text, ngo_list WHERE instr(text.t, pattern) > 0;
+    INSERT INTO ngo_article_counts (fk_article, day, article_type, words, ngo_mention)
+      VALUES ({0}.id_article, date({0}.article_date), {0}.article_type, {2},
+              EXISTS (SELECT 1 FROM ngo_article_mentions WHERE fk_article = {0}.id_article));
+    INSERT INTO ngo_daily (day, article_type, articles, words, ngo_articles, ngo_words)
+      SELECT day, article_type, 1, words, ngo_mention, ngo_mention * words
+      FROM ngo_article_counts WHERE fk_article = {0}.id_article
+      ON CONFLICT (day, article_type) DO UPDATE SET articles = articles + excluded.articles,
+        words = words + excluded.words, ngo_articles = ngo_articles + excluded.ngo_articles,
+        ngo_words = ngo_words + excluded.ngo_words;
+    INSERT INTO ngo_daily_mentions (day, article_type, id_ngo, articles, mentions)
+      SELECT day, article_type, id_ngo, 1, mentions
+      FROM ngo_article_mentions JOIN ngo_article_counts USING (fk_article)
+      WHERE fk_article = {0}.id_article
+      ON CONFLICT (day, article_type, id_ngo) DO UPDATE SET articles = articles + excluded.articles,
+        mentions = mentions + excluded.mentions;
+  """.format(row, no_punc, word_count))
+
+
+def remove_article_sql(row):
+  """Trigger statements that subtract an article's saved counts from the daily tables"""
+  return("""
+    UPDATE ngo_daily_mentions SET articles = articles - 1,
+      mentions = mentions - (SELECT mentions FROM ngo_article_mentions
+                             WHERE fk_article = {0}.id_article AND id_ngo = ngo_daily_mentions.id_ngo)
+      WHERE (day, article_type) = (SELECT day, article_type FROM ngo_article_counts WHERE fk_article = {0}.id_article)
+      AND id_ngo IN (SELECT id_ngo FROM ngo_article_mentions WHERE fk_article = {0}.id_article);
+    UPDATE ngo_daily SET articles = ngo_daily.articles - 1, words = ngo_daily.words - counts.words,
+      ngo_articles = ngo_daily.ngo_articles - counts.ngo_mention,
+      ngo_words = ngo_daily.ngo_words - counts.ngo_mention * counts.words
+      FROM (SELECT * FROM ngo_article_counts WHERE fk_article = {0}.id_article) AS counts
+      WHERE ngo_daily.day = counts.day AND ngo_daily.article_type = counts.article_type;
+    DELETE FROM ngo_daily_mentions WHERE articles <= 0
+      AND (day, article_type) = (SELECT day, article_type FROM ngo_article_counts WHERE fk_article = {0}.id_article);
+    DELETE FROM ngo_daily WHERE articles <= 0
+      AND (day, article_type) = (SELECT day, article_type FROM ngo_article_counts WHERE fk_article = {0}.id_article);
+    DELETE FROM ngo_article_mentions WHERE fk_article = {0}.id_article;
+    DELETE FROM ngo_article_counts WHERE fk_article = {0}.id_article;
+  """.format(row))
+
+
+def trigger_sql(conn):
+  """SQL for the triggers on whichever table actually stores the articles"""
+  table = 'articles_packed' if is_packed(conn) else 'articles'
+  if is_derived(conn):
+    watched = ['article_date', 'article_type', 'article_content']
+  else:
+    watched = ['article_date', 'article_type', 'article_content_no_punc', 'article_word_count']
+
+  return([
+    'CREATE TRIGGER ngo_aggregates_insert AFTER INSERT ON {0} BEGIN {1} END'.format(
+      table, add_article_sql(conn, 'NEW')),
+    'CREATE TRIGGER ngo_aggregates_update AFTER UPDATE OF {0} ON {1} BEGIN {2} {3} END'.format(
+      ', '.join(watched), table, remove_article_sql('OLD'), add_article_sql(conn, 'NEW')),
+    'CREATE TRIGGER ngo_aggregates_delete AFTER DELETE ON {0} BEGIN {1} END'.format(
+      table, remove_article_sql('OLD'))
+  ])
+
+
+def drop_triggers(conn):
+  """Remove the aggregate triggers"""
+  for name in trigger_names:
+    conn.execute('DROP TRIGGER IF EXISTS {0}'.format(name))
+
+
+def install_triggers(conn):
+  """(Re)create the aggregate triggers for however the database is stored now"""
+  drop_triggers(conn)
+  for statement in trigger_sql(conn):
+    conn.execute(statement)
+
+
+#---------------------
+# Count from scratch
+#---------------------
+def recount(conn):
+  """Empty the aggregate tables and count every article again"""
+  for table in ['ngo_article_mentions', 'ngo_article_counts', 'ngo_daily', 'ngo_daily_mentions']:
+    conn.execute('DELETE FROM {0}'.format(table))
+  patterns = conn.execute('SELECT id_ngo, pattern FROM ngo_list').fetchall()
+
+  mentions = []
+  counts = []
+  for id_article, day, article_type, no_punc, word_count in conn.execute("""SELECT id_article,
+      date(article_date), article_type, article_content_no_punc, article_word_count FROM articles"""):
+    found = [(id_article, id_ngo, no_punc.count(pattern)) for id_ngo, pattern in patterns if pattern in no_punc]
+    mentions.extend(found)
+    counts.append((id_article, day, article_type, word_count, int(len(found) > 0)))
+  conn.executemany('INSERT INTO ngo_article_mentions VALUES (?, ?, ?)', mentions)
+  conn.executemany('INSERT INTO ngo_article_counts VALUES (?, ?, ?, ?, ?)', counts)
+
+  conn.execute("""INSERT INTO ngo_daily SELECT day, article_type, COUNT(*), SUM(words),
+    SUM(ngo_mention), SUM(ngo_mention * words) FROM ngo_article_counts GROUP BY day, article_type""")
+  conn.execute("""INSERT INTO ngo_daily_mentions SELECT day, article_type, id_ngo, COUNT(*), SUM(mentions)
+    FROM ngo_article_mentions JOIN ngo_article_counts USING (fk_article)
+    GROUP BY day, article_type, id_ngo""")
+
+
+def install_aggregates(database, replace=False):
+  """Add the aggregate tables, views, and triggers and count every article (in one transaction)
+
+  Arguments:
+    database: Path to the database
+    replace: If the aggregates are already installed, rebuild them instead of failing
+  """
+  conn = connect(database, isolation_level=None)
+  if has_aggregates(conn):
+    conn.close()
+    if replace:
+      return(rebuild_aggregates(database))
+    raise ValueError('{0} already has NGO aggregates'.format(database))
+  conn.execute('BEGIN')
+  for statement in table_sql + view_sql():
+    conn.execute(statement)
+  conn.executemany('INSERT INTO ngo_list (ngo_name, pattern) VALUES (?, ?)',
+                   [(organization, organization.lower()) for organization in organizations])
+  recount(conn)
+  install_triggers(conn)
+  conn.execute('COMMIT')
+  conn.close()
+
+
+def rebuild_aggregates(database):
+  """Refresh the NGO list and count every article again (in one transaction)"""
+  conn = connect(database, isolation_level=None)
+  conn.execute('BEGIN')
+  conn.execute('DELETE FROM ngo_list')
+  conn.executemany('INSERT INTO ngo_list (ngo_name, pattern) VALUES (?, ?)',
+                   [(organization, organization.lower()) for organization in organizations])
+  recount(conn)
+  install_triggers(conn)
+  conn.execute('COMMIT')
+  conn.close()
+
+
+def remove_aggregates(database):
+  """Drop all the aggregate tables, views, and triggers"""
+  conn = sqlite3.connect(database, isolation_level=None)
+  conn.execute('BEGIN')
+  drop_triggers(conn)
+  for view in ['ngo_weekly', 'ngo_monthly', 'ngo_weekly_mentions', 'ngo_monthly_mentions']:
+    conn.execute('DROP VIEW IF EXISTS {0}'.format(view))
+  for table in ['ngo_list', 'ngo_article_counts', 'ngo_article_mentions', 'ngo_daily', 'ngo_daily_mentions']:
+    conn.execute('DROP TABLE IF EXISTS {0}'.format(table))
+  conn.execute('COMMIT')
+  conn.execute('VACUUM')
+  conn.close()
+
+
+def check_aggregates(database):
+  """Compare the materialized daily tables with a fresh count (without saving it)
+
+  Returns:
+    Number of daily rows that differ
+  """
+  conn = connect(database, isolation_level=None)
+  materialized = [conn.execute('SELECT * FROM {0} ORDER BY 1, 2, 3'.format(table)).fetchall()
+                  for table in ['ngo_daily', 'ngo_daily_mentions']]
+  conn.execute('BEGIN')
+  recount(conn)
+  fresh = [conn.execute('SELECT * FROM {0} ORDER BY 1, 2, 3'.format(table)).fetchall()
+           for table in ['ngo_daily', 'ngo_daily_mentions']]
+  conn.execute('ROLLBACK')
+  conn.close()
+  return(sum(len(set(old) ^ set(new)) for old, new in zip(materialized, fresh)))
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Keep materialized NGO mention counts in a corpus database.')
+  parser.add_argument('command', choices=['install', 'rebuild', 'check', 'remove'],
+                      help='what to do with the aggregates')
+  parser.add_argument('database', type=str,
+                      help='the path to the database')
+  parser.add_argument('--replace', action='store_true',
+                      help='with install, rebuild the aggregates if they already exist')
+  args = parser.parse_args()
+
+  if args.command == 'install':
+    install_aggregates(args.database, args.replace)
+  elif args.command == 'rebuild':
+    rebuild_aggregates(args.database)
+  elif args.command == 'check':
+    differences = check_aggregates(args.database)
+    print('{0}: {1}'.format(args.database, 'up to date' if differences == 0 else
+                            '{0} daily rows differ (run rebuild)'.format(differences)))
+  else:
+    remove_aggregates(args.database)
+
+  if args.command != 'check' and args.command != 'remove':
+    conn = sqlite3.connect(args.database)
+    print('{0}: {1} days, {2} NGO articles'.format(args.database,
+                                                   conn.execute('SELECT COUNT(DISTINCT day) FROM ngo_daily').fetchone()[0],
+                                                   conn.execute('SELECT SUM(ngo_articles) FROM ngo_daily').fetchone()[0]))
+    conn.close()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+# Title:          preprocess_cache.py
+# Description:    Cache of per-article preprocessing results, so tweaking stopwords.txt, the
+#                 stemmer, or the bigram threshold doesn't mean re-tokenizing and re-stemming
+#                 every article from scratch. Two stages are cached:
+#                   * filtered: tokens after punctuation and stopword removal (depends on the
+#                     stopword list)
+#                   * stemmed: stemmed tokens (depends on the stopword list and the stemmer)
+#                 Bigrams are found across the whole corpus, so changing bigram_min only reruns
+#                 the bigram step on top of the cached stemmed tokens.
+#
+#                 Entries live in an SQLite database and are keyed by the document name (which
+#                 includes id_article), a hash of the article text, and a hash of the relevant
+#                 configuration. Tokens are saved as arrays of uint32 term ids, and each term
+#                 counts how many entries use it. The size limit covers both the token arrays
+#                 and the term text, and the cache keeps a running total of both. Every
+#                 commit_every new entries (and when the cache is closed), the new entries are
+#                 committed and, if the cache has grown past its size limit, the least recently
+#                 used entries are evicted along with any terms nothing else uses, so a crash
+#                 only loses the last few documents.
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          Pass --cache Output/preprocess_cache.db to build_corpus.py
+
+# Import modules
+import hashlib
+import sqlite3
+import time
+from array import array
+
+# Bump this if filter_words() or remove_punc() in corpus_helpers.py changes, since
+# that changes the output of the filtered stage for the same stopwords
+normalization_version = 1
+
+
+#-------------------
+# Helper functions
+#-------------------
+def content_hash(text):
+  """Hash the text of an article"""
+  return(hashlib.sha1(text.encode('utf-8')).hexdigest())
+
+
+def config_hashes(stopwords, stemmer_name):
+  """Hash the configuration that each cached stage depends on
+
+  Arguments:
+    stopwords: Set of stopwords
+    stemmer_name: Name of the stemmer (e.g. "snowball")
+
+  Returns:
+    Dictionary with a configuration hash for the "filtered" and "stemmed" stages
+  """
+  filtered = hashlib.sha1(('v{0}\n'.format(normalization_version) + '\n'.join(sorted(stopwords))).encode('utf-8')).hexdigest()
+  stemmed = hashlib.sha1((filtered + '\n' + stemmer_name).encode('utf-8')).hexdigest()
+  return({'filtered': filtered, 'stemmed': stemmed})
+
+
+#------------
+# The cache
+#------------
+class PreprocessCache:
+  """Size-bounded SQLite cache of tokenized articles
+
+  Attributes:
+    hits: Number of successful lookups
+    misses: Number of failed lookups
+    size: Bytes of token arrays and term text currently cached
+  """
+  def __init__(self, path, max_bytes=512 * 1024 * 1024, commit_every=500):
+    """Open (or create) the cache
+
+    Arguments:
+      path: String of path to the cache database
+      max_bytes: Maximum size of all cached token arrays and terms
+      commit_every: Commit and evict after this many new entries
+    """
+    self.max_bytes = max_bytes
+    self.commit_every = commit_every
+    self.pending = 0
+    self.hits = 0
+    self.misses = 0
+    self.conn = sqlite3.connect(path)
+
+    # Caches from before terms were reference counted can't be pruned, so start over
+    term_columns = [row[1] for row in self.conn.execute('PRAGMA table_info(terms)')]
+    if term_columns and 'refs' not in term_columns:
+      self.conn.executescript('DROP TABLE IF EXISTS entries; DROP TABLE terms;')
+
+    self.conn.executescript("""
+      CREATE TABLE IF NOT EXISTS terms (
+        id_term integer PRIMARY KEY,
+        term text NOT NULL UNIQUE,
+        refs integer NOT NULL
+      );
+      CREATE TABLE IF NOT EXISTS entries (
+        stage text NOT NULL,
+        document text NOT NULL,
+        content_hash text NOT NULL,
+        config_hash text NOT NULL,
+        tokens blob NOT NULL,
+        last_used real NOT NULL,
+        PRIMARY KEY (stage, document, content_hash, config_hash)
+      );
+      CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+    """)
+    self.term_ids = {}
+    self.terms = {}
+    self.refs = {}
+    for id_term, term, refs in self.conn.execute('SELECT id_term, term, refs FROM terms'):
+      self.term_ids[term] = id_term
+      self.terms[id_term] = term
+      self.refs[id_term] = refs
+    self.next_term = max(self.terms, default=0) + 1
+    self.changed_refs = set()
+
+    # Keep a running total instead of summing every blob at each checkpoint
+    self.size = self.conn.execute('SELECT COALESCE(SUM(length(tokens)), 0) FROM entries').fetchone()[0]
+    self.size += sum(self._term_size(term) for term in self.term_ids)
+
+  def _term_size(self, term):
+    return(len(term.encode('utf-8')))
+
+  def _encode(self, tokens):
+    new_terms = []
+    for token in tokens:
+      if token not in self.term_ids:
+        id_term = self.next_term
+        self.next_term += 1
+        self.term_ids[token] = id_term
+        self.terms[id_term] = token
+        self.refs[id_term] = 0
+        self.size += self._term_size(token)
+        new_terms.append((id_term, token))
+    if new_terms:
+      # OR REPLACE, since a term dropped since the last checkpoint is still saved under its old id
+      self.conn.executemany('INSERT OR REPLACE INTO terms (id_term, term, refs) VALUES (?, ?, 0)', new_terms)
+    return(array('I', [self.term_ids[token] for token in tokens]).tobytes())
+
+  def _ids(self, blob):
+    ids = array('I')
+    ids.frombytes(blob)
+    return(ids)
+
+  def _decode(self, blob):
+    return([self.terms[id_term] for id_term in self._ids(blob)])
+
+  def _add_refs(self, blob):
+    for id_term in set(self._ids(blob)):
+      self.refs[id_term] += 1
+      self.changed_refs.add(id_term)
+    self.size += len(blob)
+
+  def _remove_refs(self, blob):
+    """Stop counting an entry's tokens, dropping terms no other entry uses"""
+    for id_term in set(self._ids(blob)):
+      self.refs[id_term] -= 1
+      self.changed_refs.add(id_term)
+      if self.refs[id_term] <= 0:
+        term = self.terms.pop(id_term)
+        del self.term_ids[term]
+        self.size -= self._term_size(term)
+    self.size -= len(blob)
+
+  def get(self, stage, document, text_hash, config_hash):
+    """Look up cached tokens
+
+    Returns:
+      List of tokens, or None if nothing is cached
+    """
+    key = (stage, document, text_hash, config_hash)
+    row = self.conn.execute("""SELECT tokens FROM entries WHERE stage = ? AND document = ?
+      AND content_hash = ? AND config_hash = ?""", key).fetchone()
+    if row is None:
+      self.misses += 1
+      return(None)
+    self.hits += 1
+    self.conn.execute("""UPDATE entries SET last_used = ? WHERE stage = ? AND document = ?
+      AND content_hash = ? AND config_hash = ?""", (time.time(), ) + key)
+    return(self._decode(row[0]))
+
+  def put(self, stage, document, text_hash, config_hash, tokens):
+    """Save tokens for a stage"""
+    key = (stage, document, text_hash, config_hash)
+    old = self.conn.execute("""SELECT tokens FROM entries WHERE stage = ? AND document = ?
+      AND content_hash = ? AND config_hash = ?""", key).fetchone()
+    blob = self._encode(tokens)
+    self._add_refs(blob)
+    if old is not None:
+      self._remove_refs(old[0])
+    self.conn.execute("""INSERT OR REPLACE INTO entries
+      (stage, document, content_hash, config_hash, tokens, last_used)
+      VALUES (?, ?, ?, ?, ?, ?)""", key + (blob, time.time()))
+    self.pending += 1
+    if self.pending >= self.commit_every:
+      self.checkpoint()
+
+  def evict(self):
+    """Delete the least recently used entries (and the terms only they used) until the cache fits in max_bytes"""
+    if self.size <= self.max_bytes:
+      return(0)
+    to_delete = []
+    for rowid, blob in self.conn.execute('SELECT rowid, tokens FROM entries ORDER BY last_used'):
+      if self.size <= self.max_bytes:
+        break
+      to_delete.append((rowid, ))
+      self._remove_refs(blob)
+    self.conn.executemany('DELETE FROM entries WHERE rowid = ?', to_delete)
+    return(len(to_delete))
+
+  def _save_refs(self):
+    """Write changed reference counts and delete unused terms"""
+    counts = [(self.refs[id_term], id_term) for id_term in self.changed_refs if id_term in self.terms]
+    unused = [(id_term, ) for id_term in self.changed_refs if id_term not in self.terms]
+    self.conn.executemany('UPDATE terms SET refs = ? WHERE id_term = ?', counts)
+    self.conn.executemany('DELETE FROM terms WHERE id_term = ?', unused)
+    for (id_term, ) in unused:
+      del self.refs[id_term]
+    self.changed_refs = set()
+
+  def checkpoint(self):
+    """Evict old entries and save everything so far"""
+    self.evict()
+    self._save_refs()
+    self.conn.commit()
+    self.pending = 0
+
+  def close(self):
+    """Evict old entries, save everything, and close the database"""
+    self.checkpoint()
+    self.conn.close()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+# Title:          prune_vocabulary.py
+# Description:    Remove very rare and nearly universal stems from the stemmed corpus before
+#                 importing it into MALLET. Both kinds of terms survive process_natural_language.py
+#                 and build_corpus.py, and they make MALLET's alphabet (and every Gibbs sampling
+#                 iteration) bigger without adding anything useful to the topics.
+#                 Document frequencies are counted in one streaming pass, then every document
+#                 is rewritten without the dropped terms and a report lists what was dropped.
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          python3 prune_vocabulary.py Output/articles_stemmed Output/articles_pruned \
+#                   Output/pruned_terms.csv --min-df 3 --max-df 0.5 --max-terms 20000
+#                 The source can be a folder of stemmed text files or a token store (see
+#                 token_store.py). Add --store to also save the pruned corpus as a token store.
+#                 To model the pruned corpus, point `import.dir` in create_topic_model.R at the
+#                 new folder.
+
+# Import modules
+import argparse
+import csv
+import os
+from collections import Counter
+
+import numpy as np
+
+from doc_term_matrix import prune_terms
+from token_store import TokenStore, TokenStoreWriter, read_folder
+
+
+#-------------------------
+# Document frequencies
+#-------------------------
+def store_frequencies(store):
+  """Count how many documents each term appears in
+
+  Returns:
+    Tuple of (list of terms, array of document frequencies, number of documents)
+  """
+  df = np.zeros(len(store.vocabulary), dtype=np.int64)
+  for i in range(len(store)):
+    df[np.unique(store.document(i))] += 1
+  return(store.vocabulary, df, len(store))
+
+
+def folder_frequencies(folder):
+  """Count how many documents each term appears in, reading one file at a time
+
+  Returns:
+    Tuple of (list of terms, array of document frequencies, number of documents)
+  """
+  counts = Counter()
+  n_docs = 0
+  for name, tokens in read_folder(folder):
+    counts.update(set(tokens))
+    n_docs += 1
+  terms = sorted(counts)
+  return(terms, np.array([counts[term] for term in terms], dtype=np.int64), n_docs)
+
+
+def drop_reasons(df, n_docs, keep, min_df, max_df):
+  """Explain why each dropped term was dropped"""
+  reasons = np.full(len(df), '', dtype=object)
+  reasons[~keep] = 'over_max_terms'
+  reasons[df > max_df * n_docs] = 'above_max_df'
+  reasons[df < min_df] = 'below_min_df'
+  return(reasons)
+
+
+#-------------------------
+# Rewrite the documents
+#-------------------------
+def prune_corpus(source, output_folder, report_csv, min_df=1, max_df=1.0, max_terms=None, store=None):
+  """Drop rare and common terms from every document
+
+  Arguments:
+    source: A TokenStore or a path to a folder of stemmed text files
+    output_folder: Folder for the pruned text files
+    report_csv: CSV file listing every dropped term, its document frequency, and why
+    min_df: Drop terms that appear in fewer documents than this
+    max_df: Drop terms that appear in more than this proportion of documents
+    max_terms: Optionally keep only this many terms
+    store: Optional path to save the pruned corpus as a token store
+
+  Returns:
+    Set of kept terms
+  """
+  if isinstance(source, TokenStore):
+    terms, df, n_docs = store_frequencies(source)
+    documents = ((name, source.words(i)) for i, name in enumerate(source.names))
+  else:
+    terms, df, n_docs = folder_frequencies(source)
+    documents = read_folder(source)
+
+  keep = prune_terms(df, n_docs, min_df, max_df, max_terms)
+  reasons = drop_reasons(df, n_docs, keep, min_df, max_df)
+  kept_terms = set(term for term, kept in zip(terms, keep) if kept)
+
+  # Save the report of dropped terms, most common first
+  with open(report_csv, 'w', newline='', encoding='utf-8') as csv_file:
+    csv_out = csv.writer(csv_file)
+    csv_out.writerow(['term', 'df', 'reason'])
+    for i in sorted(np.flatnonzero(~keep), key=lambda i: (-df[i], terms[i])):
+      csv_out.writerow([terms[i], df[i], reasons[i]])
+
+  if not os.path.exists(output_folder):
+    os.makedirs(output_folder)
+  writer = TokenStoreWriter(store) if store else None
+  for name, tokens in documents:
+    tokens = [token for token in tokens if token in kept_terms]
+    with open(os.path.join(output_folder, name), 'w', encoding='utf-8') as f:
+      f.write(' '.join(tokens))
+    if writer:
+      writer.add(name, tokens)
+  if writer:
+    writer.close()
+
+  return(kept_terms)
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Drop rare and nearly universal terms from a stemmed corpus.')
+  parser.add_argument('source', type=str,
+                      help='a folder of stemmed text files or a token store')
+  parser.add_argument('output_folder', type=str,
+                      help='the path to save the pruned text files')
+  parser.add_argument('report_csv', type=str,
+                      help='CSV of dropped terms')
+  parser.add_argument('--min-df', type=int, default=1,
+                      help='drop terms that appear in fewer documents than this')
+  parser.add_argument('--max-df', type=float, default=1.0,
+                      help='drop terms that appear in more than this proportion of documents')
+  parser.add_argument('--max-terms', type=int, default=None,
+                      help='keep only this many terms (the ones in the most documents)')
+  parser.add_argument('--store', type=str, default=None,
+                      help='the path to save the pruned corpus as a token store')
+  args = parser.parse_args()
+
+  if os.path.exists(os.path.join(args.source, 'tokens.u32')):
+    source = TokenStore(args.source)
+  else:
+    source = args.source
+
+  kept_terms = prune_corpus(source, args.output_folder, args.report_csv,
+                            args.min_df, args.max_df, args.max_terms, args.store)
+  print('Kept {0} terms'.format(len(kept_terms)))
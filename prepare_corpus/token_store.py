@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+# Title:          token_store.py
+# Description:    Compact binary format for the stemmed corpus. Instead of lists of strings
+#                 and folders of space-separated text files, a store is a folder with:
+#                   * vocabulary.txt: one term per line (the line number is the token id)
+#                   * documents.txt: one document name per line (e.g. "ahram_17539.txt")
+#                   * tokens.u32: every token in the corpus as one flat little-endian uint32 array
+#                   * offsets.i64: little-endian int64 array of n_documents + 1 positions in
+#                     tokens.u32, so document i is tokens[offsets[i]:offsets[i + 1]]
+#                 The token and offset arrays are memory-mapped when reading, so opening the
+#                 full corpus takes milliseconds and almost no memory.
+# Author:         Andrew Heiss
+# Last updated:   2026-10-18
+# Python version: ≥3.0
+# Usage:          Write a store with build_corpus.py --store, or convert an existing folder:
+#                   python3 token_store.py from-folder Output/articles_stemmed Output/corpus_store
+#                 Export a store back to MALLET input:
+#                   python3 token_store.py to-folder Output/corpus_store Output/articles_stemmed
+#                   python3 token_store.py to-mallet-file Output/corpus_store Output/articles.txt
+#                 Or use it in Python:
+#                   store = TokenStore('Output/corpus_store')
+#                   store.words(0), store.bag_of_words(0)
+
+# Import modules
+import argparse
+import glob
+import os
+
+import numpy as np
+
+from corpus_helpers import split_document_name
+
+token_dtype = np.dtype('<u4')
+offset_dtype = np.dtype('<i8')
+
+
+#----------
+# Writing
+#----------
+class TokenStoreWriter:
+  """Stream documents into a new token store
+
+  Use as a context manager so everything gets closed and saved:
+
+    with TokenStoreWriter('Output/corpus_store') as writer:
+      writer.add('ahram_1.txt', ['human_right', 'group'])
+  """
+  def __init__(self, path):
+    """Create the store folder and open the token array
+
+    Arguments:
+      path: String of path to the store folder
+    """
+    self.path = path
+    if not os.path.exists(path):
+      os.makedirs(path)
+    self.vocabulary = {}
+    self.names = []
+    self.offsets = [0]
+    self._tokens_file = open(os.path.join(path, 'tokens.u32'), 'wb')
+
+  def term_id(self, term):
+    """Get the id for a term, adding it to the vocabulary if it's new"""
+    if term not in self.vocabulary:
+      self.vocabulary[term] = len(self.vocabulary)
+    return(self.vocabulary[term])
+
+  def add(self, name, tokens):
+    """Append a document to the store
+
+    Arguments:
+      name: Document name
+      tokens: List of token strings
+    """
+    ids = np.fromiter((self.term_id(token) for token in tokens), dtype=token_dtype, count=len(tokens))
+    ids.tofile(self._tokens_file)
+    self.names.append(name)
+    self.offsets.append(self.offsets[-1] + len(ids))
+
+  def close(self):
+    """Flush the tokens and save the vocabulary, document names, and offsets"""
+    self._tokens_file.close()
+    np.asarray(self.offsets, dtype=offset_dtype).tofile(os.path.join(self.path, 'offsets.i64'))
+
+    terms = sorted(self.vocabulary, key=self.vocabulary.get)
+    with open(os.path.join(self.path, 'vocabulary.txt'), 'w', encoding='utf-8') as f:
+      f.write('\n'.join(terms))
+    with open(os.path.join(self.path, 'documents.txt'), 'w', encoding='utf-8') as f:
+      f.write('\n'.join(self.names))
+
+  def __enter__(self):
+    return(self)
+
+  def __exit__(self, *exc):
+    self.close()
+
+
+def write_store(path, documents):
+  """Write an iterable of (name, tokens) pairs to a new token store"""
+  with TokenStoreWriter(path) as writer:
+    for name, tokens in documents:
+      writer.add(name, tokens)
+
+
+#----------
+# Reading
+#----------
+def read_lines(filename):
+  """Read a UTF-8 text file into a list of lines (an empty file has no lines)"""
+  with open(filename, 'r', encoding='utf-8') as f:
+    text = f.read()
+  return(text.split('\n') if text else [])
+
+
+def memmap_array(filename, dtype):
+  """Map a binary array file read-only (also used by the concordance index)"""
+  # np.memmap can't map empty files, so fall back to an empty array
+  if os.path.getsize(filename) == 0:
+    return(np.zeros(0, dtype=dtype))
+  return(np.memmap(filename, dtype=dtype, mode='r'))
+
+
+class TokenStore:
+  """Read a token store
+
+  Attributes:
+    vocabulary: List of terms (index = token id)
+    names: List of document names
+    tokens: Memory-mapped uint32 array of every token id in the corpus
+    offsets: Memory-mapped int64 array of document boundaries in `tokens`
+  """
+  def __init__(self, path):
+    """Open the store
+
+    Arguments:
+      path: String of path to the store folder
+    """
+    self.path = path
+    self.vocabulary = read_lines(os.path.join(path, 'vocabulary.txt'))
+    self.names = read_lines(os.path.join(path, 'documents.txt'))
+    self.tokens = memmap_array(os.path.join(path, 'tokens.u32'), token_dtype)
+    self.offsets = memmap_array(os.path.join(path, 'offsets.i64'), offset_dtype)
+
+  def __len__(self):
+    return(len(self.names))
+
+  def document(self, i):
+    """Get the token ids for document i"""
+    return(self.tokens[self.offsets[i]:self.offsets[i + 1]])
+
+  def words(self, i):
+    """Get the tokens for document i as strings"""
+    return([self.vocabulary[token] for token in self.document(i)])
+
+  def bag_of_words(self, i):
+    """Get the unique token ids in document i and how many times each appears"""
+    return(np.unique(self.document(i), return_counts=True))
+
+  def iter_documents(self):
+    """Yield (name, token ids) for every document"""
+    for i, name in enumerate(self.names):
+      yield(name, self.document(i))
+
+  def to_folder(self, folder):
+    """Write every document as a space-separated text file (for `mallet import-dir`)"""
+    if not os.path.exists(folder):
+      os.makedirs(folder)
+    for i, name in enumerate(self.names):
+      with open(os.path.join(folder, name), 'w', encoding='utf-8') as f:
+        f.write(' '.join(self.words(i)))
+
+  def to_mallet_file(self, filename):
+    """Write every document as one line of a `mallet import-file` file (name, label, text)"""
+    with open(filename, 'w', encoding='utf-8') as f:
+      for i, name in enumerate(self.names):
+        f.write(name + '\t' + split_document_name(name)[0] + '\t' + ' '.join(self.words(i)) + '\n')
+
+
+def read_folder(folder):
+  """Yield (name, tokens) for every space-separated text file in a folder"""
+  for text_file in sorted(glob.glob(os.path.join(folder, '*'))):
+    with open(text_file, 'r', encoding='utf-8') as f:
+      yield(os.path.basename(text_file), f.read().split())
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Convert between folders of stemmed text files and binary token stores.')
+  parser.add_argument('command', type=str, choices=['from-folder', 'to-folder', 'to-mallet-file'],
+                      help='what to convert')
+  parser.add_argument('source', type=str,
+                      help='the folder of text files (from-folder) or the token store')
+  parser.add_argument('destination', type=str,
+                      help='the token store (from-folder), folder, or MALLET file to create')
+  args = parser.parse_args()
+
+  if args.command == 'from-folder':
+    write_store(args.destination, read_folder(args.source))
+  elif args.command == 'to-folder':
+    TokenStore(args.source).to_folder(args.destination)
+  else:
+    TokenStore(args.source).to_mallet_file(args.destination)
@@ -6,24 +6,30 @@
 # Author:         Andrew Heiss
 # Last updated:   2013-08-13
 # Python version: ≥3.0
-# Usage:          Edit the three variables below and run the script. You'll need to run 
+# Usage:          Edit the variables below and run the script. You'll need to run 
 #                 the script for each publication. 
 #
 #                 A normal report generates a series of CSV files that contain the frequency
 #                 of words found in (1) the sentence mentioning an NGO, (2) the paragraph 
 #                 mentioning the NGO, and (3) the whole article.
 #                 
-#                 A full report creates an Excel spreadsheet with the following columns:
+#                 A full report creates a table with one row per unit and the following columns:
 #                   * unit: paragraph, sentence, or whole article
 #                   * id_article: the database ID of the article
 #                   * position (+1): the position in the unit where the NGO name was found
 #                     (The +1 refers to the index. Python uses zero-based indexing, where the 
 #                      first paragraph is #0. This makes the first paragraph #1)
+#                   * unit_content: the text of the paragraph or sentence
 #                   * adjectives: a list of all adjectives found in the unit, sorted by frequency
 #                   * verbs: a list of all verbs found in the unit, sorted by frequency
-#                   * article_title: the title of the article
-#                   * article_content: the content of the article
-#                   * article_url: the URL of the article
+#                 and a second table with one row per article (join on id_article):
+#                   * id_article, article_title, article_content_no_tags (with numbered
+#                     paragraphs), and article_url
+#
+#                 The full report can be saved as an Excel spreadsheet (two worksheets), two
+#                 CSV files, or two Parquet files (needs pyarrow). Rows are written as soon
+#                 as each batch of articles is tagged, so memory use doesn't grow with the
+#                 size of the report.
 
 #-------------------
 # Configure script
@@ -31,16 +37,21 @@
 database = 'Corpora/egypt_independent.db'
 publication_prefix = 'freq_lists/egind_'
 full_report = False
+processes = 1  # Number of worker processes for tagging (1 = no multiprocessing)
+report_format = 'xlsx'  # Format of the full report: 'xlsx', 'csv', or 'parquet'
 
 
 #----------------------------------------------------------
 # Import modules
 from text.blob import TextBlob  # See https://textblob.readthedocs.org/en/latest/
+from text.taggers import PatternTagger
+from bisect import bisect_right
 import sqlite3
 import csv
 import xlsxwriter
 import re
 from collections import Counter
+from multiprocessing import Pool
 
 
 # List of signatory organizations in http://www.eipr.org/en/pressrelease/2013/05/30/1720
@@ -56,67 +67,100 @@ egind_ids = [13, 79, 193, 240, 241, 266, 271, 277, 300, 302, 311, 313, 334, 426,
 egind_ids = [240, 241]  # Smaller subset of articles
 
 
-#------------------------------------
-# Connect to and query the database
-#------------------------------------
-conn = sqlite3.connect(database, detect_types=sqlite3.PARSE_DECLTYPES)
-conn.row_factory = sqlite3.Row  # Use a dictionary cursor
-c = conn.cursor()
-
-# Query using the organization names
-org_sql = ['article_content_no_punc LIKE "%'+org.lower()+'%"' for org in organizations]
-sql_statement = 'SELECT * FROM articles WHERE '+' OR '.join(org for org in org_sql)
-c.execute(sql_statement)
-
-# Query using article ids
-# sql_statement = ("""SELECT * FROM articles WHERE id_article IN ({0})""".format(', '.join('?' for _ in egind_ids)))
-# c.execute(sql_statement, egind_ids)
-
-# Fetch the results
-ngo_mentions = c.fetchall()
+#-------------------
+# Helper functions
+#-------------------
+# Lowercase the organization names once instead of for every paragraph and sentence
+organizations_lower = [org.lower() for org in organizations]
+
+# Reuse the same tagger for every article instead of letting each TextBlob build its own
+# (in parallel mode, each worker process gets its own copy)
+tagger = PatternTagger()
+
+# Word frequency lists that get saved as CSV files
+counter_names = ['global_adjectives', 'global_verbs',
+                 'ngo_paragraph_adjs', 'ngo_paragraph_verbs',
+                 'ngo_sentence_adjs', 'ngo_sentence_verbs']
+
+
+def mentions_ngo(text):
+  """Check if a chunk of text mentions any of the organizations"""
+  text = text.lower()
+  return(any(org in text for org in organizations_lower))
+
+
+def paragraph_spans(text):
+  """Find the start and end character offsets of each paragraph
+
+  This splits paragraphs exactly like re.split('(\\n)+', text) with the
+  newline-only items removed, but keeps track of where each one starts.
+  """
+  spans = []
+  position = 0
+  for newlines in re.finditer('\n+', text):
+    spans.append((position, newlines.start()))
+    position = newlines.end()
+  spans.append((position, len(text)))
+  return(spans)
+
+
+def tag_article(text):
+  """Tag every sentence in an article exactly once
+
+  Returns:
+    Tuple of (TextBlob of the article, list of tags for each sentence, list of
+    the character offset of each tag in the article)
+  """
+  blob = TextBlob(text, pos_tagger=tagger)
+  sentence_tags = []
+  offsets = []
+  for sentence in blob.sentences:
+    tags = sentence.tags
+    sentence_tags.append(tags)
+
+    # Find each tagged word in the original text so it can be matched to its
+    # paragraph. If the tokenizer changed a word (e.g. quotes), use the position
+    # right after the previous word.
+    cursor = sentence.start
+    for word, tag in tags:
+      found = text.find(word, cursor, sentence.end)
+      if found >= 0:
+        cursor = found + len(word)
+        offsets.append(found)
+      else:
+        offsets.append(cursor)
+  return(blob, sentence_tags, offsets)
 
 
 #------------------------
 # Parse parts of speech
 #------------------------
-# Initialize lists
-global_adjectives = []
-global_verbs = []
-
-ngo_paragraph_adjs = []
-ngo_paragraph_verbs = []
-
-ngo_sentence_adjs = []
-ngo_sentence_verbs = []
-
-
-# Initially I did this all with csv.writer, which is much easier syntactically. 
-# But Excel can't handle Unicode in CSV files very well, so instead this uses 
-# xlsxwriter, which is clunkier, but works. I've kept the CSV code for posterity's sake.
-if full_report:
-  # output_file = open(publication_prefix+'full_report.csv', 'w', encoding='utf-8')
-  # writer = csv.writer(output_file)
-  # writer.writerow(columns)
-  global_row = 0  # xlsxwriter doesn't have a writerow(function), so we have to keep track of what row we're on
-  columns = ['unit', 'id_article', 'position (+1)', 'unit_content', 'adjectives', 'verbs', 'article_title', 'article_content_no_tags', 'article_url']
-  workbook = xlsxwriter.Workbook(publication_prefix+'full_report.xlsx')  # Create new spreadsheet
-  worksheet = workbook.add_worksheet()  # Make new worksheet
-  for col in range(0, len(columns)):
-    worksheet.write(global_row, col, columns[col])
-  global_row += 1
-
-
-for row in ngo_mentions:  # Loop through all rows in the database results
-  # Use TextBlob to parse the article
-  # blob.tags returns the following parts of speech (some are missing, like VBN, etc.):
+def extract_article(row):
+  """Find the adjectives and verbs in an article that mentions an NGO
+
+  Arguments:
+    row: Dictionary with id_article, article_title, article_content_no_tags,
+      and article_url
+
+  Returns:
+    Tuple of (dictionary of Counters named in `counter_names`, row for the
+    article table, list of unit rows for the full report)
+  """
+  counters = {name: Counter() for name in counter_names}
+  report_rows = []
+
+  # Use TextBlob to tag the article once. Every paragraph, sentence, and
+  # article-level list below comes from these tags.
+  # .tags returns the following parts of speech (some are missing, like VBN, etc.):
   #   noun (NN), adjective (JJ), determiner (DT), verb (VB), noun phrase (NP),
   #   sentence subject (SBJ), and prepositional noun phrase (PNP)
-  blob = TextBlob(row['article_content_no_tags'])
+  text = row['article_content_no_tags']
+  blob, sentence_tags, offsets = tag_article(text)
+  article_tags = [tag for tags in sentence_tags for tag in tags]
 
   # Split the article into paragraphs
-  paragraphs = (re.split('(\n)+', row['article_content_no_tags']))
-  paragraphs = [paragraph for paragraph in paragraphs if paragraph != "\n"]
-  paragraphs_lower = [paragraph.lower() for paragraph in paragraphs]
+  spans = paragraph_spans(text)
+  paragraphs = [text[start:end] for start, end in spans]
 
   # Add line numbers
   # enumerate(list, 1) results in (list1, 1), (list2, 2), etc.
@@ -124,74 +168,227 @@ for row in ngo_mentions:  # Loop through all rows in the database results
   csv_article = '\n'.join(article_numbered)
 
   # Get a list of all the paragraphs that mention one of the organizations
-  paragraph_position = [i for i, x in enumerate(paragraphs_lower) if any(org.lower() in x for org in organizations)]
+  paragraph_position = [i for i, x in enumerate(paragraphs) if mentions_ngo(x)]
 
-  # Split the article into sentences
-  sentences_lower = [sentence.lower() for sentence in blob.sentences]
   # Get a list of all the sentences that mention one of the organizations
-  sentence_position = [i for i, x in enumerate(sentences_lower) if any(org.lower() in x for org in organizations)]
+  sentence_position = [i for i, x in enumerate(blob.sentences) if mentions_ngo(str(x))]
+
+  # Assign every tagged word to its paragraph using its character offset
+  paragraph_starts = [start for start, end in spans]
+  paragraph_tags = [[] for _ in paragraphs]
+  for tag, offset in zip(article_tags, offsets):
+    paragraph_tags[bisect_right(paragraph_starts, offset) - 1].append(tag)
 
   # Extract the adjectives and verbs from the paragraphs that mention
   # an organization and add them to the main lists
   for i in paragraph_position:
-    par_blob = TextBlob(paragraphs[i])
-    adjectives = [adj[0] for adj in par_blob.tags if adj[1] == 'JJ']
-    verbs = [verb[0] for verb in par_blob.tags if 'VB' in verb[1]]
-    ngo_paragraph_adjs.extend(adjectives)
-    ngo_paragraph_verbs.extend(verbs)
-    spreadsheet_row = ['paragraph', row['id_article'], i+1, paragraphs[i], str(Counter(adjectives).most_common()), str(Counter(verbs).most_common()), row['article_title'], csv_article, row['article_url']]
-    if full_report:
-      # writer.writerow(spreadsheet_row)
-      for col in range(0, len(columns)):
-        worksheet.write(global_row, col, spreadsheet_row[col])
-      global_row += 1
-
+    adjectives = [adj[0] for adj in paragraph_tags[i] if adj[1] == 'JJ']
+    verbs = [verb[0] for verb in paragraph_tags[i] if 'VB' in verb[1]]
+    counters['ngo_paragraph_adjs'].update(adjectives)
+    counters['ngo_paragraph_verbs'].update(verbs)
+    report_rows.append(['paragraph', row['id_article'], i+1, paragraphs[i], str(Counter(adjectives).most_common()), str(Counter(verbs).most_common())])
 
   # Extract the adjectives and verbs from the sentences that mention an
   # organization and add them to the main lists
   for i in sentence_position:
-    par_blob = blob.sentences[i]
-    adjectives = [adj[0] for adj in par_blob.tags if adj[1] == 'JJ']
-    verbs = [verb[0] for verb in par_blob.tags if 'VB' in verb[1]]
-    ngo_sentence_adjs.extend(adjectives)
-    ngo_sentence_verbs.extend(verbs)
-    spreadsheet_row = ['sentence', row['id_article'], i+1, str(blob.sentences[i]), str(Counter(adjectives).most_common()), str(Counter(verbs).most_common()), row['article_title'], csv_article, row['article_url']]
-    if full_report:
-      # writer.writerow(spreadsheet_row)
-      for col in range(0, len(columns)):
-        worksheet.write(global_row, col, spreadsheet_row[col])
-      global_row += 1
+    adjectives = [adj[0] for adj in sentence_tags[i] if adj[1] == 'JJ']
+    verbs = [verb[0] for verb in sentence_tags[i] if 'VB' in verb[1]]
+    counters['ngo_sentence_adjs'].update(adjectives)
+    counters['ngo_sentence_verbs'].update(verbs)
+    report_rows.append(['sentence', row['id_article'], i+1, str(blob.sentences[i]), str(Counter(adjectives).most_common()), str(Counter(verbs).most_common())])
 
   # Extract adjectives and verbs from the entire article and add them to the global lists
-  adjectives = [adj[0] for adj in blob.tags if adj[1] == 'JJ']
-  verbs = [verb[0] for verb in blob.tags if verb[1] == 'VB' or verb[1] == 'VBN']
-  global_adjectives.extend(adjectives)
-  global_verbs.extend(verbs)
-  spreadsheet_row = ['article', row['id_article'], '', '', str(Counter(adjectives).most_common()), str(Counter(verbs).most_common()), row['article_title'], csv_article, row['article_url']]
-  if full_report:
-    # writer.writerow(spreadsheet_row)
-    for col in range(0, len(columns)):
-      worksheet.write(global_row, col, spreadsheet_row[col])
-    global_row += 1
-
-if full_report:
-  workbook.close()
-
-#---------------------------
-# Save lists to a csv file
-#---------------------------
-if not full_report:
-  def write_to_csv(word_list, filename):
-    with open(filename, 'w') as output_file:
-      writer = csv.writer(output_file)
-      writer.writerow(['word', 'frequency'])
-
-      for row in Counter(word_list).most_common():
-        writer.writerow(row)
-
-  write_to_csv(global_adjectives, publication_prefix + 'global_adjectives.csv')
-  write_to_csv(global_verbs, publication_prefix + 'global_verbs.csv')
-  write_to_csv(ngo_paragraph_adjs, publication_prefix + 'ngo_paragraph_adjs.csv')
-  write_to_csv(ngo_paragraph_verbs, publication_prefix + 'ngo_paragraph_verbs.csv')
-  write_to_csv(ngo_sentence_adjs, publication_prefix + 'ngo_sentence_adjs.csv')
-  write_to_csv(ngo_sentence_verbs, publication_prefix + 'ngo_sentence_verbs.csv')
\ No newline at end of file
+  adjectives = [adj[0] for adj in article_tags if adj[1] == 'JJ']
+  verbs = [verb[0] for verb in article_tags if verb[1] == 'VB' or verb[1] == 'VBN']
+  counters['global_adjectives'].update(adjectives)
+  counters['global_verbs'].update(verbs)
+  report_rows.append(['article', row['id_article'], '', '', str(Counter(adjectives).most_common()), str(Counter(verbs).most_common())])
+
+  article_row = [row['id_article'], row['article_title'], csv_article, row['article_url']]
+
+  return(counters, article_row, report_rows)
+
+
+def extract_shard(rows):
+  """Run extract_article() on a list of articles and combine the results"""
+  counters = {name: Counter() for name in counter_names}
+  article_rows = []
+  report_rows = []
+  for row in rows:
+    article_counters, article_row, unit_rows = extract_article(row)
+    for name in counter_names:
+      counters[name].update(article_counters[name])
+    article_rows.append(article_row)
+    report_rows.extend(unit_rows)
+  return(counters, article_rows, report_rows)
+
+
+def make_shards(rows, num_shards):
+  """Split a list of articles into contiguous, roughly equal chunks"""
+  size = max(1, -(-len(rows) // num_shards))  # Ceiling division
+  return([rows[i:i + size] for i in range(0, len(rows), size)])
+
+
+#--------------------------
+# Full report writers
+#--------------------------
+# Every writer has the same methods: add(article_rows, unit_rows) and close().
+# Article text is saved once per article instead of once per unit.
+unit_columns = ['unit', 'id_article', 'position (+1)', 'unit_content', 'adjectives', 'verbs']
+article_columns = ['id_article', 'article_title', 'article_content_no_tags', 'article_url']
+
+
+class XlsxReport:
+  """Excel spreadsheet with "units" and "articles" worksheets
+
+  Initially I did this all with csv.writer, which is much easier syntactically. 
+  But Excel can't handle Unicode in CSV files very well, so this uses xlsxwriter. 
+  In constant_memory mode xlsxwriter flushes each row to disk as soon as the next 
+  one starts, so rows have to be written in order.
+  """
+  def __init__(self, prefix):
+    self.workbook = xlsxwriter.Workbook(prefix + 'full_report.xlsx', {'constant_memory': True})
+    self.units = self.workbook.add_worksheet('units')
+    self.articles = self.workbook.add_worksheet('articles')
+    self.units.write_row(0, 0, unit_columns)
+    self.articles.write_row(0, 0, article_columns)
+    self.unit_row = 1  # xlsxwriter doesn't have a writerow() function, so we have to keep track of what row we're on
+    self.article_row = 1
+
+  def add(self, article_rows, unit_rows):
+    for row in unit_rows:
+      self.units.write_row(self.unit_row, 0, row)
+      self.unit_row += 1
+    for row in article_rows:
+      self.articles.write_row(self.article_row, 0, row)
+      self.article_row += 1
+
+  def close(self):
+    self.workbook.close()
+
+
+class CsvReport:
+  """full_report.csv and full_report_articles.csv
+
+  The files start with a byte order mark so Excel opens them as UTF-8.
+  """
+  def __init__(self, prefix):
+    self.files = [open(prefix + 'full_report.csv', 'w', newline='', encoding='utf-8-sig'),
+                  open(prefix + 'full_report_articles.csv', 'w', newline='', encoding='utf-8-sig')]
+    self.units, self.articles = [csv.writer(f) for f in self.files]
+    self.units.writerow(unit_columns)
+    self.articles.writerow(article_columns)
+
+  def add(self, article_rows, unit_rows):
+    self.units.writerows(unit_rows)
+    self.articles.writerows(article_rows)
+
+  def close(self):
+    for f in self.files:
+      f.close()
+
+
+class ParquetReport:
+  """full_report.parquet and full_report_articles.parquet
+
+  Each batch of articles is written as its own row group. Article-level units
+  have no position, so it's saved as null instead of ''.
+  """
+  def __init__(self, prefix):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    self.pa = pa
+    self.unit_schema = pa.schema([('unit', pa.string()), ('id_article', pa.int64()),
+                                  ('position', pa.int64()), ('unit_content', pa.string()),
+                                  ('adjectives', pa.string()), ('verbs', pa.string())])
+    self.article_schema = pa.schema([(column, pa.int64() if column == 'id_article' else pa.string())
+                                     for column in article_columns])
+    self.units = pq.ParquetWriter(prefix + 'full_report.parquet', self.unit_schema)
+    self.articles = pq.ParquetWriter(prefix + 'full_report_articles.parquet', self.article_schema)
+
+  def _table(self, rows, schema):
+    columns = [list(column) for column in zip(*rows)] if rows else [[] for _ in schema]
+    columns = [[None if value == '' else value for value in column] for column in columns]
+    return(self.pa.Table.from_arrays(columns, schema=schema))
+
+  def add(self, article_rows, unit_rows):
+    if unit_rows:
+      self.units.write_table(self._table(unit_rows, self.unit_schema))
+    if article_rows:
+      self.articles.write_table(self._table(article_rows, self.article_schema))
+
+  def close(self):
+    self.units.close()
+    self.articles.close()
+
+
+report_writers = {'xlsx': XlsxReport, 'csv': CsvReport, 'parquet': ParquetReport}
+
+
+#------------
+# Run stuff
+#------------
+if __name__ == '__main__':
+  #------------------------------------
+  # Connect to and query the database
+  #------------------------------------
+  conn = sqlite3.connect(database, detect_types=sqlite3.PARSE_DECLTYPES)
+  conn.row_factory = sqlite3.Row  # Use a dictionary cursor
+  c = conn.cursor()
+
+  # Query using the organization names
+  org_sql = ['article_content_no_punc LIKE "%'+org.lower()+'%"' for org in organizations]
+  sql_statement = 'SELECT * FROM articles WHERE '+' OR '.join(org for org in org_sql)
+  c.execute(sql_statement)
+
+  # Query using article ids
+  # sql_statement = ("""SELECT * FROM articles WHERE id_article IN ({0})""".format(', '.join('?' for _ in egind_ids)))
+  # c.execute(sql_statement, egind_ids)
+
+  # Fetch the results (as plain dictionaries, so they can be sent to worker processes)
+  columns = ['id_article', 'article_title', 'article_content_no_tags', 'article_url']
+  ngo_mentions = [{column: row[column] for column in columns} for row in c.fetchall()]
+  conn.close()
+
+
+  #-----------------------------------
+  # Tag all the articles (in parallel)
+  #-----------------------------------
+  # Each worker tags a contiguous shard of articles. Shards come back in order
+  # (imap), so merging them gives exactly the same counts and row order as a
+  # sequential run. Each shard's rows go straight to the full report and are
+  # then thrown away.
+  report = report_writers[report_format](publication_prefix) if full_report else None
+  pool = Pool(processes) if processes > 1 else None
+  if pool:
+    results = pool.imap(extract_shard, make_shards(ngo_mentions, processes * 4))
+  else:
+    results = map(extract_shard, ([row] for row in ngo_mentions))
+
+  counters = {name: Counter() for name in counter_names}
+  for shard_counters, article_rows, report_rows in results:
+    for name in counter_names:
+      counters[name].update(shard_counters[name])
+    if report:
+      report.add(article_rows, report_rows)
+
+  if pool:
+    pool.close()
+    pool.join()
+  if report:
+    report.close()
+
+  #---------------------------
+  # Save lists to a csv file
+  #---------------------------
+  if not full_report:
+    def write_to_csv(word_counts, filename):
+      with open(filename, 'w') as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(['word', 'frequency'])
+
+        for row in word_counts.most_common():
+          writer.writerow(row)
+
+    for name in counter_names:
+      write_to_csv(counters[name], publication_prefix + name + '.csv')
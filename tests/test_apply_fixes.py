@@ -0,0 +1,74 @@
+# Tests for parse_raw_html/apply_fixes.py
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parse_raw_html'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prepare_corpus'))
+from apply_fixes import apply_fixes
+from compressed_text import compress_database, connect
+from derived_text import clean_content
+
+schema = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Corpora', 'schema.sql')
+
+
+def make_database(path, articles=50):
+  """Create a small corpus database with tagged articles"""
+  conn = sqlite3.connect(path)
+  with open(schema, encoding='utf-8') as f:
+    conn.executescript(f.read())
+  words = ['egypt', 'cairo', 'said', 'government', 'protest', 'court', 'minister', 'election']
+  for i in range(articles):
+    content = '<p>' + ' '.join(words[(i + j) % len(words)] for j in range(120)) + '.</p>'
+    no_tags, no_punc, word_count = clean_content(content)
+    conn.execute("""INSERT INTO articles (article_title, article_date, article_url, article_type,
+      article_content, article_content_no_tags, article_content_no_punc, article_word_count)
+      VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+      ('Title {0}'.format(i), '2012-01-01 00:00:00', 'http://example.com/{0}'.format(i), 'News',
+       content, no_tags, no_punc, word_count))
+  conn.execute("INSERT INTO tags (tag_name) VALUES ('original')")
+  conn.execute('INSERT INTO articles_tags (fk_article, fk_tag) VALUES (1, 1)')
+  conn.commit()
+  conn.close()
+
+
+def article_names(conn, url, junction, table, id_column, name_column, fk_column):
+  return(sorted(row[0] for row in conn.execute("""SELECT {0} FROM {1}
+    JOIN {2} ON ({2}.{3} = {1}.{4})
+    JOIN articles ON (articles.id_article = {1}.fk_article)
+    WHERE article_url = ?""".format(name_column, junction, table, id_column, fk_column), (url, ))))
+
+
+def new_fix(number):
+  return({'action': 'insert', 'article_url': 'http://example.com/new/{0}'.format(number),
+          'article_title': 'New {0}'.format(number), 'article_date': '2012-10-29',
+          'article_type': 'News', 'article_content': '<p>New article {0}.</p>'.format(number),
+          'authors': ['Author {0}'.format(number)], 'tags': ['Tag {0}'.format(number)]})
+
+
+@pytest.mark.parametrize('compressed', [False, True])
+def test_inserts_get_their_own_names(tmp_path, compressed):
+  database = str(tmp_path / 'corpus.db')
+  make_database(database)
+  if compressed:
+    pytest.importorskip('zstandard')
+    compress_database(database, dict_size=4096)
+
+  counts = apply_fixes(database, [new_fix(1), new_fix(2)])
+  assert counts == {'inserted': 2, 'updated': 0}
+
+  conn = connect(database)
+  for number in [1, 2]:
+    url = 'http://example.com/new/{0}'.format(number)
+    assert article_names(conn, url, 'articles_authors', 'authors', 'id_author', 'author_name', 'fk_author') == \
+      ['Author {0}'.format(number)]
+    assert article_names(conn, url, 'articles_tags', 'tags', 'id_tag', 'tag_name', 'fk_tag') == \
+      ['tag {0}'.format(number)]
+
+  # The existing article keeps its tags
+  assert article_names(conn, 'http://example.com/0', 'articles_tags', 'tags', 'id_tag', 'tag_name', 'fk_tag') == \
+    ['original']
+  conn.close()
@@ -0,0 +1,143 @@
+# Tests for parse_raw_html/fetch_ahram.py, run against a local aiohttp stub server
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parse_raw_html'))
+from fetch_ahram import FetchState, HostThrottle, fetch_all, fetch_shortlink
+
+chunk_size = 16384
+article = b'<html><body><h1>NGO law</h1><p>' + b'Cairo ' * 4000 + b'</p></body></html>'
+
+# Every way al-Ahram's "Page doesn't exist" apostrophe has turned up
+apostrophes = [b"'", b'\x92', b'\xe2\x80\x99', b'&#39;', b'&#x27;', b'&#8217;', b'&#x2019;', b'&rsquo;']
+
+
+def soft_404_halves(apostrophe):
+  """A soft 404 page split in two, with the marker straddling the first chunk boundary"""
+  marker = b'Page doesn' + apostrophe + b't exist'
+  split = len(marker) // 2
+  first = b'<html><body>' + b'x' * (chunk_size - 12 - split) + marker[:split]
+  return(first, marker[split:] + b'</body></html>')
+
+
+class StubServer:
+  """al-Ahram stand-in that serves /News/{shortlink}.aspx
+
+  Shortlink 1 is an article, 2 is a hard 404, 3 fails with a 503 before it works,
+  and 10 onward are soft 404s (one per apostrophe). Every request is logged in `hits`.
+  """
+  def __init__(self):
+    self.hits = []
+    self.runner = None
+    self.base_url = None
+
+  async def page(self, request):
+    shortlink = int(request.match_info['shortlink'])
+    self.hits.append(shortlink)
+    if shortlink == 1:
+      return(web.Response(body=article))
+    if shortlink == 2:
+      return(web.Response(status=404))
+    if shortlink == 3:
+      if self.hits.count(3) == 1:
+        return(web.Response(status=503))
+      return(web.Response(body=article))
+    first, rest = soft_404_halves(apostrophes[shortlink - 10])
+    response = web.StreamResponse()
+    await response.prepare(request)
+    await response.write(first)
+    await asyncio.sleep(0.05)
+    await response.write(rest)
+    await response.write_eof()
+    return(response)
+
+  async def __aenter__(self):
+    app = web.Application()
+    app.router.add_get('/News/{shortlink}.aspx', self.page)
+    self.runner = web.AppRunner(app)
+    await self.runner.setup()
+    site = web.TCPSite(self.runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = self.runner.addresses[0][:2]
+    self.base_url = 'http://{0}:{1}/News/{{0}}.aspx'.format(host, port)
+    return(self)
+
+  async def __aexit__(self, *exc):
+    await self.runner.cleanup()
+
+
+def fetch(shortlinks, output_folder, state):
+  """Run fetch_all against a fresh stub server"""
+  async def run():
+    async with StubServer() as server:
+      counts = await fetch_all(shortlinks, output_folder, state, server.base_url,
+                               connections=4, delay=0, retries=0, timeout=10)
+    return(counts, server.hits)
+  return(asyncio.run(run()))
+
+
+def test_saves_articles_and_skips_404s(tmp_path):
+  state = FetchState(str(tmp_path / 'state.db'))
+  counts, hits = fetch([1, 2], str(tmp_path), state)
+  assert counts == {'saved': 1, '404': 1}
+  with open(str(tmp_path / '1.html'), 'rb') as f:
+    assert f.read() == article
+  assert not os.path.exists(str(tmp_path / '2.html'))
+  state.close()
+
+
+@pytest.mark.parametrize('apostrophe', apostrophes)
+def test_soft_404_split_across_chunks(tmp_path, apostrophe):
+  first, rest = soft_404_halves(apostrophe)
+  assert len(first) == chunk_size
+  shortlink = 10 + apostrophes.index(apostrophe)
+  state = FetchState(str(tmp_path / 'state.db'))
+  counts, hits = fetch([shortlink], str(tmp_path), state)
+  assert counts == {'soft404': 1}
+  assert not os.path.exists(str(tmp_path / '{0}.html'.format(shortlink)))
+  state.close()
+
+
+def test_retries_server_errors(tmp_path):
+  async def run():
+    async with StubServer() as server:
+      async with aiohttp.ClientSession() as session:
+        result = await fetch_shortlink(session, HostThrottle(0), 3, server.base_url,
+                                       str(tmp_path), retries=2, backoff=0)
+    return(result, server.hits)
+
+  result, hits = asyncio.run(run())
+  assert result == ('saved', 200, len(article))
+  assert hits == [3, 3]
+  assert os.path.exists(str(tmp_path / '3.html'))
+
+
+def test_resume_skips_finished_shortlinks(tmp_path):
+  state_file = str(tmp_path / 'state.db')
+  shortlinks = [1, 2, 3, 10]
+
+  # The first run gets a 503 for shortlink 3 and doesn't retry it
+  state = FetchState(state_file)
+  counts, hits = fetch(shortlinks, str(tmp_path), state)
+  assert counts == {'saved': 1, '404': 1, 'error': 1, 'soft404': 1}
+  state.close()
+
+  # An interrupted run reopens the state file and only requests what's left
+  state = FetchState(state_file)
+  finished = state.finished()
+  assert finished == {1, 2, 10}
+  remaining = [shortlink for shortlink in shortlinks if shortlink not in finished]
+  counts, hits = fetch(remaining, str(tmp_path), state)
+  assert hits == [3]
+  assert counts == {'error': 1}
+
+  # --retry-failed only skips the pages that were saved
+  assert state.finished(retry_failed=True) == {1}
+  state.close()
@@ -0,0 +1,48 @@
+# Tests for parse_raw_html/normalize_names.py
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parse_raw_html'))
+from normalize_names import clean_name, cluster_names, words_match
+
+
+def clusters_of(names):
+  """Map each name to its canonical name (only for names that were merged)"""
+  numbered = [(i, name, articles) for i, (name, articles) in enumerate(names, start=1)]
+  return({cluster['name']: cluster['canonical_name'] for cluster in cluster_names(numbered)})
+
+
+def test_byline_variants_merge():
+  clusters = clusters_of([('Rana Muhammad Taha', 40), ('By Rana Muhammad Taha', 3),
+                          ('Rana Muhammad Taha,', 2), ('Rana Mohamed Taha', 1)])
+  assert clusters == {name: 'Rana Muhammad Taha' for name in
+                      ['Rana Muhammad Taha', 'By Rana Muhammad Taha', 'Rana Muhammad Taha,', 'Rana Mohamed Taha']}
+
+
+def test_shared_first_names_stay_apart():
+  names = [('Mohamed Hassan', 10), ('Mohamed Hussein', 8), ('Mohamed Fahmy', 6), ('Mohamed Fathy', 5)]
+  assert clusters_of(names) == {}
+
+
+def test_no_chaining_through_first_names():
+  clusters = clusters_of([('Mohamed Hassan', 10), ('Mohamed Hasan', 2), ('Mohamed Hussein', 8), ('Mohamed Husein', 1)])
+  assert clusters == {'Mohamed Hassan': 'Mohamed Hassan', 'Mohamed Hasan': 'Mohamed Hassan',
+                      'Mohamed Hussein': 'Mohamed Hussein', 'Mohamed Husein': 'Mohamed Hussein'}
+
+
+def test_short_first_names_stay_apart():
+  names = [('Hana Ali', 9), ('Hany Ali', 7), ('Mona Ali', 6), ('Mena Ali', 5),
+           ('Nada Ali', 4), ('Nadia Ali', 3), ('Mai Ali', 2), ('May Ali', 1)]
+  assert clusters_of(names) == {}
+  for a, b in [('Hana Ali', 'Hany Ali'), ('Mona Ali', 'Mena Ali'), ('Nada Ali', 'Nadia Ali'), ('Mai Ali', 'May Ali')]:
+    assert not words_match(clean_name(a), clean_name(b))
+
+
+def test_words_match():
+  assert words_match(clean_name('Mohamed Hassan'), clean_name('Muhammad Hassan'))
+  assert words_match(clean_name('Daily News Egypt staff'), clean_name('Daily News Egypt'))
+  assert not words_match(clean_name('Mohamed Hassan'), clean_name('Mohamed Hussein'))
+  assert not words_match(clean_name('Mohamed Fahmy'), clean_name('Mohamed Fathy'))
+  assert not words_match(clean_name('Hassan Mohamed'), clean_name('Hussein Mohamed'))
+  assert not words_match(clean_name('Rana Taha'), clean_name('Rana Muhammad Taha'))
@@ -0,0 +1,56 @@
+# Tests for prepare_corpus/preprocess_cache.py
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prepare_corpus'))
+from preprocess_cache import PreprocessCache
+
+
+def stored_size(cache):
+  """Bytes of token arrays and terms actually in the cache database"""
+  blobs = cache.conn.execute('SELECT COALESCE(SUM(length(tokens)), 0) FROM entries').fetchone()[0]
+  terms = sum(len(term.encode('utf-8')) for (term, ) in cache.conn.execute('SELECT term FROM terms'))
+  return(blobs + terms)
+
+
+def document_tokens(i):
+  """Tokens for a document, with 50 words only it uses"""
+  return(['egypt', 'cairo'] + ['doc{0}word{1}'.format(i, j) for j in range(50)])
+
+
+def test_eviction_prunes_terms(tmp_path):
+  cache = PreprocessCache(str(tmp_path / 'cache.db'), max_bytes=4000, commit_every=5)
+  for i in range(40):
+    cache.put('stemmed', 'ahram_{0}.txt'.format(i), 'text', 'config', document_tokens(i))
+  cache.checkpoint()
+
+  assert cache.size == stored_size(cache) <= 4000
+  documents = [row[0] for row in cache.conn.execute('SELECT document FROM entries')]
+  assert 'ahram_39.txt' in documents and 'ahram_0.txt' not in documents
+  assert cache.conn.execute("SELECT COUNT(*) FROM terms WHERE term LIKE 'doc0word%'").fetchone()[0] == 0
+  assert cache.conn.execute("SELECT refs FROM terms WHERE term = 'egypt'").fetchone()[0] == len(documents)
+  cache.close()
+
+
+def test_reopened_cache_keeps_counts(tmp_path):
+  path = str(tmp_path / 'cache.db')
+  cache = PreprocessCache(path, max_bytes=4000, commit_every=5)
+  for i in range(20):
+    cache.put('stemmed', 'dne_{0}.txt'.format(i), 'text', 'config', document_tokens(i))
+  cache.close()
+
+  cache = PreprocessCache(path, max_bytes=4000, commit_every=5)
+  assert cache.size == stored_size(cache)
+  last = 'dne_19.txt'
+  assert cache.get('stemmed', last, 'text', 'config') == document_tokens(19)
+
+  # Evicted terms can come back under new ids, and replacing an entry swaps its terms
+  cache.put('stemmed', 'dne_0.txt', 'text', 'config', document_tokens(0))
+  cache.put('stemmed', last, 'text', 'config', ['egypt', 'cairo', 'ngo'])
+  cache.checkpoint()
+  assert cache.get('stemmed', 'dne_0.txt', 'text', 'config') == document_tokens(0)
+  assert cache.get('stemmed', last, 'text', 'config') == ['egypt', 'cairo', 'ngo']
+  assert cache.conn.execute("SELECT COUNT(*) FROM terms WHERE term LIKE 'doc19word%'").fetchone()[0] == 0
+  assert cache.size == stored_size(cache) <= 4000
+  cache.close()